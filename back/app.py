@@ -3,17 +3,24 @@ import os
 import json
 import uuid
 import time
-import requests
+import http_client  # 共享HTTP连接池
 import subprocess
 import re
 import logging
 import traceback
+import threading
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 from datetime import datetime
 from dotenv import load_dotenv
 from knowledge_retrieval import get_retriever  # 导入知识库检索模块
-from image_service import get_image_for_slide, ImageService  # 导入图片服务模块
+from text_tokenizer import tokenize_cache_info  # 共享中文分词
+from image_service import get_image_for_slide, get_image_service, ImageService  # 导入图片服务模块
+from image_disk_cache import get_image_disk_cache  # 导入图片磁盘缓存模块
+from job_queue import get_job_queue, set_job_stage, QueueFullError  # 后台生成任务队列
+from ppt_engine.browser_pool import get_browser_pool  # 共享的无头浏览器池
+from ppt_engine.content_filler import template_catalog_stats  # 按目录共享的模板环境
+from ppt_template_store import get_template_store  # 进程内共享的PPT模板缓存
 from io import BytesIO
 from PIL import Image
 import tempfile
@@ -387,6 +394,25 @@ def get_knowledge_topic(topic_id):
         logger.error(f"获取知识主题出错: {str(e)}\n{traceback.format_exc()}")
         return jsonify({"error": "获取主题内容时出错", "detail": str(e)}), 500
 
+@app.route('/api/knowledge/reload', methods=['POST'])
+def reload_knowledge():
+    """检测知识库文件变化并增量更新索引"""
+    try:
+        # 获取知识库检索器
+        retriever = get_retriever()
+        
+        # 重新加载变化的文件
+        summary = retriever.reload()
+        
+        return jsonify({
+            "success": True,
+            "result": summary
+        })
+        
+    except Exception as e:
+        logger.error(f"更新知识库索引出错: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": "更新知识库索引时出错", "detail": str(e)}), 500
+
 # 路由
 @app.route('/')
 def index():
@@ -395,7 +421,18 @@ def index():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok"})
+    return jsonify({
+        "status": "ok",
+        "imageCache": get_image_service().image_cache.stats(),
+        "imageDiskCache": get_image_disk_cache().stats(),
+        "http": http_client.get_http_metrics(),
+        "knowledgeCache": get_retriever().content_cache_stats(),
+        "tokenizeCache": tokenize_cache_info(),
+        "jobs": get_job_queue().stats(),
+        "browserPool": get_browser_pool().stats(),
+        "templateCatalogs": template_catalog_stats(),
+        "templateStore": get_template_store().stats()
+    })
 
 # PPT模板相关API
 @app.route('/api/aiPpt/ppt/templates', methods=['GET'])
@@ -531,7 +568,7 @@ def upload_template():
             # 触发预览生成（通过发送请求到预览API）
             try:
                 preview_request_url = f"http://localhost:{request.environ.get('SERVER_PORT', 5000)}{preview_url}"
-                requests.get(preview_request_url, timeout=2)
+                http_client.get(preview_request_url, timeout=2, retries=0)
                 logger.info("已触发模板预览生成")
             except:
                 logger.warning("无法通过API触发预览生成，将在首次访问时生成")
@@ -771,10 +808,11 @@ def generate_outline():
         
         # 调用百炼API生成大纲
         logger.info("调用百炼API生成大纲")
-        response = requests.post(
+        response = http_client.post(
             API_URL,
             json=payload,
-            headers=headers
+            headers=headers,
+            timeout=http_client.LLM_TIMEOUT
         )
         
         if response.status_code != 200:
@@ -1001,12 +1039,82 @@ def preprocess_outline_data(outline):
     return outline
 
 # 修改gen_pptx_python函数，集成HTML中间格式方法
+def is_async_request(data):
+    """请求是否要求以后台任务方式执行（查询参数async=1或请求体"async": true）"""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return isinstance(data, dict) and data.get('async') is True
+
+def run_generation_job(handler, data):
+    """
+    在任务线程中执行生成函数，并将其Flask响应转换为任务结果
+
+    Args:
+        handler: 生成函数，接收请求数据，返回Flask响应或(响应, 状态码)
+        data: 请求数据
+
+    Returns:
+        响应JSON，统一补充pptUrl字段
+    """
+    with app.app_context():
+        response = handler(data)
+    status = 200
+    if isinstance(response, tuple):
+        response, status = response[0], response[1]
+    payload = response.get_json(silent=True) or {}
+    if status >= 400:
+        raise Exception(payload.get("error") or f"生成失败，状态码: {status}")
+    ppt_url = payload.get("pptUrl") or payload.get("file_url") or payload.get("file_path")
+    if ppt_url:
+        payload.setdefault("pptUrl", ppt_url)
+    return payload
+
+def dispatch_generation(job_type, handler):
+    """
+    同步执行生成请求，或提交为后台任务并立即返回任务ID
+
+    Args:
+        job_type: 任务类型名称
+        handler: 生成函数，接收请求数据
+    """
+    data = request.get_json(silent=True)
+    if not is_async_request(data):
+        return handler(data)
+
+    try:
+        job = get_job_queue().submit(job_type, run_generation_job, handler, data)
+    except QueueFullError as e:
+        logger.warning(f"拒绝提交生成任务: {str(e)}")
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify({
+        "jobId": job.id,
+        "status": job.status,
+        "statusUrl": f"/api/jobs/{job.id}"
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """查询后台生成任务的状态、各阶段耗时和最终的pptUrl"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": f"任务不存在或已过期: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs_stats():
+    """任务队列深度和各阶段耗时统计"""
+    return jsonify(get_job_queue().stats())
+
 @app.route('/api/aiPpt/gen-pptx-python', methods=['POST'])
 def gen_pptx_python():
+    """使用模板生成PPTX"""
+    return dispatch_generation('gen_pptx_python', _gen_pptx_python)
+
+def _gen_pptx_python(data):
     """使用模板生成PPTX"""
     logger.info("=== 开始生成PPT ===")
     try:
-        data = request.json
         logger.info(f"接收到的请求数据: {json.dumps(data, ensure_ascii=False)[:200]}...")
         
         if not data:
@@ -1038,11 +1146,12 @@ def gen_pptx_python():
         outline = valid_outline
         
         # 预处理大纲数据，确保数据格式正确
+        set_job_stage("preprocess")
         outline = preprocess_outline_data(outline)
         logger.info(f"处理后的大纲页数: {len(outline)}")
         
         # 生成唯一的文件名
-        timestamp = int(time.time())
+        timestamp = f"{int(time.time())}_{uuid.uuid4().hex[:8]}"  # 并发任务下避免文件名冲突
         filename = f"test_app_{timestamp}.pptx"
         output_path = os.path.join(UPLOAD_FOLDER, filename)
         
@@ -1083,6 +1192,7 @@ def gen_pptx_python():
             logger.warning(traceback.format_exc())
         
         # 回退方法：调用原有的PPT生成脚本
+        set_job_stage("fallback")
         try:
             # 将大纲数据写入临时文件
             temp_json_path = os.path.join(UPLOAD_FOLDER, f"outline_{timestamp}.json")
@@ -1280,13 +1390,15 @@ def gen_pptx_without_template():
 
 @app.route('/api/aiPpt/gen-pptx-enhanced', methods=['POST'])
 def gen_pptx_enhanced():
+    """生成增强版PPT（使用HTML中间格式）"""
+    return dispatch_generation('gen_pptx_enhanced', _gen_pptx_enhanced)
+
+def _gen_pptx_enhanced(data):
     """生成增强版PPT（使用HTML中间格式）"""
     start_time = time.time()
     logger.info("=== 开始生成增强版PPT ===")
     
     try:
-        # 解析请求数据
-        data = request.get_json()
         if not data:
             return jsonify({"error": "请提供有效的大纲数据"}), 400
         
@@ -1299,10 +1411,11 @@ def gen_pptx_enhanced():
             return jsonify({"error": "请提供有效的大纲数据"}), 400
             
         # 预处理大纲数据
+        set_job_stage("preprocess")
         processed_outline = preprocess_outline_data_enhanced(outline)
         
         # 确定输出路径
-        timestamp = int(time.time())
+        timestamp = f"{int(time.time())}_{uuid.uuid4().hex[:8]}"  # 并发任务下避免文件名冲突
         output_filename = f"enhanced_{timestamp}.pptx"
         output_path = os.path.join(UPLOAD_FOLDER, output_filename)
         
@@ -1351,6 +1464,7 @@ def gen_pptx_enhanced():
             os.makedirs(html_templates_dir, exist_ok=True)
             
             # 首先预处理模板，确保HTML模板已生成
+            set_job_stage("preprocess_template")
             if template_path:
                 from preprocess_templates import preprocess_template
                 html_template_dir = os.path.join(html_templates_dir, 
@@ -1377,6 +1491,7 @@ def gen_pptx_enhanced():
             logger.error(traceback.format_exc())
             
             # 使用原始方法生成（不带模板）
+            set_job_stage("fallback")
             try:
                 # 导入无模板生成函数
                 from ppt_without_template import create_ppt_without_template
@@ -1464,10 +1579,13 @@ def preprocess_outline_data_enhanced(outline_data):
 # 保持原始的HTML中间格式API端点
 @app.route('/api/aiPpt/generate-html-ppt', methods=['POST'])
 def generate_html_ppt():
+    """使用基于HTML中间格式的方法生成PPT"""
+    return dispatch_generation('generate_html_ppt', _generate_html_ppt)
+
+def _generate_html_ppt(data):
     """使用基于HTML中间格式的方法生成PPT"""
     logger.info("=== 开始使用HTML中间格式方法生成PPT ===")
     try:
-        data = request.json
         if not data:
             return jsonify({"error": "请提供有效的JSON数据"}), 400
             
@@ -1479,7 +1597,7 @@ def generate_html_ppt():
             return jsonify({"error": "未提供大纲数据"}), 400
             
         # 生成唯一文件名
-        timestamp = int(time.time())
+        timestamp = f"{int(time.time())}_{uuid.uuid4().hex[:8]}"  # 并发任务下避免文件名冲突
         output_filename = f"html_ppt_{timestamp}.pptx"
         output_path = os.path.join(UPLOAD_FOLDER, output_filename)
         
@@ -2004,7 +2122,7 @@ ONLY返回符合JSON格式的思维导图数据，不要有其他任何文本说
         }
         
         logger.info("正在调用百炼API生成思维导图...")
-        response = requests.post(API_URL, headers=headers, json=payload)
+        response = http_client.post(API_URL, headers=headers, json=payload, timeout=http_client.LLM_TIMEOUT)
         
         if response.status_code != 200:
             logger.error(f"API请求失败: {response.status_code}, {response.text}")
@@ -2142,10 +2260,13 @@ def create_image_description(slide, topic):
 # 添加增强版PPT生成API
 @app.route('/api/enhancedPpt/generate', methods=['POST'])
 def generate_enhanced_ppt():
+    """新的增强型PPT生成API，使用自定义模板和AI生成图片"""
+    return dispatch_generation('generate_enhanced_ppt', _generate_enhanced_ppt)
+
+def _generate_enhanced_ppt(data):
     """新的增强型PPT生成API，使用自定义模板和AI生成图片"""
     logger.info("=== 开始使用增强型PPT生成 ===")
     try:
-        data = request.json
         if not data:
             return jsonify({"error": "请提供有效的JSON数据"}), 400
             
@@ -2161,7 +2282,7 @@ def generate_enhanced_ppt():
             return jsonify({"error": "必须提供主题或大纲"}), 400
         
         # 生成唯一文件名
-        timestamp = int(time.time())
+        timestamp = f"{int(time.time())}_{uuid.uuid4().hex[:8]}"  # 并发任务下避免文件名冲突
         output_filename = f"enhanced_ppt_{timestamp}.pptx"
         output_path = os.path.join(UPLOAD_FOLDER, output_filename)
         
@@ -2265,6 +2386,10 @@ if __name__ == '__main__':
         logger.error(traceback.format_exc())
         logger.warning("将继续启动应用，但模板功能可能受影响")
     
+    # 后台预热浏览器池，首个渲染请求无需等待浏览器启动
+    if os.environ.get('BROWSER_POOL_WARMUP', '1') == '1':
+        threading.Thread(target=get_browser_pool().warm_up, name="browser_pool_warmup", daemon=True).start()
+    
     # 启动应用
     port = int(os.environ.get('PORT', 5000))
     logger.info(f"启动Web服务，端口: {port}")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+幻灯片HTML后处理基准测试
+统计不同页数下填充模板、添加导航栏和编号的单页耗时，单页耗时应基本不随页数增长
+"""
+
+import os
+import sys
+import time
+import logging
+
+from ppt_engine.content_filler import fill_outline_content, SlideDecorator, get_template_catalog
+
+# 配置日志
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("benchmark_slide_postprocess")
+logging.getLogger("ppt_engine").setLevel(logging.WARNING)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "ppt_engine", "html_templates", "缘褛-教学说课-002")
+
+DECK_SIZES = [10, 50, 100, 200]
+
+def build_outline(count):
+    """构造指定页数的大纲"""
+    slides = [{"type": "cover", "title": "基准测试演示文稿", "content": "幻灯片后处理基准测试"}]
+    for i in range(1, count):
+        slides.append({
+            "type": "content",
+            "title": f"第{i}节 内容页标题",
+            "content": "这是一个内容页，用于测试后处理在大量幻灯片下的开销。",
+            "bullet_points": ["要点一", "要点二", "要点三"]
+        })
+    return slides
+
+def benchmark(templates_dir, count, repeat=3):
+    """
+    测量一套幻灯片的填充与后处理耗时
+
+    Args:
+        templates_dir: HTML模板目录
+        count: 幻灯片页数
+        repeat: 重复次数，取最小值
+
+    Returns:
+        (整套填充单页毫秒数, 后处理单页毫秒数)
+    """
+    outline = build_outline(count)
+    fill_best = post_best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fill_outline_content([dict(slide) for slide in outline], templates_dir)
+        fill_best = min(fill_best, time.perf_counter() - start)
+
+        # 单独测量后处理：对同一份已渲染的HTML做导航栏和编号
+        html = get_template_catalog(templates_dir).env.get_template("content.html").render(
+            title="标题", content="内容", bullet_points=[])
+        titles = [{"index": i, "title": slide["title"]} for i, slide in enumerate(outline)]
+        start = time.perf_counter()
+        decorator = SlideDecorator(titles)
+        for i in range(count):
+            decorator.decorate(html, i)
+        post_best = min(post_best, time.perf_counter() - start)
+    return fill_best * 1000 / count, post_best * 1000 / count
+
+def main():
+    templates_dir = sys.argv[1] if len(sys.argv) > 1 else TEMPLATES_DIR
+    if not os.path.exists(templates_dir):
+        logger.error(f"模板目录不存在: {templates_dir}")
+        return 1
+
+    # 预热模板目录缓存，避免首次编译模板计入耗时
+    fill_outline_content(build_outline(2), templates_dir)
+
+    print(f"模板目录: {templates_dir}")
+    print(f"{'页数':>6} {'填充(毫秒/页)':>14} {'后处理(毫秒/页)':>16}")
+    for count in DECK_SIZES:
+        fill_ms, post_ms = benchmark(templates_dir, count)
+        print(f"{count:>6} {fill_ms:>14.3f} {post_ms:>16.4f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,7 +11,7 @@ import logging
 import argparse
 from pptx.dml.color import RGBColor
 from improved_ppt_generator import generate_ppt, PPTGenerator
-from image_service import ImageService
+from image_service import get_image_service
 from ppt_plugins.theme_styles import get_available_themes, apply_theme_to_slide_data
 
 # 配置日志
@@ -150,8 +150,8 @@ def main():
     # 应用主题
     slides_data, theme_config = apply_theme_to_slide_data(slides_data, args.theme)
     
-    # 初始化图片服务
-    image_service = ImageService()
+    # 获取共享的图片服务
+    image_service = get_image_service()
     
     # 生成PPT
     print(f"正在使用主题 '{args.theme}' 生成PPT...")
@@ -5,7 +5,7 @@ from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
 from pptx.dml.color import RGBColor
-import requests
+import http_client
 from io import BytesIO
 
 # 配置日志
@@ -306,7 +306,7 @@ class PPTGenerator:
             img_data = None
             
             if image_url.startswith(('http://', 'https://')):
-                response = requests.get(image_url, timeout=10)
+                response = http_client.get(image_url, timeout=(http_client.CONNECT_TIMEOUT, 10))
                 if response.status_code == 200:
                     img_data = BytesIO(response.content)
                 else:
@@ -0,0 +1,174 @@
+import os
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 设置日志
+logger = logging.getLogger("http_client")
+
+# 配置
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', '16'))  # 缓存的主机连接池数量
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '32'))  # 每个主机的最大保持连接数
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '60'))
+LLM_READ_TIMEOUT = float(os.environ.get('HTTP_LLM_READ_TIMEOUT', '180'))
+MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '3'))
+BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', '0.5'))  # 退避基数（秒）
+BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', '10'))  # 单次退避上限（秒）
+
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+LLM_TIMEOUT = (CONNECT_TIMEOUT, LLM_READ_TIMEOUT)  # 大模型生成耗时较长
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# 重复发送不会产生副作用的方法；其他方法（POST等，如大模型生成、异步任务创建）
+# 只在请求确定未被服务器处理时重试：建立连接失败，或服务器以429拒绝
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"}
+NON_IDEMPOTENT_RETRY_STATUSES = {429}
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """获取共享的HTTP会话，按主机复用keep-alive连接"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS,
+                                      pool_maxsize=HTTP_POOL_MAXSIZE,
+                                      max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+class _EndpointMetrics:
+    """按接口统计请求次数、错误、重试和耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, elapsed, status=None, retries=0, error=False):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = {"count": 0, "errors": 0, "retries": 0, "total_time": 0.0, "max_time": 0.0, "last_status": None}
+                self._endpoints[endpoint] = stats
+            stats["count"] += 1
+            stats["retries"] += retries
+            stats["total_time"] += elapsed
+            stats["max_time"] = max(stats["max_time"], elapsed)
+            if error:
+                stats["errors"] += 1
+            if status is not None:
+                stats["last_status"] = status
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                result[endpoint] = {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "retries": stats["retries"],
+                    "avg_ms": round(stats["total_time"] / stats["count"] * 1000, 1) if stats["count"] else 0.0,
+                    "max_ms": round(stats["max_time"] * 1000, 1),
+                    "last_status": stats["last_status"]
+                }
+            return result
+
+_metrics = _EndpointMetrics()
+
+def get_http_metrics():
+    """返回各接口的请求统计"""
+    return _metrics.snapshot()
+
+def _endpoint_name(method, url):
+    """接口名称：方法 + 主机 + 路径（不含查询参数，避免泄露令牌）"""
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.netloc}{parts.path}"
+
+def _backoff_delay(attempt, response=None):
+    """计算带随机抖动的指数退避时间，优先遵循Retry-After"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.5)
+
+def request(method, url, retries=MAX_RETRIES, idempotent=None, **kwargs):
+    """
+    发送HTTP请求
+
+    使用共享连接池，未指定timeout时使用默认超时，按带抖动的指数退避重试：
+    幂等请求遇到429/5xx、连接错误或超时时重试；
+    非幂等请求只在连接失败或429时重试，读取超时和5xx时服务器可能已经处理，不再重复提交。
+
+    Args:
+        method: HTTP方法
+        url: 请求地址
+        retries: 最大重试次数
+        idempotent: 请求是否可以安全地重复发送，为None时按HTTP方法判断
+        kwargs: 透传给requests的参数
+
+    Returns:
+        requests.Response，重试用尽后返回最后一次响应或抛出最后一次异常
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    endpoint = _endpoint_name(method, url)
+    session = get_session()
+    start_time = time.time()
+
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    if idempotent:
+        retry_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        retry_statuses = RETRY_STATUSES
+    else:
+        # ConnectTimeout是ConnectionError的子类，ReadTimeout不是
+        retry_errors = requests.exceptions.ConnectionError
+        retry_statuses = NON_IDEMPOTENT_RETRY_STATUSES
+
+    attempt = 0
+    while True:
+        try:
+            response = session.request(method, url, **kwargs)
+        except retry_errors as e:
+            if attempt >= retries:
+                _metrics.record(endpoint, time.time() - start_time, retries=attempt, error=True)
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning(f"{endpoint} 请求失败: {str(e)}，{delay:.2f}秒后重试 ({attempt + 1}/{retries})")
+        except requests.exceptions.RequestException:
+            _metrics.record(endpoint, time.time() - start_time, retries=attempt, error=True)
+            raise
+        else:
+            if response.status_code not in retry_statuses or attempt >= retries:
+                _metrics.record(endpoint, time.time() - start_time, status=response.status_code,
+                                retries=attempt, error=response.status_code >= 400)
+                return response
+            delay = _backoff_delay(attempt, response)
+            logger.warning(f"{endpoint} 返回 {response.status_code}，{delay:.2f}秒后重试 ({attempt + 1}/{retries})")
+            response.close()
+
+        time.sleep(delay)
+        attempt += 1
+
+def get(url, **kwargs):
+    """发送GET请求"""
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    """发送POST请求"""
+    return request("POST", url, **kwargs)
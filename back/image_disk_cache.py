@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+
+# 设置日志
+logger = logging.getLogger("image_disk_cache")
+
+# 配置
+IMAGE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache')
+IMAGE_DISK_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_DISK_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))  # 默认512MB
+INDEX_FILENAME = "index.sqlite3"
+
+class ImageDiskCache:
+    """
+    基于内容寻址的图片磁盘缓存
+
+    以规范化提示词和生成参数的哈希值作为键，文件名即为键值，
+    使用SQLite记录索引（大小、访问时间），超出容量时按LRU淘汰。
+    SQLite的WAL模式和原子重命名保证多个worker同时写入时的安全性。
+    """
+
+    def __init__(self, cache_dir=IMAGE_CACHE_DIR, max_bytes=IMAGE_DISK_CACHE_MAX_BYTES):
+        """
+        初始化磁盘缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, INDEX_FILENAME)
+        self._local = threading.local()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._init_index()
+
+    def _connect(self):
+        """获取当前线程的SQLite连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_index(self):
+        """创建索引表"""
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                key TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                prompt TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_images_last_access ON images(last_access)")
+
+    @staticmethod
+    def normalize_prompt(prompt):
+        """规范化提示词：去除首尾空白、合并连续空白、转小写"""
+        return re.sub(r'\s+', ' ', prompt or '').strip().lower()
+
+    @classmethod
+    def make_key(cls, prompt, **params):
+        """
+        根据提示词和生成参数计算缓存键
+
+        Args:
+            prompt: 图片提示词
+            params: 影响生成结果的参数（模型、尺寸、风格等）
+
+        Returns:
+            SHA-256十六进制字符串
+        """
+        payload = json.dumps({
+            "prompt": cls.normalize_prompt(prompt),
+            "params": params
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        查找缓存的图片
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            本地文件路径，未命中时返回None
+        """
+        conn = self._connect()
+        row = conn.execute("SELECT filename FROM images WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+
+        file_path = os.path.join(self.cache_dir, row[0])
+        if not os.path.exists(file_path):
+            # 文件已被外部删除，清理索引
+            conn.execute("DELETE FROM images WHERE key = ?", (key,))
+            return None
+
+        conn.execute("UPDATE images SET last_access = ? WHERE key = ?", (time.time(), key))
+        return file_path
+
+    def put(self, key, data, ext=".jpg", prompt=""):
+        """
+        写入图片到缓存
+
+        Args:
+            key: 缓存键
+            data: 图片二进制数据
+            ext: 文件扩展名
+            prompt: 原始提示词，仅用于排查
+
+        Returns:
+            本地文件路径
+        """
+        filename = f"{key}{ext}"
+        file_path = os.path.join(self.cache_dir, filename)
+
+        # 先写临时文件再原子替换，避免并发写入时读到不完整的文件
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_", suffix=ext)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, file_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO images (key, filename, size, created_at, last_access, prompt) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, filename, len(data), now, now, (prompt or "")[:200])
+        )
+
+        self._evict()
+        return file_path
+
+    def _evict(self):
+        """超出容量时按最久未访问顺序淘汰"""
+        if self.max_bytes <= 0:
+            return
+
+        conn = self._connect()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = []
+            for key, filename, size in conn.execute(
+                    "SELECT key, filename, size FROM images ORDER BY last_access ASC").fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM images WHERE key = ?", (key,))
+                removed.append(filename)
+                total -= size
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        for filename in removed:
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except OSError:
+                pass
+
+        if removed:
+            logger.info(f"图片磁盘缓存淘汰了 {len(removed)} 个文件")
+
+    def stats(self):
+        """返回缓存统计信息"""
+        conn = self._connect()
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+        return {
+            "entries": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes
+        }
+
+
+# 单例实例
+_disk_cache_instance = None
+_disk_cache_lock = threading.Lock()
+
+def get_image_disk_cache():
+    """获取图片磁盘缓存的单例实例"""
+    global _disk_cache_instance
+    if _disk_cache_instance is None:
+        with _disk_cache_lock:
+            if _disk_cache_instance is None:
+                _disk_cache_instance = ImageDiskCache()
+    return _disk_cache_instance
@@ -0,0 +1,87 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# 设置日志
+logger = logging.getLogger("image_prefetch")
+
+# 配置
+IMAGE_PREFETCH_WORKERS = int(os.environ.get('IMAGE_PREFETCH_WORKERS', '8'))  # 整个演示文稿共用的最大并发数
+DEFAULT_PROVIDER_LIMIT = int(os.environ.get('IMAGE_PROVIDER_LIMIT', '4'))
+
+# 各图片来源的并发上限，避免触发服务商的限流
+PROVIDER_LIMITS = {
+    "aliyun": int(os.environ.get('IMAGE_PROVIDER_LIMIT_ALIYUN', '2')),
+    "baidu": int(os.environ.get('IMAGE_PROVIDER_LIMIT_BAIDU', '2')),
+    "custom": int(os.environ.get('IMAGE_PROVIDER_LIMIT_CUSTOM', '2')),
+    "http": int(os.environ.get('IMAGE_PROVIDER_LIMIT_HTTP', '8'))
+}
+
+_provider_semaphores = {}
+_provider_semaphores_lock = threading.Lock()
+
+def _get_provider_semaphore(provider):
+    """获取图片来源对应的信号量"""
+    with _provider_semaphores_lock:
+        semaphore = _provider_semaphores.get(provider)
+        if semaphore is None:
+            limit = PROVIDER_LIMITS.get(provider, DEFAULT_PROVIDER_LIMIT)
+            semaphore = threading.BoundedSemaphore(max(1, limit))
+            _provider_semaphores[provider] = semaphore
+        return semaphore
+
+@contextmanager
+def provider_slot(provider):
+    """
+    占用某个图片来源的一个并发名额
+
+    在调用外部图片API或下载图片时使用，
+    保证同一来源的并发请求数不超过PROVIDER_LIMITS中的上限。
+
+    Args:
+        provider: 图片来源名称，如aliyun、baidu、http
+    """
+    semaphore = _get_provider_semaphore(provider)
+    semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+def resolve_images(tasks, max_workers=IMAGE_PREFETCH_WORKERS):
+    """
+    并发解析整个演示文稿的图片请求
+
+    Args:
+        tasks: 字典，键为调用方自定义的标识（如幻灯片索引），值为无参可调用对象
+        max_workers: 线程池大小
+
+    Returns:
+        字典，键与tasks相同，值为可调用对象的返回值；失败时为None
+    """
+    if not tasks:
+        return {}
+
+    start_time = time.time()
+    results = {}
+
+    def run(key, task):
+        try:
+            return task()
+        except Exception as e:
+            logger.error(f"图片请求 {key} 处理失败: {str(e)}")
+            return None
+
+    workers = max(1, min(max_workers, len(tasks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image_prefetch") as executor:
+        futures = {key: executor.submit(run, key, task) for key, task in tasks.items()}
+        for key, future in futures.items():
+            results[key] = future.result()
+
+    elapsed_time = time.time() - start_time
+    resolved = sum(1 for value in results.values() if value)
+    logger.info(f"并发解析图片完成: {resolved}/{len(tasks)} 成功, 并发数: {workers}, 耗时: {elapsed_time:.2f}秒")
+    return results
@@ -1,17 +1,22 @@
 import os
-import requests
+import http_client
 import logging
 import traceback
 import json
 import base64
 import time
 import random
+import threading
+from collections import OrderedDict
 from io import BytesIO
 from PIL import Image, ImageEnhance, ImageFilter
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
 from functools import lru_cache
 import re # Added missing import for re
+from image_disk_cache import get_image_disk_cache
+from image_prefetch import provider_slot
+from text_tokenizer import extract_keywords
 
 # 配置日志
 logging.basicConfig(
@@ -24,17 +29,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger("image_service")
 
-# 尝试导入jieba，如果不可用则使用简单的分词方法
-try:
-    import jieba
-    import jieba.analyse
-    jieba.initialize()
-    HAS_JIEBA = True
-    logger.info("成功导入jieba分词库")
-except ImportError:
-    HAS_JIEBA = False
-    logger.warning("未找到jieba分词库，将使用简单的分词方法")
-
 # 尝试导入numpy
 try:
     import numpy as np
@@ -43,49 +37,6 @@ except ImportError:
     HAS_NUMPY = False
     logger.warning("未找到numpy库，部分高级功能可能不可用")
 
-# 添加一些常用的中文停用词
-STOPWORDS = set([
-    "的", "了", "和", "是", "在", "有", "与", "这", "那", "个", "们", "中", "to", "the", "and", "in", "of", "a", "for",
-    "我", "你", "他", "她", "它", "我们", "你们", "他们", "她们", "它们", "自己", "什么", "哪些", "怎么", "怎样", "如何",
-    "因为", "所以", "但是", "可是", "然而", "而且", "并且", "或者", "如果", "虽然", "就是", "只是", "还是", "也是", 
-    "不是", "没有", "可以", "应该", "需要", "一个", "一种", "一些", "这个", "这些", "那个", "那些", "以及", "或者"
-])
-
-# 简单的中文分词函数
-def simple_chinese_tokenize(text):
-    """简单的中文分词函数，不依赖jieba"""
-    if not text:
-        return []
-    
-    # 标点符号和空格
-    punctuations = set('''，。！？；：""''（）【】《》、…—·,.!?;:()[]<>"\'/\\''')
-    
-    # 存储分词结果
-    tokens = []
-    current_token = ""
-    
-    for char in text:
-        if char in punctuations or char.isspace():
-            if current_token:
-                tokens.append(current_token)
-                current_token = ""
-        else:
-            # 中文字符单独成词
-            if ord(char) > 127:
-                if current_token:
-                    tokens.append(current_token)
-                    current_token = ""
-                tokens.append(char)
-            else:
-                # 英文和数字连续成词
-                current_token += char
-    
-    # 处理最后一个token
-    if current_token:
-        tokens.append(current_token)
-    
-    return tokens
-
 # 加载环境变量
 load_dotenv()
 
@@ -95,6 +46,8 @@ BAIDU_API_KEY = os.environ.get('BAIDU_API_KEY', '')  # 百度API密钥
 BAIDU_SECRET_KEY = os.environ.get('BAIDU_SECRET_KEY', '')  # 百度Secret Key
 IMAGE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache')
 DEFAULT_IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'default_images')
+IMAGE_RESULT_CACHE_SIZE = int(os.environ.get('IMAGE_RESULT_CACHE_SIZE', '256'))  # 内存结果缓存最大条目数
+IMAGE_RESULT_CACHE_TTL = int(os.environ.get('IMAGE_RESULT_CACHE_TTL', '3600'))  # 内存结果缓存有效期（秒）
 
 # 确保缓存目录存在
 os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
@@ -131,17 +84,96 @@ TOPIC_KEYWORDS = {
     "经济": ["economy", "economic", "经济", "金融"]
 }
 
+class ImageResultCache:
+    """线程安全的图片结果缓存，支持LRU淘汰和过期时间"""
+    
+    def __init__(self, max_size=IMAGE_RESULT_CACHE_SIZE, ttl=IMAGE_RESULT_CACHE_TTL):
+        """
+        初始化结果缓存
+        
+        Args:
+            max_size: 最大缓存条目数
+            ttl: 缓存有效期（秒），小于等于0表示永不过期
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (写入时间, 值)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """获取缓存值，未命中或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            stored_at, value = entry
+            if self.ttl > 0 and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            
+            # 标记为最近使用
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def __contains__(self, key):
+        return self.get(key) is not None
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
 class ImageService:
     """图片生成服务"""
     
-    def __init__(self):
-        """初始化图片服务"""
+    def __init__(self, cache_size=IMAGE_RESULT_CACHE_SIZE, cache_ttl=IMAGE_RESULT_CACHE_TTL):
+        """
+        初始化图片服务
+        
+        Args:
+            cache_size: 内存结果缓存最大条目数
+            cache_ttl: 内存结果缓存有效期（秒）
+        """
         self.aliyun_api_key = API_KEY
         self.baidu_api_key = BAIDU_API_KEY
         self.baidu_secret_key = BAIDU_SECRET_KEY
         self.baidu_access_token = None
         self.baidu_token_expire_time = 0
-        self.image_cache = {}  # 内存缓存，避免重复请求
+        self.image_cache = ImageResultCache(cache_size, cache_ttl)  # 内存缓存，避免重复请求
         
         # 初始化默认图片库
         self._initialize_default_images()
@@ -181,24 +213,27 @@ class ImageService:
         
         # 检查是否有缓存
         cache_key = f"gen_{enhanced_prompt}"
-        if cache_key in self.image_cache:
+        cached_image = self.image_cache.get(cache_key)
+        if cached_image:
             logger.info(f"使用缓存的图片结果")
-            return self.image_cache[cache_key]
+            return cached_image
         
         # 尝试使用阿里云API生成图片
         try:
-            image_path = self._generate_with_aliyun(enhanced_prompt)
+            with provider_slot("aliyun"):
+                image_path = self._generate_with_aliyun(enhanced_prompt)
             if image_path:
-                self.image_cache[cache_key] = image_path
+                self.image_cache.set(cache_key, image_path)
                 return image_path
         except Exception as e:
             logger.error(f"阿里云图片生成API请求失败: {str(e)}")
         
         # 尝试使用百度API生成图片
         try:
-            image_path = self._generate_with_baidu(enhanced_prompt)
+            with provider_slot("baidu"):
+                image_path = self._generate_with_baidu(enhanced_prompt)
             if image_path:
-                self.image_cache[cache_key] = image_path
+                self.image_cache.set(cache_key, image_path)
                 return image_path
         except Exception as e:
             logger.error(f"百度图片生成API请求失败: {str(e)}")
@@ -206,7 +241,7 @@ class ImageService:
         # 如果生成失败，使用默认图片
         default_image = self._get_default_image_for_prompt(prompt, slide_data)
         logger.info(f"生成失败，使用默认图片: {default_image}")
-        self.image_cache[cache_key] = default_image
+        self.image_cache.set(cache_key, default_image)
         return default_image
     
     def _enhance_prompt_from_slide_data(self, prompt, slide_data):
@@ -245,17 +280,12 @@ class ImageService:
             
         # 添加内容摘要
         if content and len(content) > 10:
-            # 使用jieba提取关键词
-            if HAS_JIEBA:
-                try:
-                    keywords = jieba.analyse.extract_tags(content, topK=8)
-                    if keywords:
-                        enhanced_parts.append(" ".join([str(k) for k in keywords]))
-                except:
-                    # 如果jieba失败，添加内容的前50个字符
-                    enhanced_parts.append(content[:50])
+            # 提取关键词
+            keywords = extract_keywords(content, top_k=8)
+            if keywords:
+                enhanced_parts.append(" ".join([str(k) for k in keywords]))
             else:
-                # 如果没有jieba，添加内容的前50个字符
+                # 没有提取到关键词时，添加内容的前50个字符
                 enhanced_parts.append(content[:50])
             
         # 添加要点
@@ -406,7 +436,7 @@ class ImageService:
         """
         if not self.aliyun_api_key:
             logger.warning("未配置阿里云API密钥")
-        return None
+            return None
         
         logger.info(f"尝试使用阿里云API生成图片: {prompt[:100]}...")
             
@@ -431,6 +461,13 @@ class ImageService:
         # 确定图片尺寸 - 使用16:9比例更适合PPT
         size = "1024*576"  # 16:9比例
         
+        # 检查磁盘缓存（相同提示词和参数直接复用）
+        cache_key = get_image_disk_cache().make_key(prompt, provider="aliyun", model="wanx-v1", style=style, size=size)
+        cached_path = get_image_disk_cache().get(cache_key)
+        if cached_path:
+            logger.info(f"使用磁盘缓存的图片: {cached_path}")
+            return f"file://{os.path.abspath(cached_path)}"
+        
         # 请求参数
         data = {
             "model": "wanx-v1",
@@ -447,7 +484,7 @@ class ImageService:
         
         try:
             # 发送请求
-            response = requests.post(api_url, headers=headers, json=data, timeout=30)
+            response = http_client.post(api_url, headers=headers, json=data, timeout=(http_client.CONNECT_TIMEOUT, 30))
             response.raise_for_status()
             
             # 解析响应
@@ -458,7 +495,7 @@ class ImageService:
                 image_url = result["output"]["results"][0].get("url")
                 if image_url:
                     # 下载并缓存图片
-                    image_path = self._download_and_cache_image(image_url, prompt)
+                    image_path = self._download_and_cache_image(image_url, prompt, cache_key)
                     logger.info(f"成功生成图片: {image_path}")
                     return image_path
                     
@@ -468,22 +505,21 @@ class ImageService:
             logger.error(f"阿里云图片生成API请求失败: {str(e)}")
             return None
     
-    def _enhance_image(self, image_path):
+    def _enhance_image(self, image_data):
         """
         增强图片质量
         
         Args:
-            image_path: 图片路径
+            image_data: 图片二进制数据
             
         Returns:
-            增强后的图片路径
+            增强后的图片二进制数据，失败时返回原始数据
         """
         try:
             # 打开图片
-            if image_path.startswith("file://"):
-                image_path = image_path[7:]
-                
-            image = Image.open(image_path)
+            image = Image.open(BytesIO(image_data))
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
             
             # 调整大小以确保不超过PPT幻灯片大小(1920x1080)
             max_size = (1920, 1080)
@@ -497,14 +533,14 @@ class ImageService:
             enhancer = ImageEnhance.Contrast(image)
             image = enhancer.enhance(1.2)
             
-            # 保存增强后的图片
-            output_path = f"{os.path.splitext(image_path)[0]}_enhanced{os.path.splitext(image_path)[1]}"
-            image.save(output_path, quality=95)
+            # 输出增强后的图片
+            output = BytesIO()
+            image.save(output, format="JPEG", quality=95)
             
-            return f"file://{os.path.abspath(output_path)}"
+            return output.getvalue()
         except Exception as e:
             logger.warning(f"图片增强失败: {str(e)}")
-            return image_path
+            return image_data
     
     def _get_baidu_access_token(self):
         """获取百度AI平台的访问令牌"""
@@ -528,7 +564,7 @@ class ImageService:
         }
         
         try:
-            response = requests.post(token_url, params=params)
+            response = http_client.post(token_url, params=params, timeout=(http_client.CONNECT_TIMEOUT, 15), idempotent=True)
             response.raise_for_status()
             
             result = response.json()
@@ -580,6 +616,13 @@ class ImageService:
             steps = 30  # 增加步数以获得更多细节
             sampler = 'DPM++ SDE Karras'  # 更适合细节丰富的图像
             
+        # 检查磁盘缓存（相同提示词和参数直接复用）
+        cache_key = get_image_disk_cache().make_key(prompt, provider="baidu", model="sd_xl", size=size, steps=steps, sampler=sampler)
+        cached_path = get_image_disk_cache().get(cache_key)
+        if cached_path:
+            logger.info(f"使用磁盘缓存的图片: {cached_path}")
+            return f"file://{os.path.abspath(cached_path)}"
+            
         # 请求参数
         data = {
             'prompt': prompt,
@@ -598,7 +641,7 @@ class ImageService:
         
         try:
             # 发送请求
-            response = requests.post(api_url, headers=headers, params=params, json=data)
+            response = http_client.post(api_url, headers=headers, params=params, json=data, timeout=http_client.DEFAULT_TIMEOUT)
             response.raise_for_status()
             
             # 解析响应
@@ -617,13 +660,8 @@ class ImageService:
                 # 解码图片数据
                 image_data = base64.b64decode(base64_image)
                 
-                # 保存到文件
-                timestamp = int(time.time())
-                image_filename = f"baidu_generated_{timestamp}.png"
-                image_path = os.path.join(IMAGE_CACHE_DIR, image_filename)
-                
-                with open(image_path, "wb") as f:
-                    f.write(image_data)
+                # 保存到磁盘缓存
+                image_path = get_image_disk_cache().put(cache_key, image_data, ext=".png", prompt=prompt)
                     
                 logger.info(f"成功使用百度API生成图片: {image_path}")
                 return f"file://{os.path.abspath(image_path)}"
@@ -634,81 +672,51 @@ class ImageService:
             logger.error(f"百度图片生成API请求失败: {str(e)}")
             return None
     
-    def _download_and_cache_image(self, image_url, prompt):
+    def _download_and_cache_image(self, image_url, prompt, cache_key=None):
         """
-        下载并缓存图片
+        下载、增强并缓存图片
         
         Args:
             image_url: 图片URL
-            prompt: 提示词，用于文件名
+            prompt: 提示词
+            cache_key: 磁盘缓存键，为空时仅按提示词计算
             
         Returns:
             本地图片文件路径
         """
         try:
             # 下载图片
-            response = requests.get(image_url, timeout=15)
+            response = http_client.get(image_url, timeout=(http_client.CONNECT_TIMEOUT, 15))
             response.raise_for_status()
             
-            # 生成文件名
-            timestamp = int(time.time())
-            # 使用提示词的前20个字符作为文件名，去除特殊字符
-            safe_prompt = re.sub(r'[^a-zA-Z0-9\u4e00-\u9fa5]', '_', prompt)[:20]
-            image_filename = f"{safe_prompt}_{timestamp}.jpg"
-            image_path = os.path.join(IMAGE_CACHE_DIR, image_filename)
+            # 增强图片
+            image_data = self._enhance_image(response.content)
             
-            # 保存图片
-            with open(image_path, "wb") as f:
-                f.write(response.content)
+            # 按内容寻址写入磁盘缓存
+            disk_cache = get_image_disk_cache()
+            if not cache_key:
+                cache_key = disk_cache.make_key(prompt)
+            image_path = disk_cache.put(cache_key, image_data, ext=".jpg", prompt=prompt)
                 
             logger.info(f"图片已下载并缓存: {image_path}")
             
-            # 增强图片
-            enhanced_path = self._enhance_image(image_path)
-            
-            return f"file://{os.path.abspath(enhanced_path or image_path)}"
+            return f"file://{os.path.abspath(image_path)}"
         except Exception as e:
             logger.error(f"下载图片失败: {str(e)}")
             return None
 
-def extract_keywords(text, top_k=5):
-    """
-    从文本中提取关键词
-    
-    Args:
-        text: 输入文本
-        top_k: 返回的关键词数量
-        
-    Returns:
-        关键词列表
-    """
-    if not text:
-        return []
-        
-    # 使用jieba提取关键词
-    if HAS_JIEBA:
-        try:
-            return jieba.analyse.extract_tags(text, topK=top_k)
-        except Exception as e:
-            logger.warning(f"使用jieba提取关键词失败: {str(e)}")
-    
-    # 如果jieba失败或不可用，使用简单的词频统计
-    words = simple_chinese_tokenize(text)
-    word_freq = {}
-    
-    for word in words:
-        if len(word) > 1 and word.lower() not in STOPWORDS:
-            word = word.lower()
-            if word in word_freq:
-                word_freq[word] += 1
-            else:
-                word_freq[word] = 1
-    
-    # 按词频排序
-    sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-    
-    # 返回top_k个关键词
-    return [word for word, _ in sorted_words[:top_k]]
+# 单例实例
+_image_service_instance = None
+_image_service_lock = threading.Lock()
+
+def get_image_service():
+    """获取图片服务的单例实例（线程安全）"""
+    global _image_service_instance
+    if _image_service_instance is None:
+        with _image_service_lock:
+            if _image_service_instance is None:
+                _image_service_instance = ImageService()
+    return _image_service_instance
 
 def get_image_for_slide(slide_data):
     """
@@ -722,8 +730,8 @@ def get_image_for_slide(slide_data):
     """
     logger.info(f"为幻灯片获取图片: {slide_data.get('title', '')}")
     
-    # 初始化图片服务
-    image_service = ImageService()
+    # 获取共享的图片服务
+    image_service = get_image_service()
     
     # 从幻灯片数据构建图片描述
     image_prompt = _build_image_prompt(slide_data)
@@ -789,8 +797,8 @@ def _get_default_image_bytes(slide_data):
     Returns:
         默认图片的数据URI或文件路径
     """
-    # 初始化图片服务
-    image_service = ImageService()
+    # 获取共享的图片服务
+    image_service = get_image_service()
 
     # 构建默认图片描述
     image_prompt = _build_image_prompt(slide_data)
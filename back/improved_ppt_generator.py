@@ -16,10 +16,11 @@ from pptx.enum.text import PP_ALIGN, MSO_AUTO_SIZE
 from pptx.enum.shapes import MSO_SHAPE_TYPE
 from pptx.dml.color import RGBColor
 from io import BytesIO
-import requests
+import http_client
 from abc import ABC, abstractmethod
 import importlib
 import inspect
+from image_prefetch import resolve_images, provider_slot
 
 # 尝试导入其他可能有用的库
 try:
@@ -231,97 +232,13 @@ class ImageComponent(SlideComponentBase):
                     image_placeholder = shape
                     break
                     
-            # 确定图片数据
-            image_data = None
-            image_path = None
-            image_url = None
-            
-            # 如果提供了图片URL或数据
-            if data.get('image'):
-                image_url = data['image']
-                logger.info(f"幻灯片提供了图片信息: {image_url[:100] if isinstance(image_url, str) else type(image_url)}")
-                
-                # 处理不同类型的图片数据
-                if isinstance(image_url, str):
-                    if image_url.startswith('http://') or image_url.startswith('https://'):
-                        try:
-                            logger.info(f"尝试下载图片URL: {image_url}")
-                            response = requests.get(image_url, stream=True, timeout=10)
-                            response.raise_for_status()
-                            image_data = response.content
-                            logger.info(f"成功下载图片，大小: {len(image_data)} 字节")
-                        except Exception as e:
-                            logger.warning(f"下载图片失败: {str(e)}")
-                    elif image_url.startswith('/'):
-                        # 本地路径，构建完整路径
-                        local_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                                 image_url.lstrip('/'))
-                        logger.info(f"处理本地图片路径: {local_path}")
-                        if os.path.exists(local_path):
-                            try:
-                                with open(local_path, 'rb') as f:
-                                    image_data = f.read()
-                                logger.info(f"成功加载本地图片，大小: {len(image_data)} 字节")
-                            except Exception as e:
-                                logger.warning(f"读取本地图片失败: {str(e)}")
-                        else:
-                            logger.warning(f"本地图片路径不存在: {local_path}")
-                    else:
-                        # 可能是图片描述而非URL，尝试使用图片服务生成
-                        logger.info(f"检测到图片描述，尝试生成图片: {image_url}")
-            
-            # 如果没有有效的图片数据，尝试使用图片服务
-            if not image_data and context and context.get('image_service'):
-                image_service = context['image_service']
-                logger.info("使用图片服务生成图片")
-                
-                # 构建图片描述
-                if isinstance(data.get('image'), str) and not data['image'].startswith(('http://', 'https://', '/')):
-                    # 如果已有图片描述，直接使用
-                    image_prompt = data['image']
-                else:
-                    # 否则从幻灯片内容构建描述
-                    image_prompt = f"{data.get('title', '')}"
-                    if data.get('content'):
-                        image_prompt += f" - {data.get('content', '')[:100]}"
-                    if data.get('keypoints'):
-                        points_str = ", ".join([str(p) for p in data.get('keypoints', [])[:3]])
-                        image_prompt += f" - {points_str}"
-                
-                logger.info(f"图片生成提示词: {image_prompt}")
-                
-                # 调用图片服务获取图片
-                try:
-                    # 直接使用图片服务的图片生成函数
-                    image_url = image_service.generate_image(image_prompt)
-                    logger.info(f"图片生成成功，URL: {image_url}")
-                    
-                    # 从URL加载图片数据
-                    if image_url:
-                        if image_url.startswith('http'):
-                            # 网络URL
-                            response = requests.get(image_url, timeout=10)
-                            response.raise_for_status()
-                            image_data = response.content
-                        elif image_url.startswith('/'):
-                            # 本地路径
-                            local_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                                     image_url.lstrip('/'))
-                            if os.path.exists(local_path):
-                                with open(local_path, 'rb') as f:
-                                    image_data = f.read()
-                except Exception as e:
-                    logger.error(f"图片生成/获取失败: {str(e)}")
-            
-            # 如果还是没有图片数据，尝试使用默认图片
-            if not image_data:
-                logger.warning("无法获取或生成图片，使用默认图片")
-                default_image_path = self._get_default_image(data)
-                if default_image_path and os.path.exists(default_image_path):
-                    with open(default_image_path, 'rb') as f:
-                        image_data = f.read()
-                else:
-                    logger.error(f"默认图片不存在: {default_image_path}")
+            # 确定图片数据：优先使用并发预取阶段的结果
+            prefetched_images = context.get('prefetched_images') if context else None
+            slide_index = context.get('slide_index') if context else None
+            if prefetched_images is not None and slide_index in prefetched_images:
+                image_data = prefetched_images[slide_index]
+            else:
+                image_data = self.resolve_image_data(data, context)
             
             # 如果有图片数据，添加到幻灯片
             if image_data:
@@ -367,6 +284,115 @@ class ImageComponent(SlideComponentBase):
                     
         return slide
         
+    def resolve_image_data(self, data, context=None):
+        """
+        获取幻灯片所需的图片数据（下载、生成或默认图片）
+        
+        该方法不修改幻灯片，可在预取阶段并发调用
+        
+        Args:
+            data: 幻灯片数据
+            context: 上下文信息
+            
+        Returns:
+            图片二进制数据，失败时返回None
+        """
+        # 确定图片数据
+        image_data = None
+        image_path = None
+        image_url = None
+        
+        # 如果提供了图片URL或数据
+        if data.get('image'):
+            image_url = data['image']
+            logger.info(f"幻灯片提供了图片信息: {image_url[:100] if isinstance(image_url, str) else type(image_url)}")
+            
+            # 处理不同类型的图片数据
+            if isinstance(image_url, str):
+                if image_url.startswith('http://') or image_url.startswith('https://'):
+                    try:
+                        logger.info(f"尝试下载图片URL: {image_url}")
+                        with provider_slot("http"):
+                            response = http_client.get(image_url, timeout=(http_client.CONNECT_TIMEOUT, 10))
+                            response.raise_for_status()
+                            image_data = response.content
+                        logger.info(f"成功下载图片，大小: {len(image_data)} 字节")
+                    except Exception as e:
+                        logger.warning(f"下载图片失败: {str(e)}")
+                elif image_url.startswith('/'):
+                    # 本地路径，构建完整路径
+                    local_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
+                                             image_url.lstrip('/'))
+                    logger.info(f"处理本地图片路径: {local_path}")
+                    if os.path.exists(local_path):
+                        try:
+                            with open(local_path, 'rb') as f:
+                                image_data = f.read()
+                            logger.info(f"成功加载本地图片，大小: {len(image_data)} 字节")
+                        except Exception as e:
+                            logger.warning(f"读取本地图片失败: {str(e)}")
+                    else:
+                        logger.warning(f"本地图片路径不存在: {local_path}")
+                else:
+                    # 可能是图片描述而非URL，尝试使用图片服务生成
+                    logger.info(f"检测到图片描述，尝试生成图片: {image_url}")
+        
+        # 如果没有有效的图片数据，尝试使用图片服务
+        if not image_data and context and context.get('image_service'):
+            image_service = context['image_service']
+            logger.info("使用图片服务生成图片")
+            
+            # 构建图片描述
+            if isinstance(data.get('image'), str) and not data['image'].startswith(('http://', 'https://', '/')):
+                # 如果已有图片描述，直接使用
+                image_prompt = data['image']
+            else:
+                # 否则从幻灯片内容构建描述
+                image_prompt = f"{data.get('title', '')}"
+                if data.get('content'):
+                    image_prompt += f" - {data.get('content', '')[:100]}"
+                if data.get('keypoints'):
+                    points_str = ", ".join([str(p) for p in data.get('keypoints', [])[:3]])
+                    image_prompt += f" - {points_str}"
+            
+            logger.info(f"图片生成提示词: {image_prompt}")
+            
+            # 调用图片服务获取图片
+            try:
+                # 直接使用图片服务的图片生成函数
+                image_url = image_service.generate_image(image_prompt)
+                logger.info(f"图片生成成功，URL: {image_url}")
+                
+                # 从URL加载图片数据
+                if image_url:
+                    if image_url.startswith('http'):
+                        # 网络URL
+                        with provider_slot("http"):
+                            response = http_client.get(image_url, timeout=(http_client.CONNECT_TIMEOUT, 10))
+                            response.raise_for_status()
+                            image_data = response.content
+                    elif image_url.startswith('/'):
+                        # 本地路径
+                        local_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
+                                                 image_url.lstrip('/'))
+                        if os.path.exists(local_path):
+                            with open(local_path, 'rb') as f:
+                                image_data = f.read()
+            except Exception as e:
+                logger.error(f"图片生成/获取失败: {str(e)}")
+        
+        # 如果还是没有图片数据，尝试使用默认图片
+        if not image_data:
+            logger.warning("无法获取或生成图片，使用默认图片")
+            default_image_path = self._get_default_image(data)
+            if default_image_path and os.path.exists(default_image_path):
+                with open(default_image_path, 'rb') as f:
+                    image_data = f.read()
+            else:
+                logger.error(f"默认图片不存在: {default_image_path}")
+        
+        return image_data
+        
     def _get_default_image(self, slide_data):
         """获取适合幻灯片内容的默认图片"""
         # 默认图片目录
@@ -765,9 +791,14 @@ class PPTGenerator:
             # 存储幻灯片数据
             self.slides_data = slides_data
             
+            # 并发预取所有幻灯片的图片
+            context = dict(context or {})
+            context['prefetched_images'] = self._prefetch_images(slides_data, context)
+            
             # 创建所有幻灯片
             for i, slide_data in enumerate(slides_data):
                 logger.info(f"创建第 {i+1}/{len(slides_data)} 张幻灯片")
+                context['slide_index'] = i
                 self.create_slide(slide_data, context)
                 
             # 保存演示文稿
@@ -781,6 +812,31 @@ class PPTGenerator:
             logger.error(traceback.format_exc())
             return False
             
+    def _prefetch_images(self, slides_data, context):
+        """
+        收集所有幻灯片的图片请求并并发解析
+        
+        Args:
+            slides_data: 幻灯片数据列表
+            context: 上下文信息
+            
+        Returns:
+            字典，键为幻灯片索引，值为图片二进制数据
+        """
+        image_component = self.components.get('image')
+        if not isinstance(image_component, ImageComponent):
+            return {}
+            
+        # 合并主题，与create_slide中组件看到的上下文保持一致
+        ctx = dict(self.theme)
+        ctx.update(context)
+        
+        tasks = {}
+        for i, slide_data in enumerate(slides_data):
+            tasks[i] = lambda slide_data=slide_data: image_component.resolve_image_data(slide_data, ctx)
+            
+        return resolve_images(tasks)
+            
     def load_plugins(self, plugin_dir=None):
         """
         从指定目录加载插件
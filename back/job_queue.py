@@ -0,0 +1,247 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 设置日志
+logger = logging.getLogger("job_queue")
+
+# 配置
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))  # 同时运行的生成任务数
+JOB_MAX_QUEUED = int(os.environ.get('JOB_MAX_QUEUED', '50'))  # 排队任务上限，超出时拒绝提交
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', '3600'))  # 已结束任务的保留时间（秒）
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+_current = threading.local()
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+    pass
+
+
+class Job:
+    """一个后台生成任务及其进度"""
+
+    def __init__(self, job_type, func, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = JOB_QUEUED
+        self.stage = None
+        self.stages = []  # [{"name", "started_at", "elapsed"}]
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def begin_stage(self, name):
+        """进入新阶段，结束上一个未结束的阶段"""
+        now = time.time()
+        with self._lock:
+            self._close_stage(now)
+            self.stage = name
+            self.stages.append({"name": name, "started_at": now, "elapsed": None})
+
+    def end_stage(self):
+        with self._lock:
+            self._close_stage(time.time())
+
+    def _close_stage(self, now):
+        if self.stages and self.stages[-1]["elapsed"] is None:
+            self.stages[-1]["elapsed"] = now - self.stages[-1]["started_at"]
+
+    def to_dict(self):
+        """任务状态（供/api/jobs/<id>返回）"""
+        with self._lock:
+            stages = []
+            for stage in self.stages:
+                elapsed = stage["elapsed"]
+                if elapsed is None:
+                    elapsed = time.time() - stage["started_at"]
+                stages.append({"name": stage["name"], "elapsed": round(elapsed, 3)})
+            data = {
+                "jobId": self.id,
+                "type": self.type,
+                "status": self.status,
+                "stage": self.stage,
+                "stages": stages,
+                "createdAt": self.created_at,
+                "queueTime": round((self.started_at or time.time()) - self.created_at, 3),
+                "runTime": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None
+            }
+        if self.status == JOB_SUCCEEDED:
+            data["result"] = self.result
+            if isinstance(self.result, dict) and self.result.get("pptUrl"):
+                data["pptUrl"] = self.result["pptUrl"]
+        elif self.status == JOB_FAILED:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """
+    进程内的后台任务队列
+
+    有界线程池执行生成任务，请求线程提交后立即返回任务ID，
+    客户端通过任务ID轮询进度；任务内部可用set_job_stage()记录各阶段耗时。
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED, result_ttl=JOB_RESULT_TTL):
+        """
+        初始化任务队列
+
+        Args:
+            max_workers: 工作线程数
+            max_queued: 排队任务上限
+            result_ttl: 已结束任务的保留时间（秒）
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job_worker")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        # 各阶段累计耗时，用于观察瓶颈
+        self._stage_totals = {}
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, job_type, func, *args, **kwargs):
+        """
+        提交任务
+
+        Args:
+            job_type: 任务类型名称
+            func: 任务函数，返回值即任务结果
+            args, kwargs: 传给任务函数的参数
+
+        Returns:
+            Job对象
+
+        Raises:
+            QueueFullError: 排队任务已达上限
+        """
+        job = Job(job_type, func, args, kwargs)
+        with self._lock:
+            self._purge_expired()
+            if self.max_queued > 0 and self._count(JOB_QUEUED) >= self.max_queued:
+                raise QueueFullError(f"任务队列已满（{self.max_queued}）")
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        logger.info(f"已提交任务 {job.id} ({job_type})")
+        return job
+
+    def get(self, job_id):
+        """按ID查找任务，不存在时返回None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        job.started_at = time.time()
+        job.status = JOB_RUNNING
+        _current.job = job
+        try:
+            job.result = job.func(*job.args, **job.kwargs)
+            job.status = JOB_SUCCEEDED
+        except Exception as e:
+            logger.exception(f"任务 {job.id} ({job.type}) 执行失败")
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            _current.job = None
+            job.end_stage()
+            job.finished_at = time.time()
+            self._record(job)
+
+        logger.info(f"任务 {job.id} ({job.type}) {job.status}, "
+                    f"排队 {job.started_at - job.created_at:.2f}秒, 执行 {job.finished_at - job.started_at:.2f}秒")
+
+    def _record(self, job):
+        with self._lock:
+            if job.status == JOB_SUCCEEDED:
+                self.completed += 1
+            else:
+                self.failed += 1
+            for stage in job.stages:
+                totals = self._stage_totals.setdefault(stage["name"], {"count": 0, "total_time": 0.0, "max_time": 0.0})
+                elapsed = stage["elapsed"] or 0.0
+                totals["count"] += 1
+                totals["total_time"] += elapsed
+                totals["max_time"] = max(totals["max_time"], elapsed)
+
+    def _count(self, status):
+        return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def _purge_expired(self):
+        """清理超过保留时间的已结束任务"""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at and now - job.finished_at > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        """返回队列深度和各阶段耗时统计"""
+        with self._lock:
+            self._purge_expired()
+            return {
+                "workers": self.max_workers,
+                "queued": self._count(JOB_QUEUED),
+                "running": self._count(JOB_RUNNING),
+                "completed": self.completed,
+                "failed": self.failed,
+                "stages": {
+                    name: {
+                        "count": totals["count"],
+                        "avg_ms": round(totals["total_time"] / totals["count"] * 1000, 1) if totals["count"] else 0.0,
+                        "max_ms": round(totals["max_time"] * 1000, 1)
+                    }
+                    for name, totals in self._stage_totals.items()
+                }
+            }
+
+
+def current_job():
+    """当前线程正在执行的任务，不在任务中时返回None"""
+    return getattr(_current, "job", None)
+
+
+def set_job_stage(name):
+    """
+    标记当前任务进入新阶段（上一阶段随之结束）
+
+    在任务线程之外调用时不做任何事，因此生成流程在同步请求中也可以直接调用。
+
+    Args:
+        name: 阶段名称，如prepare_template、convert
+    """
+    job = current_job()
+    if job is not None:
+        job.begin_stage(name)
+
+
+# 单例实例
+_job_queue_instance = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """获取任务队列的单例实例"""
+    global _job_queue_instance
+    if _job_queue_instance is None:
+        with _job_queue_lock:
+            if _job_queue_instance is None:
+                _job_queue_instance = JobQueue()
+    return _job_queue_instance
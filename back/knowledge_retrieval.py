@@ -1,39 +1,152 @@
 import os
 import json
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Set, Tuple
 import re
 import logging
 import math
+import heapq
+import time
+import hashlib
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from knowledge_vectors import load_vector_index, vector_index_version, chunk_topic
+from text_tokenizer import tokenize
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("knowledge_retrieval")
 
+class KnowledgeIndex:
+    """
+    知识库索引快照
+    
+    构建完成后只读；重新加载时生成新快照并整体替换，
+    正在进行的查询继续使用旧快照，无需加锁。
+    """
+    
+    def __init__(self, topics: Dict[str, Dict[str, Any]], doc_term_freqs: Dict[str, Counter],
+                 fingerprints: Dict[str, Tuple[float, int, str]], postings: Dict[str, Dict[str, int]],
+                 doc_lengths: Dict[str, int]):
+        self.topics = topics
+        self.doc_term_freqs = doc_term_freqs
+        self.fingerprints = fingerprints
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        
+        doc_count = len(doc_lengths)
+        self.avg_doc_length = (sum(doc_lengths.values()) / doc_count) if doc_count else 0.0
+        # BM25的IDF，加1保证始终为正
+        self.idf = {
+            term: math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+    
+    @classmethod
+    def empty(cls) -> "KnowledgeIndex":
+        return cls({}, {}, {}, {}, {})
+
 class KnowledgeRetriever:
-    def __init__(self, knowledge_base_dir: str = "knowledge_base"):
+    # BM25参数
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    # 标题中的词按此倍数计入词频，相当于标题权重
+    TITLE_WEIGHT = 3
+    # 片段检索时参与打包的候选数量
+    CHUNK_CANDIDATES = 50
+    # 向量索引构建后新增或修改的主题，按BM25取前几个现场切分
+    STALE_TOPIC_CANDIDATES = 3
+    # 主题内容缓存的最大主题数
+    CONTENT_CACHE_SIZE = int(os.environ.get('KNOWLEDGE_CONTENT_CACHE_SIZE', '256'))
+
+    def __init__(self, knowledge_base_dir: str = "knowledge_base", vector_index_dir: Optional[str] = None):
         """
         初始化知识库检索器
         
         Args:
             knowledge_base_dir: 知识库根目录
+            vector_index_dir: 片段向量索引目录，默认为"<知识库目录>_vectors"
         """
         self.base_dir = knowledge_base_dir
         # 确保路径是绝对路径
         if not os.path.isabs(self.base_dir):
             self.base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.base_dir)
+        self.vector_index_dir = vector_index_dir or f"{self.base_dir.rstrip(os.sep)}_vectors"
+        
+        # 主题内容缓存：文件路径 -> (修改时间, 内容)，按LRU淘汰
+        self._content_cache: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._content_cache_lock = threading.Lock()
+        self._content_cache_hits = 0
+        self._content_cache_misses = 0
+        
+        # 重新加载互斥，查询不受影响
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self.last_reload = None
+        # 解析失败的文件：主题ID -> (修改时间, 大小)，文件变化后才重试，避免每次检测都重复报错
+        self._failed_files: Dict[str, Tuple[float, int]] = {}
         
         # 加载知识库索引
-        self.knowledge_index = self._load_knowledge_index()
-        logger.info(f"已加载知识库索引，包含{len(self.knowledge_index)}个主题")
+        self._index = self._build_index(KnowledgeIndex.empty())[0]
+        logger.info(f"已加载知识库索引，包含{len(self._index.topics)}个主题，{len(self._index.postings)}个词项")
+        
+        # 加载离线构建的片段向量索引（可选）
+        self._vector_index_version = vector_index_version(self.vector_index_dir)
+        self._vector_digests: Dict[str, str] = {}
+        self._vector_state = (None, frozenset(), frozenset())
+        self._load_vector_index()
+    
+    @property
+    def knowledge_index(self) -> Dict[str, Dict[str, Any]]:
+        """知识库索引字典，格式为{主题ID: {文件路径, 主题名称, 摘要}}"""
+        return self._index.topics
+    
+    @property
+    def vector_index(self):
+        """片段向量索引，未构建或不可用时为None"""
+        return self._vector_state[0]
+    
+    def _load_vector_index(self):
+        """加载片段向量索引，记录构建时各主题的内容哈希"""
+        vector_index = load_vector_index(self.vector_index_dir)
+        digests = {}
+        if vector_index is not None:
+            digests = vector_index.topic_digests
+            if digests is None:
+                # 旧版本的索引没有记录内容哈希，以加载时的知识库为准
+                covered = set(vector_index.topic_ids.tolist())
+                digests = {topic_id: fingerprint[2] for topic_id, fingerprint in self._index.fingerprints.items()
+                           if topic_id in covered}
+        self._vector_digests = digests
+        self._update_vector_state(vector_index)
+    
+    def _update_vector_state(self, vector_index):
+        """
+        对照当前知识库快照，计算向量索引中需要排除的主题，与向量索引一起原子替换
+        
+        已删除主题的片段不再返回；构建之后新增或修改的主题标记为过期，
+        它们在向量索引中的旧片段被排除，检索时改用BM25现场处理。
+        """
+        if vector_index is None:
+            self._vector_state = (None, frozenset(), frozenset())
+            return
+        index = self._index
+        digests = self._vector_digests
+        stale = frozenset(topic_id for topic_id in index.topics
+                          if digests.get(topic_id) != index.fingerprints[topic_id][2])
+        excluded = frozenset(topic_id for topic_id in digests
+                             if topic_id not in index.topics or topic_id in stale)
+        self._vector_state = (vector_index, excluded, stale)
+        if stale or excluded:
+            logger.info(f"片段向量索引落后于知识库: {len(stale)}个主题改用BM25, 排除{len(excluded)}个主题的旧片段")
     
-    def _load_knowledge_index(self) -> Dict[str, Dict[str, Any]]:
+    def _scan_knowledge_files(self) -> Dict[str, Tuple[str, str]]:
         """
-        加载知识库索引
+        扫描知识库目录
         
         Returns:
-            知识库索引字典，格式为{主题ID: {文件路径, 主题名称, 摘要}}
+            {主题ID: (学科, 文件路径)}
         """
-        index = {}
+        files = {}
         # 遍历知识库目录
         for subject_dir in os.listdir(self.base_dir):
             subject_path = os.path.join(self.base_dir, subject_dir)
@@ -41,23 +154,192 @@ class KnowledgeRetriever:
                 # 遍历学科目录下的所有JSON文件
                 for filename in os.listdir(subject_path):
                     if filename.endswith('.json'):
-                        file_path = os.path.join(subject_path, filename)
-                        try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                data = json.load(f)
-                                # 为每个主题创建索引
-                                topic_id = f"{subject_dir}.{filename.replace('.json', '')}"
-                                index[topic_id] = {
-                                    "path": file_path,
-                                    "topic": data.get("topic", ""),
-                                    "subject": subject_dir,
-                                    "summary": data.get("content", [])[0]["content"] if data.get("content") else ""
-                                }
-                        except Exception as e:
-                            logger.error(f"加载知识库文件 {file_path} 时出错: {str(e)}")
-        return index
+                        topic_id = f"{subject_dir}.{filename.replace('.json', '')}"
+                        files[topic_id] = (subject_dir, os.path.join(subject_path, filename))
+        return files
+    
+    def _build_index(self, previous: KnowledgeIndex) -> Tuple[KnowledgeIndex, Dict[str, List[str]]]:
+        """
+        在旧快照基础上增量构建新的索引快照
+        
+        通过修改时间和文件大小快速判断文件是否变化，变化时再比较内容哈希，
+        只重新解析新增和变化的文件，倒排表按写时复制更新。
+        
+        Args:
+            previous: 旧的索引快照
+            
+        Returns:
+            (新快照, {"added": [...], "changed": [...], "removed": [...], "failed": [...]})
+        """
+        topics = dict(previous.topics)
+        doc_term_freqs = dict(previous.doc_term_freqs)
+        fingerprints = dict(previous.fingerprints)
+        postings = dict(previous.postings)
+        doc_lengths = dict(previous.doc_lengths)
+        copied_terms = set()
+        summary = {"added": [], "changed": [], "removed": [], "failed": []}
+        
+        def unindex(topic_id):
+            for term in doc_term_freqs.pop(topic_id, {}):
+                if term not in copied_terms:
+                    postings[term] = dict(postings[term])
+                    copied_terms.add(term)
+                postings[term].pop(topic_id, None)
+                if not postings[term]:
+                    del postings[term]
+            doc_lengths.pop(topic_id, None)
+            return topics.pop(topic_id, None) is not None
+        
+        def index(topic_id, term_freqs):
+            doc_term_freqs[topic_id] = term_freqs
+            doc_lengths[topic_id] = sum(term_freqs.values())
+            for term, tf in term_freqs.items():
+                if term not in copied_terms:
+                    postings[term] = dict(postings.get(term, {}))
+                    copied_terms.add(term)
+                # 同一主题先移除再加入时，只属于它的词项已被删除，需要重新创建
+                postings.setdefault(term, {})[topic_id] = tf
+        
+        files = self._scan_knowledge_files()
+        
+        # 处理已删除的文件
+        for topic_id in list(fingerprints):
+            if topic_id not in files:
+                del fingerprints[topic_id]
+                if unindex(topic_id):
+                    summary["removed"].append(topic_id)
+        for topic_id in list(self._failed_files):
+            if topic_id not in files:
+                del self._failed_files[topic_id]
+        
+        # 处理新增和变化的文件
+        for topic_id, (subject, file_path) in files.items():
+            stat = None
+            try:
+                stat = os.stat(file_path)
+                old_fingerprint = fingerprints.get(topic_id)
+                if old_fingerprint and old_fingerprint[:2] == (stat.st_mtime, stat.st_size):
+                    continue
+                if self._failed_files.get(topic_id) == (stat.st_mtime, stat.st_size):
+                    continue
+                
+                with open(file_path, 'rb') as f:
+                    raw = f.read()
+                digest = hashlib.sha1(raw).hexdigest()
+                if old_fingerprint and old_fingerprint[2] == digest:
+                    # 只是修改时间变化，内容未变
+                    fingerprints[topic_id] = (stat.st_mtime, stat.st_size, digest)
+                    continue
+                
+                # 解析成功后才替换旧版本并记录指纹，解析失败时保留旧版本，文件再次变化时重试
+                data = json.loads(raw.decode('utf-8'))
+                self._failed_files.pop(topic_id, None)
+                existed = unindex(topic_id)
+                
+                # 为每个主题创建索引
+                topics[topic_id] = {
+                    "path": file_path,
+                    "topic": data.get("topic", ""),
+                    "subject": subject,
+                    "summary": data.get("content", [])[0]["content"] if data.get("content") else ""
+                }
+                # 统计主题全部内容的词频，用于构建倒排索引
+                index(topic_id, self._count_terms(data))
+                fingerprints[topic_id] = (stat.st_mtime, stat.st_size, digest)
+                # 预热内容缓存，避免首次检索时再次读取文件
+                self._cache_topic_content(file_path, stat.st_mtime, data.get("content", []))
+                summary["changed" if existed else "added"].append(topic_id)
+            except Exception as e:
+                logger.error(f"加载知识库文件 {file_path} 时出错: {str(e)}")
+                summary["failed"].append(topic_id)
+                if stat is not None:
+                    self._failed_files[topic_id] = (stat.st_mtime, stat.st_size)
+        
+        new_index = KnowledgeIndex(topics, doc_term_freqs, fingerprints, postings, doc_lengths)
+        return new_index, summary
+    
+    def reload(self) -> Dict[str, Any]:
+        """
+        检测知识库文件的增删改并增量重建索引，完成后原子替换
+        
+        Returns:
+            变更摘要
+        """
+        with self._reload_lock:
+            start_time = time.time()
+            new_index, summary = self._build_index(self._index)
+            index_changed = bool(summary["added"] or summary["changed"] or summary["removed"])
+            
+            if index_changed:
+                # 清理已删除主题的内容缓存
+                removed_paths = {self._index.topics[topic_id]["path"] for topic_id in summary["removed"]}
+                with self._content_cache_lock:
+                    for path in removed_paths:
+                        self._content_cache.pop(path, None)
+                self._index = new_index
+                logger.info(f"知识库索引已更新: 新增{len(summary['added'])}, 修改{len(summary['changed'])}, "
+                            f"删除{len(summary['removed'])}")
+            
+            # 离线向量索引重新构建后同步加载
+            version = vector_index_version(self.vector_index_dir)
+            summary["vector_index_reloaded"] = version != self._vector_index_version
+            if summary["vector_index_reloaded"]:
+                self._vector_index_version = version
+                self._load_vector_index()
+            elif index_changed:
+                self._update_vector_state(self.vector_index)
+            
+            summary["topics"] = len(self._index.topics)
+            summary["elapsed"] = round(time.time() - start_time, 4)
+            self.last_reload = time.time()
+            return summary
+    
+    def start_watcher(self, interval: float):
+        """
+        启动后台线程，定期检测知识库变化
+        
+        Args:
+            interval: 检测间隔（秒）
+        """
+        if self._watcher is not None:
+            return
+            
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"知识库索引自动更新失败: {str(e)}")
+                    
+        self._watcher = threading.Thread(target=watch, name="knowledge_watcher", daemon=True)
+        self._watcher.start()
+        logger.info(f"已启动知识库监控，检测间隔 {interval} 秒")
+    
+    def _count_terms(self, data: Dict[str, Any]) -> Counter:
+        """
+        统计一个主题文件中所有词的（加权）词频
+        
+        Args:
+            data: 主题JSON数据
+            
+        Returns:
+            词频计数，主题标题中的词按TITLE_WEIGHT加权
+        """
+        term_freqs = Counter()
+        for token in self._tokenize(data.get("topic", "")):
+            term_freqs[token] += self.TITLE_WEIGHT
+        
+        # 覆盖所有内容条目，而不仅是第一条摘要
+        for item in data.get("content", []):
+            if not isinstance(item, dict):
+                continue
+            term_freqs.update(self._tokenize(item.get("title", "")))
+            term_freqs.update(self._tokenize(item.get("content", "")))
+        return term_freqs
     
-    def search(self, query: str, subject: Optional[str] = None, top_k: int = 3) -> List[Dict[str, Any]]:
+    def search(self, query: str, subject: Optional[str] = None, top_k: int = 3,
+               topic_filter: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
         """
         搜索知识库
         
@@ -65,36 +347,41 @@ class KnowledgeRetriever:
             query: 搜索关键词
             subject: 限定学科范围，如biology, math等
             top_k: 返回结果数量
+            topic_filter: 只检索这些主题ID，为None时不限制
             
         Returns:
             匹配的知识条目列表
         """
         # 对查询词进行分词处理
-        query_tokens = self._tokenize(query)
+        query_terms = set(self._tokenize(query))
         
-        # 计算每个主题的匹配分数
-        scores = []
-        for topic_id, topic_info in self.knowledge_index.items():
-            # 如果指定了学科，只检索该学科的内容
-            if subject and topic_info["subject"] != subject:
+        # 使用当前快照，重新加载不影响正在进行的查询
+        index = self._index
+        
+        # 只遍历查询词命中的倒排表，用BM25累加每个主题的分数
+        scores = defaultdict(float)
+        k1, b = self.BM25_K1, self.BM25_B
+        avg_doc_length = index.avg_doc_length or 1.0
+        for term in query_terms:
+            docs = index.postings.get(term)
+            if not docs:
                 continue
-                
-            # 计算标题与查询的相关度
-            title_score = self._calculate_similarity(query_tokens, self._tokenize(topic_info["topic"]))
-            
-            # 计算摘要与查询的相关度
-            summary_score = self._calculate_similarity(query_tokens, self._tokenize(topic_info["summary"]))
-            
-            # 综合分数，标题权重高
-            total_score = title_score * 1.5 + summary_score
-            
-            scores.append((topic_id, total_score, topic_info))
+            idf = index.idf[term]
+            for topic_id, tf in docs.items():
+                # 如果指定了学科，只检索该学科的内容
+                if subject and index.topics[topic_id]["subject"] != subject:
+                    continue
+                if topic_filter is not None and topic_id not in topic_filter:
+                    continue
+                norm = k1 * (1 - b + b * index.doc_lengths[topic_id] / avg_doc_length)
+                scores[topic_id] += idf * tf * (k1 + 1) / (tf + norm)
         
         # 按分数排序并返回前top_k个结果
-        scores.sort(key=lambda x: x[1], reverse=True)
+        top_scores = heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])
         
         results = []
-        for topic_id, score, topic_info in scores[:top_k]:
+        for topic_id, score in top_scores:
+            topic_info = index.topics[topic_id]
             # 为匹配的主题加载详细内容
             details = self._load_topic_content(topic_info["path"])
             results.append({
@@ -117,8 +404,8 @@ class KnowledgeRetriever:
         Returns:
             主题完整内容
         """
-        if topic_id in self.knowledge_index:
-            topic_info = self.knowledge_index[topic_id]
+        topic_info = self._index.topics.get(topic_id)
+        if topic_info:
             content = self._load_topic_content(topic_info["path"])
             return {
                 "id": topic_id,
@@ -132,83 +419,76 @@ class KnowledgeRetriever:
         """
         加载特定文件的完整内容
         
+        优先使用内存缓存，文件修改时间变化时重新读取
+        
         Args:
             file_path: 文件路径
             
         Returns:
             主题内容列表
         """
+        try:
+            mtime = os.path.getmtime(file_path)
+        except OSError as e:
+            logger.error(f"加载文件 {file_path} 时出错: {str(e)}")
+            return []
+            
+        with self._content_cache_lock:
+            cached = self._content_cache.get(file_path)
+            if cached is not None and cached[0] == mtime:
+                self._content_cache.move_to_end(file_path)
+                self._content_cache_hits += 1
+                return cached[1]
+            self._content_cache_misses += 1
+            
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                return data.get("content", [])
+                content = data.get("content", [])
         except Exception as e:
             logger.error(f"加载文件 {file_path} 时出错: {str(e)}")
-            return []
+            # 文件正在编辑或格式错误时继续使用上一次成功解析的内容，与索引中保留的旧版本一致
+            return cached[1] if cached is not None else []
+            
+        self._cache_topic_content(file_path, mtime, content)
+        return content
     
-    def _tokenize(self, text: str) -> List[str]:
+    def _cache_topic_content(self, file_path: str, mtime: float, content: List[Dict[str, Any]]):
+        """将主题内容写入缓存，超出容量时淘汰最久未使用的主题"""
+        with self._content_cache_lock:
+            self._content_cache[file_path] = (mtime, content)
+            self._content_cache.move_to_end(file_path)
+            while len(self._content_cache) > self.CONTENT_CACHE_SIZE:
+                self._content_cache.popitem(last=False)
+    
+    def content_cache_stats(self) -> Dict[str, Any]:
         """
-        简单的中文分词，用于计算相似度
+        主题内容缓存的统计信息
         
-        Args:
-            text: 文本字符串
-            
         Returns:
-            分词结果列表
+            缓存大小、容量、命中次数和命中率
         """
-        # 移除标点和特殊字符
-        text = re.sub(r'[^\w\s]', ' ', text)
-        # 转为小写并分词
-        tokens = []
-        
-        # 处理中文
-        for char in text:
-            if '\u4e00' <= char <= '\u9fff':  # 中文字符范围
-                tokens.append(char)
-            
-        # 处理英文和数字
-        for word in re.findall(r'\b\w+\b', text.lower()):
-            tokens.append(word)
-            
-        return tokens
+        with self._content_cache_lock:
+            total = self._content_cache_hits + self._content_cache_misses
+            return {
+                "size": len(self._content_cache),
+                "max_size": self.CONTENT_CACHE_SIZE,
+                "hits": self._content_cache_hits,
+                "misses": self._content_cache_misses,
+                "hit_rate": round(self._content_cache_hits / total, 4) if total else 0.0
+            }
     
-    def _calculate_similarity(self, query_tokens: List[str], doc_tokens: List[str]) -> float:
+    def _tokenize(self, text: str) -> List[str]:
         """
-        计算查询词与文档的相似度（简化的TF-IDF）
+        词级别的中文分词，用于索引和查询
         
         Args:
-            query_tokens: 查询词分词结果
-            doc_tokens: 文档分词结果
+            text: 文本字符串
             
         Returns:
-            相似度分数
+            分词结果列表（已去除标点和停用词）
         """
-        # 如果任一为空，返回0分
-        if not query_tokens or not doc_tokens:
-            return 0.0
-            
-        # 计算共现词数量
-        common_tokens = set(query_tokens) & set(doc_tokens)
-        if not common_tokens:
-            return 0.0
-            
-        # 计算共现词在文档中的频率
-        doc_freq = {}
-        for token in doc_tokens:
-            doc_freq[token] = doc_freq.get(token, 0) + 1
-            
-        # 计算加权分数，考虑词频和稀有度
-        score = 0.0
-        for token in common_tokens:
-            # TF: 词在文档中出现的频率
-            tf = doc_freq[token] / len(doc_tokens)
-            # IDF: 反映词的稀有度，这里简化处理
-            idf = 1.0
-            score += tf * idf
-            
-        # 归一化，考虑文档长度
-        score = score / math.sqrt(len(doc_tokens))
-        return score
+        return list(tokenize(text, for_search=True))
     
     def get_relevant_content(self, query: str, subject: Optional[str] = None, max_tokens: int = 2000) -> str:
         """
@@ -222,6 +502,11 @@ class KnowledgeRetriever:
         Returns:
             整合后的相关内容
         """
+        # 有片段向量索引时，按片段相似度打包内容
+        vector_index, excluded, stale = self._vector_state
+        if vector_index is not None:
+            return self._pack_relevant_chunks(query, subject, max_tokens, vector_index, excluded, stale)
+            
         results = self.search(query, subject, top_k=3)
         if not results:
             return ""
@@ -253,6 +538,75 @@ class KnowledgeRetriever:
                 
         return "".join(relevant_content)
 
+    
+    def _pack_relevant_chunks(self, query: str, subject: Optional[str], max_tokens: int,
+                              vector_index, excluded: Set[str], stale: Set[str]) -> str:
+        """
+        将最相关的片段打包到max_tokens以内
+        
+        Args:
+            query: 搜索关键词
+            subject: 限定学科范围
+            max_tokens: 最大返回标记数
+            vector_index: 片段向量索引
+            excluded: 向量索引中需要排除的主题
+            stale: 向量索引构建之后新增或修改的主题
+            
+        Returns:
+            按主题分组的相关片段
+        """
+        chunks = vector_index.search(query, top_k=self.CHUNK_CANDIDATES, subject=subject, exclude_topics=excluded)
+        if stale:
+            chunks.extend(self._stale_topic_chunks(query, subject, vector_index, stale))
+            chunks.sort(key=lambda chunk: chunk["score"], reverse=True)
+        
+        # 按相似度贪心选择能放下的片段
+        selected = defaultdict(list)
+        token_count = 0
+        for chunk in chunks:
+            chunk_line = f"- {chunk['title']}: {chunk['text']}\n"
+            chunk_tokens = len(self._tokenize(chunk_line))
+            if chunk['topic_id'] not in selected:
+                # 首次出现的主题需要计入标题行
+                chunk_tokens += len(self._tokenize(f"### {chunk['topic']}\n"))
+            if token_count + chunk_tokens > max_tokens:
+                continue
+            selected[chunk['topic_id']].append(chunk)
+            token_count += chunk_tokens
+            
+        # 主题按最佳片段的顺序输出
+        relevant_content = []
+        for topic_chunks in selected.values():
+            relevant_content.append(f"### {topic_chunks[0]['topic']}\n")
+            for chunk in topic_chunks:
+                relevant_content.append(f"- {chunk['title']}: {chunk['text']}\n")
+                
+        return "".join(relevant_content)
+
+    def _stale_topic_chunks(self, query: str, subject: Optional[str], vector_index,
+                            stale: Set[str]) -> List[Dict[str, Any]]:
+        """
+        向量索引中没有最新内容的主题：用BM25选出相关主题，现场切分并用同一编码器打分
+        
+        Args:
+            query: 搜索关键词
+            subject: 限定学科范围
+            vector_index: 片段向量索引
+            stale: 过期主题ID集合
+            
+        Returns:
+            片段列表（含score），分数与向量检索结果可比
+        """
+        chunks = []
+        for result in self.search(query, subject, top_k=self.STALE_TOPIC_CANDIDATES, topic_filter=stale):
+            topic_chunks, texts = chunk_topic(result["id"], result["subject"],
+                                              {"topic": result["topic"], "content": result["content"]},
+                                              vector_index.max_chars)
+            for chunk, score in zip(topic_chunks, vector_index.score_texts(query, texts)):
+                if score > 0:
+                    chunk["score"] = score
+                    chunks.append(chunk)
+        return chunks
 
 # 单例实例
 _retriever_instance = None
@@ -262,6 +616,10 @@ def get_retriever():
     global _retriever_instance
     if _retriever_instance is None:
         _retriever_instance = KnowledgeRetriever()
+        # 配置了检测间隔时自动监控知识库变化
+        reload_interval = float(os.environ.get('KNOWLEDGE_RELOAD_INTERVAL', '0'))
+        if reload_interval > 0:
+            _retriever_instance.start_watcher(reload_interval)
     return _retriever_instance
 
 
@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+"""
+知识库片段向量索引
+离线将知识库内容切分为片段并编码为稠密向量，保存为float32矩阵；
+运行时以内存映射方式加载，查询只需一次矩阵-向量乘法。
+每次构建写入新的版本子目录，再原子替换CURRENT指针文件。
+
+用法: python knowledge_vectors.py [知识库目录] [输出目录]
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import shutil
+import hashlib
+import logging
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+# 尝试导入numpy
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# 设置日志
+logger = logging.getLogger("knowledge_vectors")
+
+VECTOR_DIM = 1024
+CHUNK_MAX_CHARS = 160
+MATRIX_FILENAME = "chunks.npy"
+META_FILENAME = "chunks.json"
+# 指向当前版本子目录的指针文件；每次构建写入新的版本目录，再原子替换指针
+CURRENT_FILENAME = "CURRENT"
+KEEP_VERSIONS = 2  # 保留的版本数（当前版本和上一版本，供仍在使用旧版本的进程读取）
+
+_CJK_RUN = re.compile(r'[\u4e00-\u9fff]+')
+_WORD = re.compile(r'[a-z0-9]+')
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;\n])')
+
+
+class HashedNgramEncoder:
+    """
+    哈希n-gram编码器
+
+    中文按连续字符的1~3-gram、英文按单词提取特征，
+    用crc32哈希到固定维度（带符号以减少冲突偏差），再做L2归一化。
+    无需模型文件，纯CPU计算，结果在不同进程间稳定。
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM, max_ngram: int = 3):
+        self.dim = dim
+        self.max_ngram = max_ngram
+
+    def _features(self, text: str) -> Counter:
+        text = (text or "").lower()
+        features = Counter()
+        for run in _CJK_RUN.findall(text):
+            for n in range(1, self.max_ngram + 1):
+                for i in range(len(run) - n + 1):
+                    features[run[i:i + n]] += 1
+        for word in _WORD.findall(text):
+            features[word] += 1
+        return features
+
+    def encode(self, text: str):
+        """将文本编码为L2归一化的float32向量"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            h = zlib.crc32(feature.encode('utf-8'))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dim] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def encode_batch(self, texts: List[str]):
+        """批量编码，返回形状为(len(texts), dim)的矩阵"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self.encode(text)
+        return matrix
+
+
+def split_into_chunks(text: str, max_chars: int = CHUNK_MAX_CHARS) -> List[str]:
+    """
+    按句子边界将文本切分为不超过max_chars的片段
+
+    Args:
+        text: 原文
+        max_chars: 单个片段最大字符数
+
+    Returns:
+        片段列表
+    """
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) > max_chars:
+            chunks.append(current)
+            current = ""
+        # 超长句子直接硬切
+        while len(sentence) > max_chars:
+            chunks.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        current += sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def iter_knowledge_files(knowledge_base_dir: str):
+    """遍历知识库，产出(主题ID, 学科, 文件路径)"""
+    for subject_dir in sorted(os.listdir(knowledge_base_dir)):
+        subject_path = os.path.join(knowledge_base_dir, subject_dir)
+        if not os.path.isdir(subject_path):
+            continue
+        for filename in sorted(os.listdir(subject_path)):
+            if filename.endswith('.json'):
+                topic_id = f"{subject_dir}.{filename.replace('.json', '')}"
+                yield topic_id, subject_dir, os.path.join(subject_path, filename)
+
+
+def chunk_topic(topic_id: str, subject: str, data: Dict[str, Any],
+                max_chars: int = CHUNK_MAX_CHARS):
+    """
+    切分一个主题的内容
+
+    Args:
+        topic_id: 主题ID
+        subject: 学科
+        data: 主题JSON数据
+        max_chars: 片段最大字符数
+
+    Returns:
+        (片段列表, 用于编码的文本列表)
+    """
+    chunks = []
+    texts = []
+    topic = data.get("topic", "")
+    for item in data.get("content", []):
+        if not isinstance(item, dict):
+            continue
+        item_title = item.get("title", "")
+        for chunk_text in split_into_chunks(item.get("content", ""), max_chars):
+            chunks.append({
+                "topic_id": topic_id,
+                "subject": subject,
+                "topic": topic,
+                "title": item_title,
+                "text": chunk_text
+            })
+            # 编码时带上主题和条目标题，提供上下文
+            texts.append(f"{topic} {item_title} {chunk_text}")
+    return chunks, texts
+
+
+def build_vector_index(knowledge_base_dir: str, output_dir: str, dim: int = VECTOR_DIM,
+                       max_chars: int = CHUNK_MAX_CHARS) -> int:
+    """
+    离线构建片段向量索引
+
+    同时记录每个主题文件内容的SHA1，运行时据此判断哪些主题在构建之后发生了变化。
+
+    Args:
+        knowledge_base_dir: 知识库目录
+        output_dir: 输出目录，chunks.npy和chunks.json写入其中的版本子目录
+        dim: 向量维度
+        max_chars: 片段最大字符数
+
+    Returns:
+        片段数量
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("构建向量索引需要numpy，请安装: pip install numpy")
+
+    chunks = []
+    texts = []
+    topic_digests = {}
+    for topic_id, subject, file_path in iter_knowledge_files(knowledge_base_dir):
+        try:
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            data = json.loads(raw.decode('utf-8'))
+        except Exception as e:
+            logger.error(f"加载知识库文件 {file_path} 时出错: {str(e)}")
+            continue
+
+        topic_chunks, topic_texts = chunk_topic(topic_id, subject, data, max_chars)
+        chunks.extend(topic_chunks)
+        texts.extend(topic_texts)
+        topic_digests[topic_id] = hashlib.sha1(raw).hexdigest()
+
+    encoder = HashedNgramEncoder(dim)
+    matrix = encoder.encode_batch(texts)
+
+    # 矩阵和元数据写入新的版本目录，最后原子替换指针文件，
+    # 运行中的进程要么读到完整的旧版本，要么读到完整的新版本
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    version_dir = os.path.join(output_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+    with open(os.path.join(version_dir, MATRIX_FILENAME), 'wb') as f:
+        np.save(f, matrix)
+    with open(os.path.join(version_dir, META_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({"dim": dim, "max_chars": max_chars, "topic_digests": topic_digests, "chunks": chunks},
+                  f, ensure_ascii=False)
+
+    current_path = os.path.join(output_dir, CURRENT_FILENAME)
+    with open(current_path + ".tmp", 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(current_path + ".tmp", current_path)
+    _remove_old_versions(output_dir, version)
+
+    logger.info(f"向量索引构建完成: {len(chunks)} 个片段, 维度 {dim}, 输出目录 {version_dir}")
+    return len(chunks)
+
+
+def _remove_old_versions(output_dir: str, current: str):
+    """删除较早的版本目录，保留最近的KEEP_VERSIONS个"""
+    versions = sorted((name for name in os.listdir(output_dir)
+                       if name.startswith("v") and os.path.isdir(os.path.join(output_dir, name))),
+                      key=lambda name: os.path.getmtime(os.path.join(output_dir, name)), reverse=True)
+    for name in versions[KEEP_VERSIONS:]:
+        if name != current:
+            # 仍被其他进程映射的文件在Windows上无法删除，留到下次构建
+            shutil.rmtree(os.path.join(output_dir, name), ignore_errors=True)
+
+
+def resolve_index_dir(index_dir: str) -> Optional[str]:
+    """
+    当前版本的索引目录
+
+    Args:
+        index_dir: build_vector_index的输出目录
+
+    Returns:
+        指针文件指向的版本目录；没有指针文件时兼容旧的布局（文件直接位于index_dir中）；都不存在时返回None
+    """
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILENAME), 'r', encoding='utf-8') as f:
+            version = f.read().strip()
+        if version:
+            return os.path.join(index_dir, version)
+    except OSError:
+        pass
+    if os.path.exists(os.path.join(index_dir, MATRIX_FILENAME)):
+        return index_dir
+    return None
+
+
+def vector_index_version(index_dir: str):
+    """
+    当前索引的版本标识，用于判断是否需要重新加载
+
+    Returns:
+        (版本目录, 矩阵文件修改时间)，索引不存在时返回None
+    """
+    version_dir = resolve_index_dir(index_dir)
+    if version_dir is None:
+        return None
+    try:
+        return version_dir, os.path.getmtime(os.path.join(version_dir, MATRIX_FILENAME))
+    except OSError:
+        return None
+
+
+class ChunkVectorIndex:
+    """内存映射加载的片段向量索引"""
+
+    def __init__(self, index_dir: str):
+        """
+        加载向量索引
+
+        Args:
+            index_dir: 包含chunks.npy和chunks.json的目录（resolve_index_dir的结果）
+        """
+        with open(os.path.join(index_dir, META_FILENAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.chunks: List[Dict[str, Any]] = meta["chunks"]
+        self.max_chars = meta.get("max_chars", CHUNK_MAX_CHARS)
+        # 构建时各主题文件的SHA1，旧版本的索引没有此字段
+        self.topic_digests: Optional[Dict[str, str]] = meta.get("topic_digests")
+        self.encoder = HashedNgramEncoder(meta["dim"])
+        self.matrix = np.load(os.path.join(index_dir, MATRIX_FILENAME), mmap_mode='r')
+        self.subjects = np.array([chunk["subject"] for chunk in self.chunks])
+        self.topic_ids = np.array([chunk["topic_id"] for chunk in self.chunks])
+
+        if self.matrix.shape[0] != len(self.chunks):
+            raise ValueError(f"向量矩阵行数({self.matrix.shape[0]})与片段数({len(self.chunks)})不一致")
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query: str, top_k: int = 20, subject: Optional[str] = None,
+               exclude_topics=None) -> List[Dict[str, Any]]:
+        """
+        检索与查询最相似的片段
+
+        Args:
+            query: 查询文本
+            top_k: 返回数量
+            subject: 限定学科
+            exclude_topics: 不参与检索的主题ID集合（已删除或已过期的主题）
+
+        Returns:
+            片段列表（含score），按相似度降序
+        """
+        if not self.chunks:
+            return []
+
+        scores = self.matrix @ self.encoder.encode(query)
+        if subject:
+            scores = np.where(self.subjects == subject, scores, -np.inf)
+        if exclude_topics:
+            scores = np.where(np.isin(self.topic_ids, list(exclude_topics)), -np.inf, scores)
+
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        results = []
+        for idx in candidates:
+            score = float(scores[idx])
+            if score <= 0 or not math.isfinite(score):
+                break
+            chunk = dict(self.chunks[idx])
+            chunk["score"] = score
+            results.append(chunk)
+        return results
+
+    def score_texts(self, query: str, texts: List[str]) -> List[float]:
+        """
+        用同一编码器计算查询与一组未入库文本的相似度，分数可与search的结果直接比较
+
+        Args:
+            query: 查询文本
+            texts: 文本列表
+
+        Returns:
+            相似度列表
+        """
+        if not texts:
+            return []
+        return [float(score) for score in self.encoder.encode_batch(texts) @ self.encoder.encode(query)]
+
+
+def load_vector_index(index_dir: str) -> Optional[ChunkVectorIndex]:
+    """加载向量索引，不可用时返回None"""
+    if not HAS_NUMPY:
+        logger.info("未找到numpy库，跳过片段向量索引")
+        return None
+    version_dir = resolve_index_dir(index_dir)
+    if version_dir is None:
+        logger.info(f"未找到片段向量索引: {index_dir}，可运行 python knowledge_vectors.py 构建")
+        return None
+    try:
+        index = ChunkVectorIndex(version_dir)
+        logger.info(f"已加载片段向量索引，包含{len(index)}个片段")
+        return index
+    except Exception as e:
+        logger.error(f"加载片段向量索引失败: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    kb_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base_dir, "knowledge_base")
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else f"{kb_dir.rstrip(os.sep)}_vectors"
+    count = build_vector_index(kb_dir, out_dir)
+    print(f"已构建 {count} 个片段的向量索引: {out_dir}")
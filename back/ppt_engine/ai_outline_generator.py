@@ -2,10 +2,17 @@ import os
 import sys
 import logging
 import json
-import requests
 import re
 from pathlib import Path
 
+# 优先使用共享的HTTP连接池
+try:
+    import http_client
+    LLM_TIMEOUT = http_client.LLM_TIMEOUT
+except ImportError:
+    import requests as http_client
+    LLM_TIMEOUT = (5, 180)
+
 # 配置日志
 logger = logging.getLogger("ppt_engine.ai_outline_generator")
 
@@ -132,7 +139,7 @@ class AIOutlineGenerator:
             }
             
             logger.info("调用AI服务生成大纲")
-            response = requests.post(self.api_url, json=payload, headers=headers)
+            response = http_client.post(self.api_url, json=payload, headers=headers, timeout=LLM_TIMEOUT)
             
             if response.status_code != 200:
                 logger.error(f"API请求失败: {response.status_code}, {response.text}")
@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+"""
+无头浏览器池
+预先启动并复用Chrome会话，供HTMLToPPTConverter和Renderer共享，
+避免每次请求都重新安装驱动、启动浏览器。
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+# 尝试导入Selenium
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from selenium.common.exceptions import WebDriverException
+    HAS_SELENIUM = True
+except ImportError:
+    HAS_SELENIUM = False
+
+    class WebDriverException(Exception):
+        pass
+
+# 尝试导入webdriver_manager
+try:
+    from webdriver_manager.chrome import ChromeDriverManager
+    HAS_WEBDRIVER_MANAGER = True
+except ImportError:
+    HAS_WEBDRIVER_MANAGER = False
+
+# 获取模块日志记录器
+logger = logging.getLogger("ppt_engine.browser_pool")
+
+# 配置
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', '2'))  # 最多同时存在的浏览器会话数
+BROWSER_MAX_RENDERS = int(os.environ.get('BROWSER_MAX_RENDERS', '50'))  # 会话被借出多少次后重建，防止内存膨胀
+BROWSER_CHECKOUT_TIMEOUT = float(os.environ.get('BROWSER_CHECKOUT_TIMEOUT', '120'))  # 等待空闲会话的最长时间（秒）
+BROWSER_WINDOW_SIZE = os.environ.get('BROWSER_WINDOW_SIZE', '1280,720')
+PAGE_READY_TIMEOUT = float(os.environ.get('PAGE_READY_TIMEOUT', '5'))  # 等待页面就绪的最长时间（秒）
+BROWSER_RETRY_INTERVAL = float(os.environ.get('BROWSER_RETRY_INTERVAL', '60'))  # 浏览器或驱动启动失败后，多久之后再尝试（秒）
+
+# 页面就绪检测：文档加载完成、字体加载完成、所有图片解码完成后再等一帧，超时则直接返回
+_PAGE_READY_SCRIPT = """
+var done = arguments[arguments.length - 1];
+var timer = setTimeout(function () { done('timeout'); }, arguments[0]);
+function finish(state) { clearTimeout(timer); done(state); }
+function documentReady() {
+    if (document.readyState === 'complete') { return Promise.resolve(); }
+    return new Promise(function (resolve) { window.addEventListener('load', resolve, {once: true}); });
+}
+function decode(img) {
+    return img.decode ? img.decode().catch(function () {}) : null;
+}
+function imagesReady() {
+    return Promise.all(Array.prototype.map.call(document.images, function (img) {
+        if (img.complete) { return decode(img); }
+        return new Promise(function (resolve) {
+            img.addEventListener('load', resolve, {once: true});
+            img.addEventListener('error', resolve, {once: true});
+        }).then(function () { return decode(img); });
+    }));
+}
+documentReady()
+    .then(function () { return document.fonts ? document.fonts.ready : null; })
+    .then(imagesReady)
+    .then(function () { requestAnimationFrame(function () { finish('ready'); }); })
+    .catch(function () { finish('error'); });
+"""
+
+
+class BrowserUnavailableError(Exception):
+    """无法获得可用的浏览器会话"""
+    pass
+
+
+_driver_path = None
+_driver_error = None  # (失败时间, 错误信息)
+_driver_path_lock = threading.Lock()
+
+def _get_driver_path():
+    """
+    ChromeDriver路径，只解析一次
+
+    解析失败时记录错误，BROWSER_RETRY_INTERVAL内直接抛出，不再每次借出会话都重新安装驱动。
+
+    Raises:
+        BrowserUnavailableError: 驱动安装失败
+    """
+    global _driver_path, _driver_error
+    if _driver_path is None and HAS_WEBDRIVER_MANAGER:
+        with _driver_path_lock:
+            if _driver_path is None:
+                if _driver_error is not None and time.time() - _driver_error[0] < BROWSER_RETRY_INTERVAL:
+                    raise BrowserUnavailableError(f"ChromeDriver不可用: {_driver_error[1]}")
+                try:
+                    _driver_path = ChromeDriverManager().install()
+                    _driver_error = None
+                except Exception as e:
+                    _driver_error = (time.time(), str(e))
+                    raise BrowserUnavailableError(f"安装ChromeDriver失败: {str(e)}")
+    return _driver_path
+
+
+def wait_for_page_ready(driver, timeout=PAGE_READY_TIMEOUT):
+    """
+    等待当前页面渲染就绪（替代固定时长的sleep）
+
+    Args:
+        driver: WebDriver实例
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        (状态, 耗时秒数)，状态为ready、timeout或error
+    """
+    start_time = time.time()
+    try:
+        driver.set_script_timeout(timeout + 1)
+        state = driver.execute_async_script(_PAGE_READY_SCRIPT, int(timeout * 1000))
+    except WebDriverException as e:
+        logger.warning(f"页面就绪检测失败: {str(e)}")
+        state = "error"
+    elapsed = time.time() - start_time
+    if state != "ready":
+        logger.warning(f"页面未在{timeout}秒内就绪（{state}），直接截图")
+    return state, elapsed
+
+
+class BrowserSession:
+    """池中的一个浏览器会话"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.renders = 0
+        self.created_at = time.time()
+
+    def is_healthy(self):
+        """检查浏览器进程是否仍可响应"""
+        try:
+            self.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """
+    无头浏览器会话池
+
+    会话按需启动，最多BROWSER_POOL_SIZE个；借出前做健康检查，
+    归还时若已崩溃或借出次数达到上限则关闭重建。
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_renders=BROWSER_MAX_RENDERS,
+                 headless=True, window_size=BROWSER_WINDOW_SIZE):
+        """
+        初始化浏览器池
+
+        Args:
+            size: 会话数上限
+            max_renders: 单个会话的最大借出次数，0表示不限
+            headless: 是否使用无头模式
+            window_size: 窗口大小，如"1280,720"
+        """
+        self.size = max(1, size)
+        self.max_renders = max_renders
+        self.headless = headless
+        self.window_size = window_size
+
+        # 后进先出，让最近用过的会话优先被复用
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._closed = False
+        # 最近一次启动失败(时间, 错误信息)，BROWSER_RETRY_INTERVAL内不再尝试启动
+        self._launch_error = None
+
+        self.launched = 0
+        self.recycled = 0
+        self.crashed = 0
+        self.checkouts = 0
+        self.in_use = 0
+        self.total_wait = 0.0
+
+    def _launch(self):
+        """启动一个新的浏览器会话"""
+        if not HAS_SELENIUM:
+            raise BrowserUnavailableError("缺少Selenium库，请安装: pip install selenium")
+        launch_error = self._launch_error
+        if launch_error is not None and time.time() - launch_error[0] < BROWSER_RETRY_INTERVAL:
+            raise BrowserUnavailableError(f"浏览器不可用，稍后重试: {launch_error[1]}")
+
+        options = Options()
+        if self.headless:
+            options.add_argument('--headless')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        options.add_argument(f'--window-size={self.window_size}')
+
+        start_time = time.time()
+        try:
+            driver_path = _get_driver_path()
+            if driver_path:
+                driver = webdriver.Chrome(service=Service(driver_path), options=options)
+            else:
+                # 尝试直接找到chrome driver
+                driver = webdriver.Chrome(options=options)
+        except Exception as e:
+            self._launch_error = (time.time(), str(e))
+            if isinstance(e, BrowserUnavailableError):
+                raise
+            raise BrowserUnavailableError(f"启动浏览器失败: {str(e)}")
+
+        self._launch_error = None
+        with self._lock:
+            self.launched += 1
+        logger.info(f"浏览器会话已启动，耗时: {time.time() - start_time:.2f}秒")
+        return BrowserSession(driver)
+
+    def _checkout(self):
+        """取出一个健康的空闲会话，没有时启动新会话"""
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return self._launch()
+            if session.is_healthy():
+                return session
+            logger.warning("浏览器会话已失效，丢弃并重建")
+            with self._lock:
+                self.crashed += 1
+            session.quit()
+
+    def _checkin(self, session, broken):
+        """归还会话，崩溃或达到借出上限时关闭"""
+        session.renders += 1
+        if broken or self._closed:
+            if broken:
+                with self._lock:
+                    self.crashed += 1
+            session.quit()
+            return
+        if self.max_renders and session.renders >= self.max_renders:
+            with self._lock:
+                self.recycled += 1
+            logger.info(f"浏览器会话已使用{session.renders}次，回收重建")
+            session.quit()
+            return
+        try:
+            # 释放上一个页面占用的内存
+            session.driver.get("about:blank")
+        except Exception:
+            with self._lock:
+                self.crashed += 1
+            session.quit()
+            return
+        self._idle.put(session)
+
+    @contextmanager
+    def session(self, timeout=BROWSER_CHECKOUT_TIMEOUT):
+        """
+        借出一个浏览器会话
+
+        用法:
+            with get_browser_pool().session() as browser:
+                browser.get(url)
+
+        Args:
+            timeout: 等待空闲会话的最长时间（秒）
+
+        Raises:
+            BrowserUnavailableError: 等待超时或浏览器无法启动
+        """
+        start_time = time.time()
+        if not self._slots.acquire(timeout=timeout):
+            raise BrowserUnavailableError(f"等待浏览器会话超时（{timeout}秒）")
+
+        session = None
+        broken = False
+        try:
+            session = self._checkout()
+            with self._lock:
+                self.checkouts += 1
+                self.in_use += 1
+                self.total_wait += time.time() - start_time
+            yield session.driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            if session is not None:
+                with self._lock:
+                    self.in_use -= 1
+                self._checkin(session, broken)
+            self._slots.release()
+
+    def warm_up(self, count=None):
+        """
+        预先启动会话
+
+        每启动一个会话占用一个名额，与正在借出的会话合计不超过池大小；
+        池中的会话（空闲和借出）已经足够时不再启动。
+
+        Args:
+            count: 启动数量，默认为池大小
+
+        Returns:
+            成功启动的数量
+        """
+        count = min(count or self.size, self.size)
+        started = 0
+        for _ in range(max(0, count - self._idle.qsize())):
+            # 名额全被借出时无需预热
+            if not self._slots.acquire(blocking=False):
+                break
+            try:
+                with self._lock:
+                    full = self._idle.qsize() + self.in_use >= self.size
+                if full:
+                    break
+                self._idle.put(self._launch())
+                started += 1
+            except BrowserUnavailableError as e:
+                logger.warning(f"预热浏览器池失败: {str(e)}")
+                break
+            finally:
+                self._slots.release()
+        if started:
+            logger.info(f"浏览器池预热完成，启动了{started}个会话")
+        return started
+
+    def close(self):
+        """关闭所有空闲会话"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().quit()
+            except queue.Empty:
+                break
+
+    def stats(self):
+        """返回浏览器池统计信息"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "in_use": self.in_use,
+                "launched": self.launched,
+                "recycled": self.recycled,
+                "crashed": self.crashed,
+                "checkouts": self.checkouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 1) if self.checkouts else 0.0
+            }
+
+
+# 单例实例
+_browser_pool_instance = None
+_browser_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """获取浏览器池的单例实例"""
+    global _browser_pool_instance
+    if _browser_pool_instance is None:
+        with _browser_pool_lock:
+            if _browser_pool_instance is None:
+                _browser_pool_instance = BrowserPool()
+                atexit.register(_browser_pool_instance.close)
+    return _browser_pool_instance
@@ -8,6 +8,7 @@ import os
 import re
 import json
 import logging
+import threading
 import jinja2
 from bs4 import BeautifulSoup
 from markdown import markdown
@@ -15,26 +16,27 @@ from markdown import markdown
 # 获取模块日志记录器
 logger = logging.getLogger("ppt_engine.content_filler")
 
-class ContentFiller:
-    """内容填充器，将大纲内容填充到HTML模板中"""
+class TemplateCatalog:
+    """一个模板目录的Jinja2环境（含已编译模板的缓存）和按用途分类的模板列表"""
     
-    def __init__(self, templates_dir):
+    def __init__(self, templates_dir, signature=None):
         """
-        初始化内容填充器
-        
         Args:
             templates_dir: HTML模板目录
+            signature: 创建时目录及模板文件的修改时间签名
         """
         self.templates_dir = templates_dir
+        self.signature = signature
         
-        # 创建Jinja2环境
-        self.template_env = jinja2.Environment(
+        # 模板文件修改后Jinja2会自动重新编译（auto_reload）
+        self.env = jinja2.Environment(
             loader=jinja2.FileSystemLoader(templates_dir),
-            autoescape=jinja2.select_autoescape(['html', 'xml'])
+            autoescape=jinja2.select_autoescape(['html', 'xml']),
+            auto_reload=True
         )
         
         # 扫描可用模板
-        self.available_templates = self._scan_templates()
+        self.templates = self._scan_templates()
     
     def _scan_templates(self):
         """
@@ -138,6 +140,92 @@ class ContentFiller:
             
         # 默认为通用内容
         return "content"
+
+
+def _catalog_signature(templates_dir):
+    """
+    目录、template_info.json和各HTML模板文件的修改时间，
+    增删模板文件、修改模板信息或修改模板内容（如data-purpose）时变化
+    """
+    signature = []
+    for path in (templates_dir, os.path.join(templates_dir, "template_info.json")):
+        try:
+            signature.append(os.path.getmtime(path))
+        except OSError:
+            signature.append(None)
+    
+    try:
+        html_files = sorted(f for f in os.listdir(templates_dir) if f.endswith('.html'))
+    except OSError:
+        html_files = []
+    for html_file in html_files:
+        try:
+            signature.append((html_file, os.path.getmtime(os.path.join(templates_dir, html_file))))
+        except OSError:
+            signature.append((html_file, None))
+    return tuple(signature)
+
+
+# 模板目录 -> TemplateCatalog
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+_catalog_hits = 0
+_catalog_misses = 0
+
+def get_template_catalog(templates_dir):
+    """
+    获取模板目录的共享目录对象，目录或模板文件变化（按修改时间判断）时重新扫描
+    
+    Args:
+        templates_dir: HTML模板目录
+        
+    Returns:
+        TemplateCatalog对象
+    """
+    global _catalog_hits, _catalog_misses
+    key = os.path.abspath(templates_dir)
+    signature = _catalog_signature(key)
+    catalog = _catalogs.get(key)
+    if catalog is not None and catalog.signature == signature:
+        _catalog_hits += 1
+        return catalog
+    
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None or catalog.signature != signature:
+            catalog = TemplateCatalog(key, signature)
+            _catalogs[key] = catalog
+            _catalog_misses += 1
+        else:
+            _catalog_hits += 1
+    return catalog
+
+
+def template_catalog_stats():
+    """返回模板目录缓存的统计信息"""
+    return {
+        "dirs": len(_catalogs),
+        "hits": _catalog_hits,
+        "misses": _catalog_misses
+    }
+
+
+class ContentFiller:
+    """内容填充器，将大纲内容填充到HTML模板中"""
+    
+    def __init__(self, templates_dir):
+        """
+        初始化内容填充器
+        
+        Args:
+            templates_dir: HTML模板目录
+        """
+        self.templates_dir = templates_dir
+        
+        # Jinja2环境和模板用途目录在进程内按目录共享，不随每份演示文稿重建
+        catalog = get_template_catalog(templates_dir)
+        self.template_env = catalog.env
+        self.available_templates = catalog.templates
     
     def get_template_for_slide(self, slide_data):
         """
@@ -377,6 +465,9 @@ def fill_outline_content(outline, templates_dir):
         title = slide_data.get("title", f"幻灯片 {i+1}")
         slide_titles.append({"index": i, "title": title})
     
+    # 导航栏片段整套只构建一次
+    decorator = SlideDecorator(slide_titles)
+
     # 填充每个幻灯片
     filled_slides = []
     for i, slide_data in enumerate(slides):
@@ -392,69 +483,16 @@ def fill_outline_content(outline, templates_dir):
         # 填充内容
         html = filler.fill_slide_content(slide_data)
         if html:
-            # 添加导航栏
-            html = _add_navigation_to_html(html, slide_titles, i)
-            
-            # 添加幻灯片编号
-            html = _add_slide_number(html, i+1, len(slides))
+            # 添加导航栏和幻灯片编号
+            html = decorator.decorate(html, i)
             
             filled_slides.append(html)
             
     logger.info(f"成功填充了 {len(filled_slides)} 张幻灯片")
     return filled_slides
 
-def _add_navigation_to_html(html, slide_titles, current_index):
-    """
-    向HTML添加导航栏
-    
-    Args:
-        html: HTML内容
-        slide_titles: 幻灯片标题列表
-        current_index: 当前幻灯片索引
-        
-    Returns:
-        添加导航栏后的HTML
-    """
-    # 创建导航HTML
-    nav_html = '<div class="slide-nav">\n'
-    for i, slide in enumerate(slide_titles):
-        active_class = ' class="active"' if i == current_index else ''
-        nav_html += f'  <div class="slide-nav-item"{active_class}>{i+1}. {slide["title"]}</div>\n'
-    nav_html += '</div>\n'
-    
-    # 查找插入位置
-    if '<div class="slide-nav">' in html:
-        # 已有导航栏占位符，替换它
-        html = re.sub(r'<div class="slide-nav">.*?</div>\s*', nav_html, html, flags=re.DOTALL)
-    else:
-        # 没有导航栏占位符，在slide-container后插入
-        html = html.replace('<div class="slide', '<div class="slide-with-nav slide', 1)
-        
-    return html
-
-def _add_slide_number(html, current, total):
-    """
-    向HTML添加幻灯片编号
-    
-    Args:
-        html: HTML内容
-        current: 当前幻灯片编号
-        total: 总幻灯片数
-        
-    Returns:
-        添加编号后的HTML
-    """
-    # 创建幻灯片编号HTML
-    number_html = f'<div class="slide-number">{current}/{total}</div>'
-    
-    # 在</body>前插入
-    if '</body>' in html:
-        html = html.replace('</body>', f'{number_html}</body>')
-    else:
-        html += number_html
-        
-    # 添加样式
-    style_html = """
+# 导航栏和编号共用的样式，每张幻灯片插入一次
+_SLIDE_DECORATION_STYLE = """
 <style>
 .slide-number {
     position: absolute;
@@ -495,13 +533,90 @@ def _add_slide_number(html, current, total):
 }
 </style>
 """
-    
-    # 在</head>前插入
-    if '</head>' in html:
-        html = html.replace('</head>', f'{style_html}</head>')
-    
-    return html
-    
+
+_NAV_PLACEHOLDER_RE = re.compile(r'<div class="slide-nav">.*?</div>\s*', re.DOTALL)
+
+class SlideDecorator:
+    """
+    为一套幻灯片添加导航栏和编号
+
+    导航栏片段按整套幻灯片只构建一次，每张幻灯片只需切出当前项的高亮版本；
+    导航栏、样式和编号在一次扫描中定位，再一次性拼接，单张幻灯片的开销不随页数增长。
+    """
+
+    def __init__(self, slide_titles):
+        """
+        Args:
+            slide_titles: 幻灯片标题列表，元素为{"index", "title"}
+        """
+        self.total = len(slide_titles)
+        items = [f'{i+1}. {slide["title"]}</div>\n' for i, slide in enumerate(slide_titles)]
+        self._active_items = [f'  <div class="slide-nav-item active">{item}' for item in items]
+
+        # 所有未高亮项拼成一个字符串，记录每项的起止位置以便切片
+        plain_items = [f'  <div class="slide-nav-item">{item}' for item in items]
+        self._offsets = [0]
+        for item in plain_items:
+            self._offsets.append(self._offsets[-1] + len(item))
+        self._nav_body = ''.join(plain_items)
+
+    def nav_html(self, current_index):
+        """
+        当前幻灯片的导航栏HTML
+
+        Args:
+            current_index: 当前幻灯片索引
+
+        Returns:
+            导航栏HTML
+        """
+        body = self._nav_body
+        if 0 <= current_index < self.total:
+            body = (body[:self._offsets[current_index]] + self._active_items[current_index]
+                    + body[self._offsets[current_index + 1]:])
+        return f'<div class="slide-nav">\n{body}</div>\n'
+
+    def decorate(self, html, current_index):
+        """
+        向HTML添加导航栏、幻灯片编号和样式
+
+        Args:
+            html: HTML内容
+            current_index: 当前幻灯片索引
+
+        Returns:
+            添加导航栏和编号后的HTML
+        """
+        # (位置, 替换长度, 插入内容)，最后按位置一次拼接
+        edits = []
+
+        match = _NAV_PLACEHOLDER_RE.search(html)
+        if match:
+            # 已有导航栏占位符，替换它
+            edits.append((match.start(), match.end() - match.start(), self.nav_html(current_index)))
+        else:
+            # 没有导航栏占位符，给第一个slide容器加上slide-with-nav
+            pos = html.find('<div class="slide')
+            if pos != -1:
+                edits.append((pos, len('<div class="slide'), '<div class="slide-with-nav slide'))
+
+        head_pos = html.find('</head>')
+        if head_pos != -1:
+            edits.append((head_pos, 0, _SLIDE_DECORATION_STYLE))
+
+        number_html = f'<div class="slide-number">{current_index + 1}/{self.total}</div>'
+        body_pos = html.find('</body>')
+        edits.append((body_pos if body_pos != -1 else len(html), 0, number_html))
+
+        parts = []
+        cursor = 0
+        for pos, length, text in sorted(edits, key=lambda edit: edit[0]):
+            parts.append(html[cursor:pos])
+            parts.append(text)
+            cursor = pos + length
+        parts.append(html[cursor:])
+        return ''.join(parts)
+
 if __name__ == "__main__":
     import sys
     
@@ -3,14 +3,34 @@ import sys
 import logging
 import json
 import random
-import requests
 import re
+import uuid
 from pathlib import Path
 import datetime
 
 # 配置日志
 logger = logging.getLogger("ppt_engine.content_generator")
 
+# 优先使用共享的HTTP连接池
+try:
+    import http_client
+except ImportError:
+    import requests as http_client
+
+# 尝试导入图片磁盘缓存
+try:
+    from image_disk_cache import get_image_disk_cache
+    HAS_IMAGE_DISK_CACHE = True
+except ImportError:
+    HAS_IMAGE_DISK_CACHE = False
+
+# 尝试导入并发图片解析
+try:
+    from image_prefetch import resolve_images, provider_slot
+    HAS_IMAGE_PREFETCH = True
+except ImportError:
+    HAS_IMAGE_PREFETCH = False
+
 class ContentGenerator:
     """内容生成器，负责填充和增强PPT内容"""
     
@@ -62,6 +82,9 @@ class ContentGenerator:
             
         enhanced_content = []
         
+        # 预先收集所有需要生成的图片并并发处理
+        generated_images = self._generate_slide_images(content_data)
+        
         for i, slide in enumerate(content_data):
             # 确保slide是字典格式
             if not isinstance(slide, dict):
@@ -85,10 +108,7 @@ class ContentGenerator:
                 if 'image' in enhanced_slide and isinstance(enhanced_slide['image'], str):
                     # 如果是图片描述而非URL，则生成图片
                     if not enhanced_slide['image'].startswith(('http', '/')):
-                        # 构建图片生成提示词
-                        prompt = self._create_image_prompt(enhanced_slide)
-                        # 生成图片
-                        image_path = self._generate_ai_image(prompt)
+                        image_path = generated_images.get(i)
                         if image_path:
                             enhanced_slide['image'] = image_path
                 
@@ -116,6 +136,37 @@ class ContentGenerator:
         logger.info(f"内容增强完成，共处理 {len(enhanced_content)} 张幻灯片")
         return enhanced_content
         
+    def _generate_slide_images(self, content_data):
+        """
+        收集所有幻灯片的图片生成请求并并发解析
+        
+        Args:
+            content_data: 原始内容数据
+            
+        Returns:
+            字典，键为幻灯片索引，值为生成的图片路径
+        """
+        tasks = {}
+        for i, slide in enumerate(content_data):
+            if not isinstance(slide, dict):
+                continue
+            image = slide.get('image')
+            # 只处理图片描述，已有URL或路径的跳过
+            if isinstance(image, str) and image and not image.startswith(('http', '/')):
+                prompt = self._create_image_prompt(slide)
+                tasks[i] = lambda prompt=prompt: self._generate_ai_image(prompt)
+                
+        if not tasks:
+            return {}
+            
+        logger.info(f"共有 {len(tasks)} 张幻灯片需要生成图片")
+        
+        if HAS_IMAGE_PREFETCH:
+            return resolve_images(tasks)
+            
+        # 没有并发模块时逐个生成
+        return {i: task() for i, task in tasks.items()}
+        
     def fill_template(self, template_data, content_data):
         """
         将内容填充到模板中
@@ -294,8 +345,22 @@ class ContentGenerator:
                 "size": "1024x1024"
             }
             
+            # 检查磁盘缓存，相同提示词和参数无需再次调用API
+            cache_key = None
+            if HAS_IMAGE_DISK_CACHE:
+                disk_cache = get_image_disk_cache()
+                cache_key = disk_cache.make_key(prompt, api_url=self.image_api_url, size=payload["size"])
+                cached_path = disk_cache.get(cache_key)
+                if cached_path:
+                    logger.info(f"使用磁盘缓存的图片: {cached_path}")
+                    return f"/image_cache/{os.path.basename(cached_path)}"
+            
             logger.info(f"调用AI图片生成API: {self.image_api_url}")
-            response = requests.post(self.image_api_url, headers=headers, json=payload, timeout=30)
+            if HAS_IMAGE_PREFETCH:
+                with provider_slot("custom"):
+                    response = http_client.post(self.image_api_url, headers=headers, json=payload, timeout=30)
+            else:
+                response = http_client.post(self.image_api_url, headers=headers, json=payload, timeout=30)
             
             if response.status_code != 200:
                 logger.error(f"API请求失败: {response.status_code}, {response.text}")
@@ -308,7 +373,7 @@ class ContentGenerator:
             
             if image_url:
                 # 下载并缓存图片
-                return self._download_and_cache_image(image_url)
+                return self._download_and_cache_image(image_url, cache_key)
                 
             return None
         except Exception as e:
@@ -351,31 +416,37 @@ class ContentGenerator:
             logger.error(f"备用图片生成失败: {str(e)}")
             return None
             
-    def _download_and_cache_image(self, image_url):
+    def _download_and_cache_image(self, image_url, cache_key=None):
         """
         下载并缓存图片
         
         Args:
             image_url: 图片URL
+            cache_key: 磁盘缓存键，为空时按图片URL计算
             
         Returns:
             local_path: 本地缓存路径
         """
         try:
             logger.info(f"下载图片: {image_url}")
-            response = requests.get(image_url, timeout=10)
+            response = http_client.get(image_url, timeout=10)
             if response.status_code != 200:
                 logger.error(f"下载图片失败: {response.status_code}")
                 return None
                 
-            # 生成唯一文件名
-            timestamp = int(datetime.datetime.now().timestamp())
-            filename = f"ai_generated_{timestamp}.jpg"
-            file_path = os.path.join(self.image_cache_dir, filename)
-            
-            # 保存图片
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
+            if HAS_IMAGE_DISK_CACHE:
+                # 按内容寻址保存到共享磁盘缓存
+                disk_cache = get_image_disk_cache()
+                file_path = disk_cache.put(cache_key or disk_cache.make_key(image_url), response.content, ext=".jpg")
+                filename = os.path.basename(file_path)
+            else:
+                # 生成唯一文件名
+                filename = f"ai_generated_{uuid.uuid4().hex}.jpg"
+                file_path = os.path.join(self.image_cache_dir, filename)
+                
+                # 保存图片
+                with open(file_path, 'wb') as f:
+                    f.write(response.content)
                 
             logger.info(f"图片已保存: {file_path}")
             
@@ -5,6 +5,13 @@ import datetime
 import json
 from pathlib import Path
 
+# 尝试导入任务进度上报（在后台任务中运行时记录各阶段耗时）
+try:
+    from job_queue import set_job_stage
+except ImportError:
+    def set_job_stage(name):
+        pass
+
 # 配置日志
 logger = logging.getLogger("ppt_engine.core")
 
@@ -59,6 +66,7 @@ class PPTEngineCore:
             logger.info(f"开始创建演示文稿，模板: {template}")
             
             # 1. 加载或创建模板
+            set_job_stage("load_template")
             template_data = self.template_manager.get_template(template)
             logger.info(f"模板加载完成: {template}")
             
@@ -67,13 +75,16 @@ class PPTEngineCore:
             logger.info("主题样式应用完成")
             
             # 3. 内容填充和智能增强
+            set_job_stage("enhance_content")
             enhanced_content = self.content_generator.enhance_content(content_data)
             logger.info(f"内容增强完成，共 {len(enhanced_content)} 张幻灯片")
             
+            set_job_stage("fill_template")
             filled_slides = self.content_generator.fill_template(styled_template, enhanced_content)
             logger.info("模板填充完成")
             
             # 4. 渲染最终PPT
+            set_job_stage("render")
             output_path = self.renderer.render(filled_slides)
             logger.info(f"PPT渲染完成，保存至: {output_path}")
             
@@ -102,6 +113,7 @@ class PPTEngineCore:
             logger.info(f"从主题生成演示文稿: {topic}, 学科: {subject}")
             
             # 使用AI生成大纲
+            set_job_stage("generate_outline")
             from .ai_outline_generator import AIOutlineGenerator
             outline_generator = AIOutlineGenerator()
             slides_data = outline_generator.generate(topic, subject)
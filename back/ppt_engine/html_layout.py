@@ -0,0 +1,1555 @@
+#!/usr/bin/env python
+"""
+无浏览器HTML布局引擎
+在Python中直接解析幻灯片HTML及其样式表，按模板实际使用的CSS子集
+（盒模型、绝对定位、字体颜色、flex行列、简单网格、表格、图片）计算布局，
+再交给NativeSlideBuilder生成PPT原生形状。用于没有Chrome的部署环境。
+"""
+
+import os
+import re
+import time
+import logging
+import functools
+from io import BytesIO
+from bs4 import BeautifulSoup, NavigableString, Comment
+from PIL import Image
+from pptx import Presentation
+from .native_converter import NativeSlideBuilder, SLIDE_WIDTH, SLIDE_HEIGHT, fetch_image, parse_css_color, NAMED_COLORS
+
+# 获取模块日志记录器
+logger = logging.getLogger("ppt_engine.html_layout")
+
+# 与浏览器窗口大小一致的视口
+VIEWPORT_WIDTH = 1280
+VIEWPORT_HEIGHT = 720
+ROOT_FONT_SIZE = 16.0
+
+_SIDES = ("top", "right", "bottom", "left")
+
+# 浏览器默认样式中与布局相关的部分
+_UA_STYLESHEET = """
+html, body, div, p, h1, h2, h3, h4, h5, h6, ul, ol, section, header, footer, nav, article, main,
+aside, figure, figcaption, blockquote, form, dl, dt, dd, hr, pre, address, center { display: block; }
+li { display: list-item; }
+table { display: table; }
+head, script, style, title, meta, link, template, noscript, base { display: none; }
+body { margin: 8px; }
+h1 { font-size: 2em; margin: 0.67em 0; font-weight: bold; }
+h2 { font-size: 1.5em; margin: 0.83em 0; font-weight: bold; }
+h3 { font-size: 1.17em; margin: 1em 0; font-weight: bold; }
+h4 { margin: 1.33em 0; font-weight: bold; }
+h5 { font-size: 0.83em; margin: 1.67em 0; font-weight: bold; }
+h6 { font-size: 0.67em; margin: 2.33em 0; font-weight: bold; }
+p, ul, ol, dl, blockquote, figure { margin: 1em 0; }
+ul, ol { padding-left: 40px; }
+ul { list-style-type: disc; }
+ol { list-style-type: decimal; }
+b, strong, th { font-weight: bold; }
+i, em { font-style: italic; }
+th { text-align: center; }
+td, th { padding: 1px; }
+small { font-size: 0.83em; }
+center { text-align: center; }
+"""
+
+# 可继承的属性
+_INHERITED = {"color", "font-family", "font-size", "font-weight", "font-style", "line-height", "text-align",
+              "list-style-type", "visibility", "white-space", "text-transform"}
+
+# 属性初始值
+_INITIAL = {
+    "display": "inline", "position": "static", "font-size": "16px", "color": "#000000",
+    "font-family": "sans-serif", "font-weight": "400", "font-style": "normal", "line-height": "normal",
+    "text-align": "left", "list-style-type": "disc", "visibility": "visible", "white-space": "normal",
+    "background-color": "transparent", "background-image": "none", "box-sizing": "content-box",
+    "flex-direction": "row", "justify-content": "flex-start", "align-items": "stretch",
+    "flex-grow": "0", "flex-shrink": "1", "flex-basis": "auto", "object-fit": "fill", "opacity": "1",
+    "text-transform": "none",
+}
+
+# 浏览器中无法由Python还原的元素
+_UNSUPPORTED_TAGS = {"svg", "canvas", "video", "iframe", "object", "embed", "audio"}
+
+_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.S)
+_LENGTH_PATTERN = re.compile(r'^(-?\d*\.?\d+)(px|em|rem|%|vw|vh|pt)?$')
+_VAR_PATTERN = re.compile(r'var\(\s*(--[\w-]+)\s*(?:,\s*([^()]*(?:\([^()]*\)[^()]*)*))?\)')
+_IMPORTANT_PATTERN = re.compile(r'\s*!\s*important\s*$', re.I)
+_SKIPPED_SELECTOR_PATTERN = re.compile(r'::?(before|after|hover|active|focus|visited|first-line|first-letter|placeholder|selection)\b')
+_WRAP_TOKEN_PATTERN = re.compile(r'[⺀-￿]|[^\s⺀-￿]+|\s+')
+_URL_PATTERN = re.compile(r'url\(\s*[\'"]?(.*?)[\'"]?\s*\)')
+
+
+# ---------------------------------------------------------------- 样式表解析
+
+def _split_top_level(text, separator):
+    """按分隔符切分，忽略括号内的分隔符"""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == separator and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _split_values(value):
+    """按空白切分属性值，保留括号内的空白"""
+    return [part for part in _split_top_level(re.sub(r'\s+', ' ', value.strip()), ' ') if part]
+
+
+def _is_color(token):
+    token = token.lower()
+    return (token.startswith(('#', 'rgb', 'hsl')) or token in NAMED_COLORS
+            or token in ('transparent', 'currentcolor'))
+
+
+def _box_values(value):
+    """展开1到4个值的简写（上右下左）"""
+    values = _split_values(value)
+    if not values:
+        return None
+    while len(values) < 4:
+        values.append(values[{1: 0, 2: 0, 3: 1}[len(values)]])
+    return values[:4]
+
+
+def _expand_border(prefix, value):
+    """展开border简写为宽度、样式、颜色"""
+    width, style, color = "medium", "none", "currentcolor"
+    for token in _split_values(value):
+        if _is_color(token):
+            color = token
+        elif token in ("none", "hidden", "solid", "dashed", "dotted", "double", "groove", "ridge", "inset", "outset"):
+            style = token
+        else:
+            width = token
+    return [(f"{prefix}-width", width), (f"{prefix}-style", style), (f"{prefix}-color", color)]
+
+
+def _expand_declaration(name, value):
+    """展开简写属性，返回[(属性, 值)]"""
+    if name in ("margin", "padding"):
+        values = _box_values(value)
+        return [(f"{name}-{side}", v) for side, v in zip(_SIDES, values)] if values else []
+    if name == "border":
+        return [item for side in _SIDES for item in _expand_border(f"border-{side}", value)]
+    if name in tuple(f"border-{side}" for side in _SIDES):
+        return _expand_border(name, value)
+    if name in ("border-width", "border-style", "border-color"):
+        values = _box_values(value)
+        kind = name.split('-')[1]
+        return [(f"border-{side}-{kind}", v) for side, v in zip(_SIDES, values)] if values else []
+    if name == "border-radius":
+        return [(name, (_split_values(value.split('/')[0]) or ["0"])[0])]
+    if name == "background":
+        image, color, size = "none", "transparent", None
+        main, *size_parts = _split_top_level(value, '/')
+        size_part = '/'.join(size_parts)
+        for token in _split_values(main):
+            lowered = token.lower()
+            if lowered.startswith(("linear-gradient", "radial-gradient", "url(")):
+                image = token
+            elif _is_color(token):
+                color = token
+        if size_part:
+            size = ' '.join(_split_values(size_part)[:2])
+        result = [("background-image", image), ("background-color", color)]
+        if size:
+            result.append(("background-size", size))
+        return result
+    if name == "flex":
+        values = _split_values(value)
+        if values == ["none"]:
+            return [("flex-grow", "0"), ("flex-shrink", "0"), ("flex-basis", "auto")]
+        if values == ["auto"]:
+            return [("flex-grow", "1"), ("flex-shrink", "1"), ("flex-basis", "auto")]
+        numbers = [v for v in values if re.match(r'^\d*\.?\d+$', v)]
+        basis = next((v for v in values if v not in numbers), "0px")
+        grow = numbers[0] if numbers else "1"
+        shrink = numbers[1] if len(numbers) > 1 else "1"
+        return [("flex-grow", grow), ("flex-shrink", shrink), ("flex-basis", basis)]
+    if name == "gap" or name == "grid-gap":
+        values = _split_values(value)
+        return [("row-gap", values[0]), ("column-gap", values[-1])] if values else []
+    if name == "list-style":
+        return [("list-style-type", "none")] if "none" in _split_values(value) else []
+    return [(name, value)]
+
+
+def _parse_declarations(text):
+    """解析声明块，返回[(属性, 值, 是否important)]"""
+    declarations = []
+    for part in _split_top_level(text, ';'):
+        name, sep, value = part.partition(':')
+        name = name.strip().lower()
+        if not sep or not name:
+            continue
+        important = bool(_IMPORTANT_PATTERN.search(value))
+        value = _IMPORTANT_PATTERN.sub('', value).strip()
+        if name.startswith('--'):
+            declarations.append((name, value, important))
+            continue
+        for expanded_name, expanded_value in _expand_declaration(name, value):
+            declarations.append((expanded_name, expanded_value, important))
+    return declarations
+
+
+def _matching_brace(text, start):
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == '{':
+            depth += 1
+        elif text[i] == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(text) - 1
+
+
+@functools.lru_cache(maxsize=64)
+def parse_stylesheet(css_text):
+    """
+    解析样式表（同一份样式表在多张幻灯片间只解析一次）
+
+    @media、@keyframes等@规则被忽略：幻灯片视口固定为1280x720。
+
+    Args:
+        css_text: CSS文本
+
+    Returns:
+        规则元组，每项为(选择器, 声明列表)
+    """
+    css_text = _COMMENT_PATTERN.sub('', css_text)
+    rules = []
+    pos = 0
+    while pos < len(css_text):
+        brace = css_text.find('{', pos)
+        if brace < 0:
+            break
+        prelude = css_text[pos:brace].strip()
+        end = _matching_brace(css_text, brace)
+        if prelude and not prelude.startswith('@'):
+            rules.append((prelude, tuple(_parse_declarations(css_text[brace + 1:end]))))
+        pos = end + 1
+    return tuple(rules)
+
+
+@functools.lru_cache(maxsize=64)
+def _read_stylesheet(path, mtime):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _specificity(selector):
+    """选择器优先级(ID数, 类/属性/伪类数, 标签数)"""
+    ids = len(re.findall(r'#[\w-]+', selector))
+    classes = len(re.findall(r'\.[\w-]+|\[[^\]]*\]|(?<!:):[\w-]+', selector))
+    tags = len(re.findall(r'(?:^|[\s>+~(])([a-zA-Z][\w-]*)', selector))
+    return ids, classes, tags
+
+
+# ---------------------------------------------------------------- 长度与文字度量
+
+def _length(value, font_size, reference=None):
+    """
+    CSS长度转换为像素
+
+    Args:
+        value: CSS长度字符串
+        font_size: 当前元素字号（em的基准）
+        reference: 百分比的基准，None表示百分比无法确定
+
+    Returns:
+        像素值，auto或无法解析时返回None
+    """
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value.startswith('calc(') and value.endswith(')'):
+        total, sign = 0.0, 1
+        for token in re.split(r'\s+([+-])\s+', value[5:-1].strip()):
+            if token in ('+', '-'):
+                sign = 1 if token == '+' else -1
+                continue
+            part = _length(token, font_size, reference)
+            if part is None:
+                return None
+            total += sign * part
+        return total
+    match = _LENGTH_PATTERN.match(value)
+    if not match:
+        return None
+    number, unit = float(match.group(1)), match.group(2)
+    if unit in (None, 'px'):
+        return number
+    if unit == 'em':
+        return number * font_size
+    if unit == 'rem':
+        return number * ROOT_FONT_SIZE
+    if unit == 'pt':
+        return number * 4 / 3
+    if unit == 'vw':
+        return number * VIEWPORT_WIDTH / 100
+    if unit == 'vh':
+        return number * VIEWPORT_HEIGHT / 100
+    return number * reference / 100 if reference is not None else None
+
+
+def _char_width(ch):
+    """字符宽度（以字号为单位的估计值）"""
+    code = ord(ch)
+    if code >= 0x2E80:
+        return 1.0
+    if ch == ' ':
+        return 0.28
+    if ch in "iljI.,:;'|!`()[]{}":
+        return 0.3
+    if ch in "mwMW@%":
+        return 0.85
+    if ch.isupper() or ch.isdigit():
+        return 0.62
+    return 0.52
+
+
+@functools.lru_cache(maxsize=4096)
+def _token_width(token):
+    return sum(_char_width(ch) for ch in token)
+
+
+def _text_width(text, font):
+    return _token_width(text) * font["size"] * (1.05 if font["weight"] >= 600 else 1.0)
+
+
+def _count_lines(line_runs, width):
+    """估计一个硬换行段落在给定宽度内折成几行"""
+    lines, x = 1, 0.0
+    for run in line_runs:
+        for token in _WRAP_TOKEN_PATTERN.findall(run["text"]):
+            token_width = _text_width(token, run["font"])
+            if token.isspace():
+                x += token_width if x > 0 else 0
+                continue
+            if x > 0 and x + token_width > width:
+                lines += 1
+                x = 0.0
+            if width > 0 and token_width > width:
+                lines += int(token_width // width)
+                token_width %= width
+            x += token_width
+    return lines
+
+
+def _parse_gradient(value):
+    """解析linear-gradient，返回{"angle", "stops": [(颜色, 位置)]}，无法解析时返回None"""
+    match = re.match(r'(?:repeating-)?(linear|radial)-gradient\((.*)\)$', value.strip(), re.S)
+    if not match:
+        return None
+    parts = [part.strip() for part in _split_top_level(match.group(2), ',')]
+    angle = 180.0
+    directions = {"to top": 0, "to right": 90, "to bottom": 180, "to left": 270, "to top right": 45,
+                  "to right top": 45, "to bottom right": 135, "to right bottom": 135, "to bottom left": 225,
+                  "to left bottom": 225, "to top left": 315, "to left top": 315}
+    if parts and parts[0].endswith('deg'):
+        angle = float(parts.pop(0)[:-3])
+    elif parts and parts[0] in directions:
+        angle = directions[parts.pop(0)]
+    elif parts and match.group(1) == "radial" and not _is_color(_split_values(parts[0])[0]):
+        parts.pop(0)
+
+    stops = []
+    for i, part in enumerate(parts):
+        tokens = _split_values(part)
+        if not tokens or not _is_color(tokens[0]):
+            continue
+        position = tokens[1] if len(tokens) > 1 and tokens[1].endswith('%') else None
+        stops.append((tokens[0], float(position[:-1]) / 100 if position else None))
+    if not stops:
+        return None
+    count = len(stops)
+    stops = [(color, position if position is not None else (i / (count - 1) if count > 1 else 0.0))
+             for i, (color, position) in enumerate(stops)]
+    return {"angle": angle % 360, "stops": stops}
+
+
+# ---------------------------------------------------------------- 样式计算
+
+class _StyleResolver:
+    """按层叠规则计算每个元素的样式"""
+
+    def __init__(self, soup, stylesheets):
+        entries = {}
+        sources = [(0, _UA_STYLESHEET)] + [(1, css) for css in stylesheets]
+        order = 0
+        for origin, css in sources:
+            for selectors, declarations in parse_stylesheet(css):
+                for selector in _split_top_level(selectors, ','):
+                    selector = selector.strip()
+                    if not selector or _SKIPPED_SELECTOR_PATTERN.search(selector):
+                        continue
+                    try:
+                        matched = soup.select(selector)
+                    except Exception:
+                        continue
+                    specificity = _specificity(selector)
+                    order += 1
+                    for element in matched:
+                        entries.setdefault(id(element), []).append((origin, specificity, order, declarations))
+
+        # 行内样式
+        for element in soup.find_all(style=True):
+            order += 1
+            entries.setdefault(id(element), []).append(
+                (2, (0, 0, 0), order, tuple(_parse_declarations(element.get('style', '')))))
+
+        self._declared = {}
+        for key, element_entries in entries.items():
+            element_entries.sort(key=lambda entry: entry[:3])
+            declared = {}
+            # 普通声明按优先级覆盖，important声明最后覆盖
+            for important in (False, True):
+                for _, _, _, declarations in element_entries:
+                    for name, value, is_important in declarations:
+                        if is_important == important:
+                            declared[name] = value
+            self._declared[key] = declared
+        self._computed = {}
+
+    def computed(self, element):
+        """元素的计算样式（字典，font-size为px值）"""
+        key = id(element)
+        if key in self._computed:
+            return self._computed[key]
+
+        parent = element.parent
+        parent_style = self.computed(parent) if parent is not None and parent.name not in (None, "[document]") else None
+        if parent_style is None:
+            style = {name: _INITIAL[name] for name in _INHERITED}
+            style["font-size"] = f"{ROOT_FONT_SIZE}px"
+        else:
+            style = {name: value for name, value in parent_style.items()
+                     if name in _INHERITED or name.startswith('--')}
+        parent_font_size = float(style["font-size"][:-2])
+
+        declared = self._declared.get(key, {})
+        for name, value in declared.items():
+            if name.startswith('--'):
+                style[name] = value
+        for name, value in declared.items():
+            if name.startswith('--'):
+                continue
+            if 'var(' in value:
+                value = self._resolve_vars(value, style)
+            if value in ("inherit", "unset") and parent_style is not None:
+                value = parent_style.get(name, _INITIAL.get(name, ""))
+            elif value in ("initial", "inherit", "unset"):
+                value = _INITIAL.get(name, "")
+            style[name] = value
+
+        # 字号和行高在此换算为绝对值，子元素继承计算后的值
+        if "font-size" in declared:
+            style["font-size"] = f"{self._font_size(style['font-size'], parent_font_size)}px"
+        font_size = float(style["font-size"][:-2])
+        line_height = style.get("line-height", "normal")
+        if "line-height" in declared and line_height.endswith(('em', '%', 'rem', 'pt')):
+            style["line-height"] = f"{_length(line_height, font_size, font_size)}px"
+        for name, value in _INITIAL.items():
+            style.setdefault(name, value)
+        if style.get("color", "").lower() == "currentcolor":
+            style["color"] = parent_style["color"] if parent_style else _INITIAL["color"]
+
+        self._computed[key] = style
+        return style
+
+    @staticmethod
+    def _resolve_vars(value, style):
+        for _ in range(10):
+            if 'var(' not in value:
+                break
+            value = _VAR_PATTERN.sub(lambda m: style.get(m.group(1), m.group(2) or ''), value)
+        return value
+
+    @staticmethod
+    def _font_size(value, parent_size):
+        keywords = {"xx-small": 9, "x-small": 10, "small": 13, "medium": 16, "large": 18, "x-large": 24,
+                    "xx-large": 32, "larger": parent_size * 1.2, "smaller": parent_size / 1.2}
+        if value in keywords:
+            return float(keywords[value])
+        size = _length(value, parent_size, parent_size)
+        return size if size is not None else parent_size
+
+
+# ---------------------------------------------------------------- 布局
+
+class _Box:
+    """布局结果：边框盒的位置和大小，以及绘制所需的内容"""
+
+    def __init__(self, element, style, kind="block"):
+        self.element = element
+        self.style = style
+        self.kind = kind
+        self.x = self.y = self.w = self.h = 0.0
+        self.margin_top = self.margin_bottom = self.margin_left = self.margin_right = 0.0
+        self.borders = (0.0, 0.0, 0.0, 0.0)
+        self.children = []
+        self.positioned = False
+        self.runs = None
+        self.marker = None
+        self.data = None
+        self.natural = None
+        self.rows = None
+        self.static_position = (0.0, 0.0)
+
+    def shift(self, dx, dy):
+        if not dx and not dy:
+            return
+        self.x += dx
+        self.y += dy
+        for child in self.children:
+            child.shift(dx, dy)
+
+
+class HTMLLayoutEngine:
+    """
+    一张幻灯片HTML的布局计算
+
+    支持普通流中的块级元素（外边距、内边距、边框、宽高及其最值、aspect-ratio）、
+    行内文字（继承的字体、颜色、对齐、行高、<br>换行）、列表、绝对/相对定位、
+    flex行列（gap、flex-grow/shrink、justify-content、align-items）、
+    简单网格（grid-template-columns）、表格和图片（object-fit）。
+    """
+
+    def __init__(self, html_content, base_dir=None, image_cache=None):
+        """
+        Args:
+            html_content: 完整的HTML文档
+            base_dir: 样式表、图片等相对路径资源所在的目录
+            image_cache: 在多张幻灯片之间共享的图片缓存
+        """
+        soup = BeautifulSoup(html_content, 'html.parser')
+        if soup.find('html') is None:
+            soup = BeautifulSoup(f"<html><body>{html_content}</body></html>", 'html.parser')
+        self.soup = soup
+        self.base_dir = base_dir
+        self.images = image_cache if image_cache is not None else {}
+        self.styles = _StyleResolver(soup, self._stylesheets())
+        self._max_content = {}
+        self._fixed = []
+
+    def _stylesheets(self):
+        """按文档顺序收集<style>和可读取的<link rel=stylesheet>"""
+        sheets = []
+        for tag in self.soup.find_all(['style', 'link']):
+            if tag.name == 'style':
+                sheets.append(tag.string or '')
+                continue
+            if 'stylesheet' not in (tag.get('rel') or []) or not tag.get('href') or not self.base_dir:
+                continue
+            path = os.path.join(self.base_dir, tag['href'].split('?')[0])
+            try:
+                sheets.append(_read_stylesheet(path, os.path.getmtime(path)))
+            except OSError:
+                logger.debug(f"无法读取样式表: {path}")
+        return tuple(sheets)
+
+    # ------------------------------------------------------------ 样式辅助
+
+    @staticmethod
+    def _font_size(style):
+        return float(style["font-size"][:-2])
+
+    def _line_height(self, style):
+        font_size = self._font_size(style)
+        value = style.get("line-height", "normal")
+        if value == "normal":
+            return font_size * 1.2
+        if re.match(r'^\d*\.?\d+$', value):
+            return font_size * float(value)
+        return _length(value, font_size) or font_size * 1.2
+
+    def _font(self, style):
+        weight = style.get("font-weight", "400")
+        weight = {"normal": 400, "bold": 700, "bolder": 700, "lighter": 300}.get(weight) or (
+            int(weight) if weight.isdigit() else 400)
+        return {
+            "size": self._font_size(style),
+            "weight": weight,
+            "italic": style.get("font-style") in ("italic", "oblique"),
+            "color": style.get("color", _INITIAL["color"]),
+            "family": style.get("font-family", ""),
+            "align": {"start": "left", "end": "right", "-webkit-center": "center"}.get(
+                style.get("text-align"), style.get("text-align", "left")),
+            "lineHeight": f"{self._line_height(style):.2f}px",
+        }
+
+    def _edges(self, style, prefix, reference):
+        font_size = self._font_size(style)
+        return [_length(style.get(f"{prefix}-{side}", "0"), font_size, reference) for side in _SIDES]
+
+    def _border_widths(self, style):
+        widths = []
+        for side in _SIDES:
+            if style.get(f"border-{side}-style", "none") in ("none", "hidden"):
+                widths.append(0.0)
+                continue
+            value = style.get(f"border-{side}-width", "medium")
+            widths.append({"thin": 1.0, "medium": 3.0, "thick": 5.0}.get(value)
+                          or _length(value, self._font_size(style)) or 0.0)
+        return tuple(widths)
+
+    def _is_inline(self, node, style):
+        """行内级元素：只包含文字和行内元素"""
+        if style.get("display") != "inline" or node.name in _UNSUPPORTED_TAGS or node.name in ("img", "table"):
+            return False
+        for child in node.children:
+            if isinstance(child, NavigableString) or child.name is None:
+                continue
+            child_style = self.styles.computed(child)
+            if child_style.get("display") == "none" or child.name == "br":
+                continue
+            if not self._is_inline(child, child_style):
+                return False
+        return True
+
+    # ------------------------------------------------------------ 行内文字
+
+    def _collect_runs(self, nodes, style):
+        """收集行内内容，返回按硬换行分组的[[{"text", "font"}]]，没有文字时返回None"""
+        lines = [[]]
+
+        def visit(node, node_style):
+            if isinstance(node, Comment):
+                return
+            if isinstance(node, NavigableString):
+                text = str(node)
+                white_space = node_style.get("white-space", "normal")
+                segments = text.split('\n') if white_space.startswith('pre') else [re.sub(r'\s+', ' ', text)]
+                transform = node_style.get("text-transform")
+                for i, segment in enumerate(segments):
+                    if i > 0:
+                        lines.append([])
+                    if transform == "uppercase":
+                        segment = segment.upper()
+                    elif transform == "lowercase":
+                        segment = segment.lower()
+                    if segment:
+                        lines[-1].append({"text": segment, "font": self._font(node_style)})
+                return
+            if node.name == "br":
+                lines.append([])
+                return
+            child_style = self.styles.computed(node)
+            if child_style.get("display") == "none":
+                return
+            for child in node.children:
+                visit(child, child_style)
+
+        for node in nodes:
+            visit(node, style)
+
+        result = []
+        for line in lines:
+            # 合并空白：行首行尾去掉，相邻片段之间只保留一个空格
+            merged = []
+            for run in line:
+                text = run["text"]
+                if (not merged or merged[-1]["text"].endswith(' ')) and text.startswith(' '):
+                    text = text.lstrip(' ')
+                if not text:
+                    continue
+                if merged and merged[-1]["font"] == run["font"]:
+                    merged[-1]["text"] += text
+                else:
+                    merged.append({"text": text, "font": run["font"]})
+            if merged:
+                merged[-1]["text"] = merged[-1]["text"].rstrip(' ')
+                if not merged[-1]["text"]:
+                    merged.pop()
+            result.append(merged)
+
+        while result and not result[-1]:
+            result.pop()
+        while result and not result[0]:
+            result.pop(0)
+        if not any(result):
+            return None
+        return result
+
+    def _layout_text(self, runs, style, x, y, width, marker=None):
+        box = _Box(None, style, "text")
+        box.runs = runs
+        box.marker = marker
+        if marker:
+            runs = [[{"text": marker, "font": self._font(style)}] + runs[0]] + runs[1:]
+        line_height = max([self._line_height(style)] +
+                          [run["font"]["size"] * self._line_height(style) / self._font_size(style)
+                           for line in runs for run in line])
+        lines = sum(_count_lines(line, width) if line else 1 for line in runs)
+        box.x, box.y, box.w, box.h = x, y, width, lines * line_height
+        return box
+
+    def _runs_width(self, runs):
+        return max((sum(_text_width(run["text"], run["font"]) for run in line) for line in runs), default=0.0)
+
+    # ------------------------------------------------------------ 固有宽度
+
+    def _max_content_width(self, node, style):
+        """元素的max-content宽度（含内边距、边框和外边距），用于收缩适应"""
+        key = id(node)
+        if key in self._max_content:
+            return self._max_content[key]
+
+        font_size = self._font_size(style)
+        margins = sum(v or 0 for v in self._edges(style, "margin", None)[1::2])
+        if node.name == "img":
+            width = self._layout_image(node, style, 0, 0, VIEWPORT_WIDTH, VIEWPORT_WIDTH, None).w + margins
+            self._max_content[key] = width
+            return width
+
+        padding = sum(v or 0 for v in self._edges(style, "padding", None)[1::2])
+        borders = self._border_widths(style)
+        extra = padding + borders[1] + borders[3]
+        specified = _length(style.get("width"), font_size)
+        if specified is not None:
+            width = specified + (0 if style.get("box-sizing") == "border-box" else extra) + margins
+            self._max_content[key] = width
+            return width
+
+        row = style.get("display") in ("flex", "inline-flex") and not style.get("flex-direction", "row").startswith("column")
+        widths, inline_nodes = [], []
+        for child in node.children:
+            if isinstance(child, NavigableString) or child.name is None:
+                inline_nodes.append(child)
+                continue
+            child_style = self.styles.computed(child)
+            if child_style.get("display") == "none" or child_style.get("position") in ("absolute", "fixed"):
+                continue
+            if not row and self._is_inline(child, child_style):
+                inline_nodes.append(child)
+                continue
+            widths.append(self._max_content_width(child, child_style))
+        runs = self._collect_runs(inline_nodes, style)
+        if runs:
+            widths.append(self._runs_width(runs) + 1)
+        if row:
+            gap = _length(style.get("column-gap"), font_size) or 0.0
+            inner = sum(widths) + gap * max(len(widths) - 1, 0)
+        else:
+            inner = max(widths, default=0.0)
+        if node.name in ("ul", "ol") or style.get("display") == "list-item":
+            inner += font_size
+        width = inner + extra + margins
+        self._max_content[key] = width
+        return width
+
+    # ------------------------------------------------------------ 块级元素
+
+    def _layout_element(self, node, style, x, y, avail_width, cb_width, cb_height, abs_list,
+                        forced_width=None, forced_height=None, align=None, marker_index=None):
+        """按元素类型分派布局，x、y为外边距框左上角"""
+        if node.name == "img":
+            box = self._layout_image(node, style, x, y, avail_width, cb_width, cb_height,
+                                     forced_width, forced_height)
+            if align in ("center", "right") and forced_width is None:
+                free = avail_width - box.w - box.margin_left - box.margin_right
+                box.shift(free / 2 if align == "center" else free, 0)
+            return box
+        if node.name == "table" or style.get("display") == "table":
+            return self._layout_table(node, style, x, y, avail_width, cb_width, forced_width)
+        return self._layout_block(node, style, x, y, avail_width, cb_width, cb_height, abs_list,
+                                  forced_width, forced_height, marker_index)
+
+    def _layout_block(self, node, style, x, y, avail_width, cb_width, cb_height, abs_list,
+                      forced_width=None, forced_height=None, marker_index=None):
+        font_size = self._font_size(style)
+        box = _Box(node, style)
+        margins = self._edges(style, "margin", cb_width)
+        padding = [v or 0.0 for v in self._edges(style, "padding", cb_width)]
+        borders = self._border_widths(style)
+        box.borders = borders
+        border_box = style.get("box-sizing") == "border-box"
+        extra_w = padding[1] + padding[3] + borders[1] + borders[3]
+        extra_h = padding[0] + padding[2] + borders[0] + borders[2]
+
+        # 宽度
+        specified_w = _length(style.get("width"), font_size, cb_width)
+        if forced_width is not None:
+            width = forced_width
+        elif specified_w is not None:
+            width = specified_w + (0 if border_box else extra_w)
+        else:
+            width = avail_width - (margins[1] or 0) - (margins[3] or 0)
+        if forced_width is None:
+            max_w = _length(style.get("max-width"), font_size, cb_width)
+            min_w = _length(style.get("min-width"), font_size, cb_width)
+            if max_w is not None and width > max_w + (0 if border_box else extra_w):
+                width = max_w + (0 if border_box else extra_w)
+                specified_w = max_w
+            if min_w is not None and width < min_w + (0 if border_box else extra_w):
+                width = min_w + (0 if border_box else extra_w)
+        width = max(width, extra_w)
+
+        # 水平方向的auto外边距用于居中或靠右
+        margin_left, margin_right = margins[3], margins[1]
+        free = avail_width - width - (margin_left or 0) - (margin_right or 0)
+        if specified_w is not None and forced_width is None:
+            if margin_left is None and margin_right is None:
+                margin_left = max(free / 2, 0)
+            elif margin_left is None:
+                margin_left = max(free, 0)
+        margin_left = margin_left or 0.0
+        box.margin_top = margins[0] or 0.0
+        box.margin_bottom = margins[2] or 0.0
+
+        # 高度（内容布局之前能确定的部分，供子元素的百分比和flex使用）
+        specified_h = _length(style.get("height"), font_size, cb_height)
+        if forced_height is not None:
+            height = forced_height
+        elif specified_h is not None:
+            height = specified_h + (0 if border_box else extra_h)
+        else:
+            height = None
+            ratio = self._aspect_ratio(style)
+            if ratio:
+                height = width / ratio
+        if height is not None and forced_height is None:
+            height = self._clamp_height(style, height, cb_height, border_box, extra_h)
+
+        box.x = x + margin_left
+        box.y = y + box.margin_top
+        box.w = width
+        content_x = box.x + borders[3] + padding[3]
+        content_y = box.y + borders[0] + padding[0]
+        content_w = width - extra_w
+        content_h = height - extra_h if height is not None else None
+
+        positioned = style.get("position") in ("relative", "absolute", "fixed")
+        own_abs = [] if positioned else abs_list
+
+        marker = None
+        if style.get("display") == "list-item" and style.get("list-style-type", "disc") != "none":
+            marker_type = style.get("list-style-type", "disc")
+            if marker_type in ("decimal", "decimal-leading-zero"):
+                marker = f"{marker_index or 1}. "
+            else:
+                marker = {"circle": "◦ ", "square": "▪ "}.get(marker_type, "• ")
+
+        display = style.get("display")
+        if display in ("flex", "inline-flex"):
+            children, inner_h = self._layout_flex(node, style, content_x, content_y, content_w, content_h, own_abs)
+        elif display == "grid":
+            children, inner_h = self._layout_grid(node, style, content_x, content_y, content_w, content_h, own_abs)
+        else:
+            children, inner_h = self._layout_flow(node, style, content_x, content_y, content_w, content_h,
+                                                  own_abs, marker)
+        box.children = children
+
+        if height is None:
+            height = self._clamp_height(style, inner_h + extra_h, cb_height, border_box, extra_h)
+        box.h = max(height, 0.0)
+
+        if positioned:
+            containing = (box.x + borders[3], box.y + borders[0],
+                          box.w - borders[1] - borders[3], box.h - borders[0] - borders[2])
+            for abs_box in own_abs:
+                self._layout_absolute(abs_box, containing)
+            if style.get("position") == "relative":
+                dx = _length(style.get("left"), font_size, cb_width)
+                if dx is None:
+                    dx = -(_length(style.get("right"), font_size, cb_width) or 0.0)
+                dy = _length(style.get("top"), font_size, cb_height)
+                if dy is None:
+                    dy = -(_length(style.get("bottom"), font_size, cb_height) or 0.0)
+                box.shift(dx, dy)
+        return box
+
+    @staticmethod
+    def _aspect_ratio(style):
+        value = style.get("aspect-ratio")
+        if not value or value == "auto":
+            return None
+        try:
+            parts = [float(part) for part in value.replace('auto', '').split('/') if part.strip()]
+        except ValueError:
+            return None
+        if len(parts) == 2 and parts[1]:
+            return parts[0] / parts[1]
+        return parts[0] if parts and parts[0] else None
+
+    def _clamp_height(self, style, height, cb_height, border_box, extra_h):
+        font_size = self._font_size(style)
+        max_h = _length(style.get("max-height"), font_size, cb_height)
+        min_h = _length(style.get("min-height"), font_size, cb_height)
+        offset = 0 if border_box else extra_h
+        if max_h is not None:
+            height = min(height, max_h + offset)
+        if min_h is not None:
+            height = max(height, min_h + offset)
+        return height
+
+    def _layout_flow(self, node, style, x, y, width, height, abs_list, marker=None):
+        """普通流：块级子元素自上而下排列，连续的行内内容组成文本框"""
+        children = []
+        cursor = y
+        previous_margin = 0.0
+        inline_nodes = []
+        align = style.get("text-align")
+        list_index = 0
+
+        def flush():
+            nonlocal cursor, previous_margin, marker
+            runs = self._collect_runs(inline_nodes, style)
+            inline_nodes.clear()
+            if runs:
+                text_box = self._layout_text(runs, style, x, cursor, width, marker)
+                marker = None
+                children.append(text_box)
+                cursor += text_box.h
+                previous_margin = 0.0
+
+        for child in node.children:
+            if isinstance(child, NavigableString) or child.name is None:
+                inline_nodes.append(child)
+                continue
+            child_style = self.styles.computed(child)
+            if child_style.get("display") == "none" or child.name in _UNSUPPORTED_TAGS:
+                continue
+            if child_style.get("position") in ("absolute", "fixed"):
+                children.append(self._defer_absolute(child, child_style, x, cursor, abs_list))
+                continue
+            if self._is_inline(child, child_style):
+                inline_nodes.append(child)
+                continue
+            flush()
+            # 列表符号只加在列表项自身的第一段文字前
+            marker = None
+            if child_style.get("display") == "list-item":
+                list_index += 1
+            top_margin = _length(child_style.get("margin-top", "0"), self._font_size(child_style), width) or 0.0
+            child_y = cursor - min(previous_margin, max(top_margin, 0.0))
+            child_box = self._layout_element(child, child_style, x, child_y, width, width, height, abs_list,
+                                             align=align, marker_index=list_index)
+            children.append(child_box)
+            cursor = child_box.y + child_box.h + child_box.margin_bottom
+            previous_margin = child_box.margin_bottom
+        flush()
+        return children, cursor - y
+
+    def _defer_absolute(self, node, style, static_x, static_y, abs_list):
+        """绝对定位元素在其包含块尺寸确定后再布局，这里先占位"""
+        box = _Box(node, style)
+        box.positioned = True
+        box.static_position = (static_x, static_y)
+        if style.get("position") == "fixed":
+            self._fixed.append(box)
+        else:
+            abs_list.append(box)
+        return box
+
+    def _layout_absolute(self, box, containing):
+        node, style = box.element, box.style
+        cb_x, cb_y, cb_w, cb_h = containing
+        font_size = self._font_size(style)
+        left = _length(style.get("left"), font_size, cb_w)
+        right = _length(style.get("right"), font_size, cb_w)
+        top = _length(style.get("top"), font_size, cb_h)
+        bottom = _length(style.get("bottom"), font_size, cb_h)
+        margins = [v or 0.0 for v in self._edges(style, "margin", cb_w)]
+
+        forced_width = None
+        if _length(style.get("width"), font_size, cb_w) is None and node.name != "img":
+            if left is not None and right is not None:
+                forced_width = cb_w - left - right - margins[1] - margins[3]
+            else:
+                available = cb_w - (left or 0.0) - (right or 0.0) - margins[1] - margins[3]
+                forced_width = min(self._max_content_width(node, style) - margins[1] - margins[3], available)
+        forced_height = None
+        if _length(style.get("height"), font_size, cb_h) is None and top is not None and bottom is not None:
+            forced_height = cb_h - top - bottom - margins[0] - margins[2]
+
+        static_x, static_y = box.static_position
+        x = cb_x + left if left is not None else static_x
+        y = cb_y + top if top is not None else static_y
+        laid_out = self._layout_element(node, style, x, y, cb_w, cb_w, cb_h, [],
+                                        forced_width=forced_width, forced_height=forced_height)
+        if left is None and right is not None:
+            laid_out.shift(cb_x + cb_w - right - margins[1] - laid_out.w - laid_out.x, 0)
+        if top is None and bottom is not None:
+            laid_out.shift(0, cb_y + cb_h - bottom - margins[2] - laid_out.h - laid_out.y)
+        box.__dict__.update(laid_out.__dict__)
+        box.positioned = True
+
+    # ------------------------------------------------------------ flex和网格
+
+    def _flex_items(self, node, abs_list, x, y):
+        items = []
+        for child in node.children:
+            if isinstance(child, Comment):
+                continue
+            if isinstance(child, NavigableString) or child.name is None:
+                if str(child).strip():
+                    items.append((child, None))
+                continue
+            child_style = self.styles.computed(child)
+            if child_style.get("display") == "none" or child.name in _UNSUPPORTED_TAGS:
+                continue
+            if child_style.get("position") in ("absolute", "fixed"):
+                abs_box = self._defer_absolute(child, child_style, x, y, abs_list)
+                items.append((None, abs_box))
+                continue
+            items.append((child, child_style))
+        return items
+
+    def _layout_flex_item(self, child, child_style, style, x, y, width, height, cb_width, cb_height,
+                          abs_list, forced_width=None, forced_height=None):
+        if child_style is None:
+            # 匿名文字项
+            runs = self._collect_runs([child], style)
+            return self._layout_text(runs, style, x, y, forced_width if forced_width is not None else width)
+        return self._layout_element(child, child_style, x, y, width, cb_width, cb_height, abs_list,
+                                    forced_width=forced_width, forced_height=forced_height)
+
+    def _layout_flex(self, node, style, x, y, width, height, abs_list):
+        font_size = self._font_size(style)
+        direction = style.get("flex-direction", "row")
+        row = not direction.startswith("column")
+        items = self._flex_items(node, abs_list, x, y)
+        placeholders = [abs_box for child, abs_box in items if child is None]
+        items = [(child, child_style) for child, child_style in items if child is not None]
+        if direction.endswith("reverse"):
+            items.reverse()
+        gap = _length(style.get("column-gap" if row else "row-gap"), font_size, width if row else height) or 0.0
+        justify = style.get("justify-content", "flex-start")
+        align_items = style.get("align-items", "stretch")
+
+        entries = []
+        for child, child_style in items:
+            entry = {"node": child, "style": child_style}
+            if child_style is None:
+                entry.update(margins=[0.0] * 4, grow=0.0, shrink=1.0, align=align_items)
+                runs = self._collect_runs([child], style)
+                entry["basis"] = self._runs_width(runs) + 1 if row else None
+            else:
+                child_font = self._font_size(child_style)
+                entry["margins"] = [v or 0.0 for v in self._edges(child_style, "margin", width)]
+                entry["grow"] = float(child_style.get("flex-grow", "0") or 0)
+                entry["shrink"] = float(child_style.get("flex-shrink", "1") or 0)
+                entry["align"] = child_style.get("align-self", "auto")
+                if entry["align"] == "auto":
+                    entry["align"] = align_items
+                border_box = child_style.get("box-sizing") == "border-box"
+                reference = width if row else height
+                basis = _length(child_style.get("flex-basis", "auto"), child_font, reference)
+                if basis is None:
+                    basis = _length(child_style.get("width" if row else "height"), child_font, reference)
+                    if basis is not None and not border_box and child.name != "img":
+                        padding = self._edges(child_style, "padding", width)
+                        borders = self._border_widths(child_style)
+                        sides = (1, 3) if row else (0, 2)
+                        basis += sum((padding[i] or 0) + borders[i] for i in sides)
+                if basis is None and row:
+                    basis = self._max_content_width(child, child_style) - entry["margins"][1] - entry["margins"][3]
+                entry["basis"] = basis
+            entries.append(entry)
+
+        if row:
+            children, inner = self._flex_row(entries, style, x, y, width, height, gap, justify, abs_list)
+        else:
+            children, inner = self._flex_column(entries, style, x, y, width, height, gap, justify, abs_list)
+        return children + placeholders, inner
+
+    @staticmethod
+    def _justify_offsets(justify, free, count):
+        """主轴起点偏移和项目间额外间距"""
+        if free <= 0 or count == 0:
+            return 0.0, 0.0
+        if justify in ("center",):
+            return free / 2, 0.0
+        if justify in ("flex-end", "end", "right"):
+            return free, 0.0
+        if justify == "space-between":
+            return (0.0, free / (count - 1)) if count > 1 else (0.0, 0.0)
+        if justify == "space-around":
+            return free / count / 2, free / count
+        if justify == "space-evenly":
+            return free / (count + 1), free / (count + 1)
+        return 0.0, 0.0
+
+    def _flex_row(self, entries, style, x, y, width, height, gap, justify, abs_list):
+        sizes = [min(entry["basis"], width) if entry["basis"] is not None else 0.0 for entry in entries]
+        outer = sum(sizes) + sum(e["margins"][1] + e["margins"][3] for e in entries) + gap * max(len(entries) - 1, 0)
+        free = width - outer
+        total_grow = sum(e["grow"] for e in entries)
+        if free > 0 and total_grow > 0:
+            sizes = [size + free * e["grow"] / total_grow for size, e in zip(sizes, entries)]
+            free = 0.0
+        elif free < 0:
+            weights = [e["shrink"] * size for size, e in zip(sizes, entries)]
+            total_weight = sum(weights)
+            if total_weight > 0:
+                sizes = [max(size + free * weight / total_weight, 0.0) for size, weight in zip(sizes, weights)]
+            free = 0.0
+
+        start, spacing = self._justify_offsets(justify, free, len(entries))
+        boxes = []
+        cursor = x + start
+        for entry, size in zip(entries, sizes):
+            margins = entry["margins"]
+            box = self._layout_flex_item(entry["node"], entry["style"], style, cursor, y, size, height,
+                                         width, height, abs_list, forced_width=size)
+            boxes.append(box)
+            cursor += size + margins[1] + margins[3] + gap + spacing
+
+        cross = height if height is not None else max(
+            (box.h + e["margins"][0] + e["margins"][2] for box, e in zip(boxes, entries)), default=0.0)
+        for i, (box, entry, size) in enumerate(zip(boxes, entries, sizes)):
+            margins = entry["margins"]
+            item_style = entry["style"]
+            free_cross = cross - box.h - margins[0] - margins[2]
+            auto_height = item_style is None or _length(item_style.get("height"), self._font_size(item_style), height) is None
+            if entry["align"] in ("stretch", "normal") and auto_height and free_cross > 0.5 and entry["style"] is not None:
+                box = self._layout_flex_item(entry["node"], item_style, style, box.x - margins[3], y, size, height,
+                                             width, height, abs_list, forced_width=size,
+                                             forced_height=cross - margins[0] - margins[2])
+                boxes[i] = box
+            elif entry["align"] in ("center",):
+                box.shift(0, free_cross / 2)
+            elif entry["align"] in ("flex-end", "end"):
+                box.shift(0, free_cross)
+        return boxes, cross
+
+    def _flex_column(self, entries, style, x, y, width, height, gap, justify, abs_list):
+        boxes = []
+        for entry in entries:
+            margins = entry["margins"]
+            available = width - margins[1] - margins[3]
+            item_style = entry["style"]
+            forced_width = None
+            if entry["align"] not in ("stretch", "normal") and item_style is not None and \
+                    _length(item_style.get("width"), self._font_size(item_style), width) is None:
+                forced_width = min(self._max_content_width(entry["node"], item_style) - margins[1] - margins[3],
+                                   available)
+            if entry["node"] is not None and getattr(entry["node"], "name", None) == "img":
+                forced_width = None
+            # 高度不确定时flex-basis为0的项目按内容高度排列
+            forced_height = entry["basis"] if entry["basis"] and item_style is not None else None
+            box = self._layout_flex_item(entry["node"], item_style, style, x, y, width, height, width, height,
+                                         abs_list, forced_width=forced_width, forced_height=forced_height)
+            boxes.append(box)
+
+        outer = sum(box.h + e["margins"][0] + e["margins"][2] for box, e in zip(boxes, entries)) + \
+            gap * max(len(entries) - 1, 0)
+        free = height - outer if height is not None else 0.0
+        total_grow = sum(e["grow"] for e in entries)
+        if free > 0 and total_grow > 0:
+            for i, (box, entry) in enumerate(zip(boxes, entries)):
+                if entry["grow"] and entry["style"] is not None:
+                    boxes[i] = self._layout_flex_item(entry["node"], entry["style"], style, x, y, width, height,
+                                                      width, height, abs_list, forced_width=box.w if box.w < width else None,
+                                                      forced_height=box.h + free * entry["grow"] / total_grow)
+            free = 0.0
+
+        start, spacing = self._justify_offsets(justify, free, len(entries))
+        cursor = y + start
+        for box, entry in zip(boxes, entries):
+            margins = entry["margins"]
+            target_x = x + margins[3]
+            free_cross = width - box.w - margins[1] - margins[3]
+            if box.kind == "text" and entry["align"] not in ("stretch", "normal"):
+                box.w = min(self._runs_width(box.runs) + 1, width)
+                free_cross = width - box.w
+            if entry["align"] == "center":
+                target_x += free_cross / 2
+            elif entry["align"] in ("flex-end", "end"):
+                target_x += free_cross
+            box.shift(target_x - box.x, cursor + margins[0] - box.y)
+            cursor += box.h + margins[0] + margins[2] + gap + spacing
+        inner = height if height is not None else outer
+        return boxes, inner
+
+    def _grid_tracks(self, value, width, gap, font_size):
+        """解析grid-template-columns，返回各列宽度"""
+        if not value or value == "none":
+            return None
+        expanded = re.sub(r'repeat\(\s*(\d+)\s*,\s*([^)]*(?:\([^)]*\))?[^)]*)\)',
+                          lambda m: ' '.join([m.group(2).strip()] * int(m.group(1))), value)
+        tracks = []
+        for token in _split_values(expanded):
+            if token.startswith("minmax("):
+                token = _split_top_level(token[7:-1], ',')[-1].strip()
+            if token.endswith("fr"):
+                tracks.append(("fr", float(token[:-2] or 1)))
+            elif token in ("auto", "min-content", "max-content"):
+                tracks.append(("fr", 1.0))
+            else:
+                tracks.append(("px", _length(token, font_size, width) or 0.0))
+        if not tracks:
+            return None
+        fixed = sum(size for kind, size in tracks if kind == "px")
+        fractions = sum(size for kind, size in tracks if kind == "fr")
+        remaining = max(width - fixed - gap * (len(tracks) - 1), 0.0)
+        return [size if kind == "px" else remaining * size / fractions for kind, size in tracks]
+
+    def _layout_grid(self, node, style, x, y, width, height, abs_list):
+        font_size = self._font_size(style)
+        column_gap = _length(style.get("column-gap"), font_size, width) or 0.0
+        row_gap = _length(style.get("row-gap"), font_size, height) or 0.0
+        columns = self._grid_tracks(style.get("grid-template-columns"), width, column_gap, font_size)
+        if not columns:
+            return self._layout_flow(node, style, x, y, width, height, abs_list)
+
+        items = self._flex_items(node, abs_list, x, y)
+        placeholders = [abs_box for child, abs_box in items if child is None]
+        items = [(child, child_style) for child, child_style in items if child is not None]
+        rows = [items[i:i + len(columns)] for i in range(0, len(items), len(columns))]
+
+        boxes = []
+        row_boxes = []
+        for row in rows:
+            laid_out = []
+            cursor = x
+            for (child, child_style), column_width in zip(row, columns):
+                box = self._layout_flex_item(child, child_style, style, cursor, y, column_width, None,
+                                             column_width, None, abs_list, forced_width=column_width)
+                laid_out.append((box, child, child_style, cursor, column_width))
+                cursor += column_width + column_gap
+            row_boxes.append(laid_out)
+
+        row_heights = [max((box.h for box, *_ in row), default=0.0) for row in row_boxes]
+        if height is not None and row_heights:
+            extra = height - sum(row_heights) - row_gap * (len(row_heights) - 1)
+            if extra > 0:
+                row_heights = [h + extra / len(row_heights) for h in row_heights]
+
+        cursor_y = y
+        for row, row_height in zip(row_boxes, row_heights):
+            for box, child, child_style, cell_x, column_width in row:
+                if child_style is not None and box.h < row_height - 0.5 and child.name != "img" and \
+                        _length(child_style.get("height"), self._font_size(child_style), row_height) is None:
+                    box = self._layout_flex_item(child, child_style, style, cell_x, cursor_y, column_width,
+                                                 row_height, column_width, row_height, abs_list,
+                                                 forced_width=column_width, forced_height=row_height)
+                else:
+                    box.shift(0, cursor_y - y)
+                boxes.append(box)
+            cursor_y += row_height + row_gap
+        inner = height if height is not None else max(cursor_y - row_gap - y, 0.0)
+        return boxes + placeholders, inner
+
+    # ------------------------------------------------------------ 表格和图片
+
+    def _layout_table(self, node, style, x, y, avail_width, cb_width, forced_width=None):
+        font_size = self._font_size(style)
+        box = _Box(node, style, "table")
+        raw_margins = self._edges(style, "margin", cb_width)
+        margins = [v or 0.0 for v in raw_margins]
+        box.margin_top, box.margin_bottom = margins[0], margins[2]
+
+        rows = []
+        for tr in node.find_all('tr'):
+            if tr.find_parent('table') is not node:
+                continue
+            tr_style = self.styles.computed(tr)
+            cells = []
+            for cell in tr.find_all(['td', 'th'], recursive=False):
+                cell_style = self.styles.computed(cell)
+                fill = cell_style.get("background-color", "transparent")
+                if parse_css_color(fill) is None:
+                    fill = tr_style.get("background-color", "transparent")
+                runs = self._collect_runs(list(cell.children), cell_style)
+                text = '\n'.join(''.join(run["text"] for run in line) for line in runs or [])
+                cells.append({"text": text, "header": cell.name == "th", "font": self._font(cell_style),
+                              "fill": fill if parse_css_color(fill) is not None else None,
+                              "style": cell_style, "runs": runs})
+            if cells:
+                rows.append(cells)
+
+        columns = max((len(row) for row in rows), default=1)
+        specified = _length(style.get("width"), font_size, cb_width)
+        if forced_width is not None:
+            width = forced_width
+        elif specified is not None:
+            width = specified
+        else:
+            natural = [0.0] * columns
+            for row in rows:
+                for i, cell in enumerate(row):
+                    padding = sum(v or 0 for v in self._edges(cell["style"], "padding", None)[1::2])
+                    natural[i] = max(natural[i], self._runs_width(cell["runs"] or []) + padding + 2)
+            width = min(sum(natural), avail_width - margins[1] - margins[3])
+
+        column_width = width / columns
+        height = 0.0
+        for row in rows:
+            row_height = 0.0
+            for cell in row:
+                cell_style = cell.pop("style")
+                runs = cell.pop("runs")
+                padding = self._edges(cell_style, "padding", None)
+                borders = self._border_widths(cell_style)
+                inner_width = column_width - (padding[1] or 0) - (padding[3] or 0) - borders[1] - borders[3]
+                lines = sum(_count_lines(line, inner_width) for line in runs) if runs else 1
+                row_height = max(row_height, lines * self._line_height(cell_style) + (padding[0] or 0) +
+                                 (padding[2] or 0) + borders[0] + borders[2])
+            height += row_height
+
+        box.rows = rows
+        box.x, box.y, box.w, box.h = x + margins[3], y + margins[0], width, height
+        if specified is not None and raw_margins[1] is None and raw_margins[3] is None:
+            box.shift((avail_width - width) / 2, 0)
+        return box
+
+    def load_image(self, src):
+        """
+        读取图片数据和原始尺寸（按地址缓存）
+
+        Returns:
+            (图片数据, (宽, 高))，无法读取或PPT无法嵌入时为(None, None)
+        """
+        if not src or '{{' in src or '{%' in src:
+            return None, None
+        if src in self.images:
+            return self.images[src]
+
+        data = None
+        if src.startswith(('data:', 'http://', 'https://', 'file:')):
+            data = fetch_image(src)
+        else:
+            path = src.split('?')[0]
+            if not os.path.isabs(path) and self.base_dir:
+                path = os.path.join(self.base_dir, path)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                logger.debug(f"无法读取图片: {src}")
+
+        result = (None, None)
+        if data:
+            try:
+                with Image.open(BytesIO(data)) as image:
+                    if image.format in ("PNG", "JPEG", "GIF", "BMP", "TIFF"):
+                        result = (data, image.size)
+            except Exception:
+                logger.debug(f"无法识别的图片格式: {src[:80]}")
+        self.images[src] = result
+        return result
+
+    def _layout_image(self, node, style, x, y, avail_width, cb_width, cb_height, forced_width=None, forced_height=None):
+        font_size = self._font_size(style)
+        box = _Box(node, style, "image")
+        box.data, box.natural = self.load_image(node.get('src', ''))
+        natural_w, natural_h = box.natural or (300.0, 150.0)
+        margins = [v or 0.0 for v in self._edges(style, "margin", cb_width)]
+        box.margin_top, box.margin_bottom = margins[0], margins[2]
+        box.margin_left, box.margin_right = margins[3], margins[1]
+
+        def attribute(name):
+            value = node.get(name)
+            return float(value) if value and re.match(r'^\d+(\.\d+)?$', value) else None
+
+        width = forced_width if forced_width is not None else _length(style.get("width"), font_size, cb_width)
+        height = forced_height if forced_height is not None else _length(style.get("height"), font_size, cb_height)
+        width = width if width is not None else attribute("width")
+        height = height if height is not None else attribute("height")
+        derived_w, derived_h = width is None, height is None
+        if width is None and height is None:
+            width, height = natural_w, natural_h
+        elif width is None:
+            width = height * natural_w / natural_h
+        elif height is None:
+            height = width * natural_h / natural_w
+
+        max_w = _length(style.get("max-width"), font_size, cb_width)
+        max_h = _length(style.get("max-height"), font_size, cb_height)
+        if max_w is not None and width > max_w:
+            if derived_h:
+                height *= max_w / width
+            width = max_w
+        if max_h is not None and height > max_h:
+            if derived_w:
+                width *= max_h / height
+            height = max_h
+
+        box.x, box.y, box.w, box.h = x + margins[3], y + margins[0], width, height
+        return box
+
+    # ------------------------------------------------------------ 绘制
+
+    def layout(self):
+        """
+        计算整张幻灯片的布局
+
+        Returns:
+            与native_converter.collect_slide_layout相同格式的布局字典
+        """
+        html = self.soup.find('html')
+        html_style = self.styles.computed(html)
+        self._fixed = []
+        root_abs = []
+        root = self._layout_element(html, html_style, 0, 0, VIEWPORT_WIDTH, VIEWPORT_WIDTH, VIEWPORT_HEIGHT,
+                                    root_abs, forced_height=VIEWPORT_HEIGHT)
+        viewport = (0.0, 0.0, float(VIEWPORT_WIDTH), float(VIEWPORT_HEIGHT))
+        for abs_box in root_abs + self._fixed:
+            self._layout_absolute(abs_box, viewport)
+
+        items = []
+        # 根元素（或body）的背景铺满整个画布
+        canvas = html
+        body = self.soup.find('body')
+        if not self._has_background(html_style) and body is not None:
+            canvas = body
+        canvas_box = _Box(canvas, self.styles.computed(canvas))
+        canvas_box.w, canvas_box.h = float(VIEWPORT_WIDTH), float(VIEWPORT_HEIGHT)
+        self._paint_background(canvas_box, items, with_borders=False)
+        self._paint_context(root, items, skip_background={id(canvas)})
+        return {"width": VIEWPORT_WIDTH, "height": VIEWPORT_HEIGHT, "items": items}
+
+    @staticmethod
+    def _has_background(style):
+        return parse_css_color(style.get("background-color")) is not None or \
+            style.get("background-image", "none") != "none"
+
+    def _paint_context(self, box, items, skip_background=(), clip=None):
+        """绘制一个层叠上下文：先绘制普通流内容，再按z-index绘制定位元素"""
+        positioned = []
+        self._paint_box(box, items, positioned, skip_background, clip)
+        positioned.sort(key=lambda entry: int(entry[0].style.get("z-index", "0")) if
+                        entry[0].style.get("z-index", "auto").lstrip('-').isdigit() else 0)
+        for child, child_clip in positioned:
+            self._paint_context(child, items, skip_background, child_clip)
+
+    def _paint_box(self, box, items, positioned, skip_background=(), clip=None):
+        style = box.style
+        if style.get("opacity", "1") not in ("1", "") and _length(style.get("opacity"), 1) == 0:
+            return
+        if box.x >= VIEWPORT_WIDTH or box.y >= VIEWPORT_HEIGHT:
+            return
+        visible = style.get("visibility", "visible") != "hidden"
+
+        if box.kind == "text":
+            if visible and box.runs:
+                text = '\n'.join(''.join(run["text"] for run in line) for line in box.runs)
+                rect = self._rect(box)
+                if clip is not None:
+                    # overflow:hidden的容器裁掉溢出的文字
+                    rect["h"] = max(min(rect["y"] + rect["h"], clip) - rect["y"], 1.0)
+                items.append({"type": "text", "text": text, "marker": box.marker, "runs": box.runs,
+                              "font": self._font(style), "box": rect})
+            return
+        if box.kind == "image":
+            if visible and box.data:
+                items.append({"type": "image", "data": box.data, "natural": list(box.natural),
+                              "fit": style.get("object-fit", "fill"), "box": self._rect(box)})
+            return
+
+        if visible and id(box.element) not in skip_background:
+            self._paint_background(box, items)
+        if box.kind == "table":
+            if visible and box.rows:
+                items.append({"type": "table", "rows": box.rows, "font": self._font(style), "box": self._rect(box)})
+            return
+
+        if style.get("overflow") in ("hidden", "clip"):
+            clip = min(clip, box.y + box.h) if clip is not None else box.y + box.h
+        for child in box.children:
+            if child.positioned or (child.kind != "text" and child.style.get("position") == "relative"):
+                positioned.append((child, clip))
+                continue
+            self._paint_box(child, items, positioned, skip_background, clip)
+
+    @staticmethod
+    def _rect(box):
+        return {"x": box.x, "y": box.y, "w": max(box.w, 1.0), "h": max(box.h, 1.0)}
+
+    def _paint_background(self, box, items, with_borders=True):
+        """背景色、渐变、背景图片和边框"""
+        style = box.style
+        image = style.get("background-image", "none")
+        gradient = _parse_gradient(image) if "gradient(" in image else None
+        fill = style.get("background-color", "transparent")
+        if gradient and "radial" in image.split('(')[0]:
+            # 径向渐变退化为首个色标的纯色
+            fill, gradient = gradient["stops"][0][0], None
+
+        borders = box.borders if with_borders else (0.0, 0.0, 0.0, 0.0)
+        colors = [style.get(f"border-{side}-color", "currentcolor") for side in _SIDES]
+        colors = [style.get("color") if color.lower() == "currentcolor" else color for color in colors]
+        uniform = len(set(borders)) == 1 and len(set(colors)) == 1 and borders[0] > 0
+        radius = style.get("border-radius", "0")
+        if not radius.endswith('%'):
+            radius = f"{_length(radius, self._font_size(style), box.w) or 0}px"
+
+        if gradient or parse_css_color(fill) is not None or uniform:
+            items.append({"type": "rect", "box": self._rect(box), "fill": fill, "gradient": gradient,
+                          "border": {"width": borders[0], "color": colors[0]} if uniform else None,
+                          "radius": radius})
+
+        url = _URL_PATTERN.search(image) if image.startswith("url(") else None
+        if url:
+            data, natural = self.load_image(url.group(1))
+            if data:
+                size = style.get("background-size", "auto")
+                fit = "contain" if size == "contain" else "fill" if size == "100% 100%" else "cover"
+                items.append({"type": "image", "data": data, "natural": list(natural), "fit": fit,
+                              "box": self._rect(box)})
+
+        if not uniform:
+            # 单边边框绘制为细长矩形
+            top, right, bottom, left = borders
+            edges = (
+                (box.x, box.y, box.w, top, colors[0]),
+                (box.x + box.w - right, box.y, right, box.h, colors[1]),
+                (box.x, box.y + box.h - bottom, box.w, bottom, colors[2]),
+                (box.x, box.y, left, box.h, colors[3]),
+            )
+            for edge_x, edge_y, edge_w, edge_h, color in edges:
+                if edge_w > 0 and edge_h > 0 and parse_css_color(color) is not None:
+                    items.append({"type": "rect", "box": {"x": edge_x, "y": edge_y, "w": edge_w, "h": edge_h},
+                                  "fill": color, "border": None, "radius": "0px"})
+
+
+def convert_html_to_layout_ppt(html_contents, output_path, base_dir=None):
+    """
+    不使用浏览器，按Python计算的布局将HTML幻灯片转换为原生形状PPT
+
+    Args:
+        html_contents: HTML内容字符串列表
+        output_path: 输出的PPT文件路径
+        base_dir: HTML中相对路径资源所在的目录
+
+    Returns:
+        生成的PPT文件路径，失败时返回None
+    """
+    if not html_contents:
+        logger.error("没有HTML内容")
+        return None
+
+    start_time = time.time()
+    prs = Presentation()
+    prs.slide_width = SLIDE_WIDTH
+    prs.slide_height = SLIDE_HEIGHT
+    builder = NativeSlideBuilder(prs, VIEWPORT_WIDTH, VIEWPORT_HEIGHT)
+    image_cache = {}
+
+    for i, html_content in enumerate(html_contents):
+        try:
+            layout = HTMLLayoutEngine(html_content, base_dir, image_cache).layout()
+        except Exception as e:
+            logger.warning(f"第{i+1}张幻灯片布局计算失败，生成空白页: {str(e)}")
+            layout = {"items": []}
+        builder.add_slide(layout)
+
+    try:
+        prs.save(output_path)
+    except Exception as e:
+        logger.error(f"保存PPT失败: {str(e)}")
+        return None
+
+    logger.info(f"无浏览器布局PPT生成成功: {output_path}, {len(html_contents)}张幻灯片, "
+                f"原生形状 {builder.native_shapes} 个, 耗时 {time.time() - start_time:.2f}秒")
+    return output_path
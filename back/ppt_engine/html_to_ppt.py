@@ -16,6 +16,10 @@ from io import BytesIO
 from PIL import Image
 from pptx import Presentation
 from pptx.util import Inches, Pt
+from .browser_pool import BrowserUnavailableError
+from .rasterizer import capture_pages, rasterize_html, RENDER_PARALLELISM, RENDER_BATCH_MODE
+from .native_converter import convert_html_to_native_ppt
+from .html_layout import convert_html_to_layout_ppt
 
 # 尝试导入Selenium
 try:
@@ -36,18 +40,81 @@ except ImportError:
 # 获取模块日志记录器
 logger = logging.getLogger("ppt_engine.html_to_ppt")
 
+# 输出模式：image（整页截图，默认）、native（原生形状，可编辑）或layout（不使用浏览器，在Python中计算布局）
+PPT_OUTPUT_MODE = os.environ.get('PPT_OUTPUT_MODE', 'image')
+
+# 幻灯片图片编码配置
+SLIDE_IMAGE_FORMAT = os.environ.get('SLIDE_IMAGE_FORMAT', 'original')  # original（原样嵌入）或jpeg
+SLIDE_IMAGE_QUALITY = int(os.environ.get('SLIDE_IMAGE_QUALITY', '85'))  # JPEG质量
+SLIDE_IMAGE_MAX_WIDTH = int(os.environ.get('SLIDE_IMAGE_MAX_WIDTH', '0'))  # 超过该宽度时缩小，0表示不缩放
+
+# python-pptx可以直接嵌入的图片格式
+_EMBEDDABLE_FORMATS = {"PNG", "JPEG", "GIF", "BMP", "TIFF"}
+
+def encode_slide_image(image_data, image_format=SLIDE_IMAGE_FORMAT, quality=SLIDE_IMAGE_QUALITY,
+                       max_width=SLIDE_IMAGE_MAX_WIDTH):
+    """
+    准备嵌入幻灯片的图片数据
+
+    不需要转换时直接使用原始字节（只读取图片头获取尺寸，不解码像素）；
+    配置了JPEG或缩放时才解码并重新编码。
+
+    Args:
+        image_data: 图片二进制数据
+        image_format: original或jpeg
+        quality: JPEG质量
+        max_width: 最大宽度，0表示不缩放
+
+    Returns:
+        (图片数据流, 宽度, 高度)
+    """
+    image = Image.open(BytesIO(image_data))
+    needs_resize = max_width and image.width > max_width
+    needs_jpeg = image_format == "jpeg" and image.format != "JPEG"
+
+    if not needs_resize and not needs_jpeg and image.format in _EMBEDDABLE_FORMATS:
+        return BytesIO(image_data), image.width, image.height
+
+    if needs_resize:
+        height = round(image.height * max_width / image.width)
+        image = image.resize((max_width, height), Image.LANCZOS)
+
+    output = BytesIO()
+    if image_format == "jpeg":
+        image.convert("RGB").save(output, format="JPEG", quality=quality, optimize=True)
+    else:
+        image.save(output, format="PNG")
+    output.seek(0)
+    return output, image.width, image.height
+
 class HTMLToPPTConverter:
     """HTML到PPT转换器"""
     
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, use_pool=True, parallelism=RENDER_PARALLELISM, batch_mode=RENDER_BATCH_MODE,
+                 image_format=SLIDE_IMAGE_FORMAT, image_quality=SLIDE_IMAGE_QUALITY,
+                 image_max_width=SLIDE_IMAGE_MAX_WIDTH):
         """
         初始化转换器
         
         Args:
             headless: 是否使用无头模式
+            use_pool: 是否使用共享的浏览器池（仅无头模式），否则启动独立的浏览器
+            parallelism: 使用浏览器池时并行截图的最大会话数
+            batch_mode: 转换HTML内容时是否合并为批量文档，一次加载后逐个截取幻灯片元素
+            image_format: 截图嵌入方式，original直接嵌入原始PNG，jpeg压缩为JPEG
+            image_quality: JPEG质量
+            image_max_width: 截图最大宽度，超过时缩小，0表示不缩放
         """
         self.browser = None
         self.headless = headless
+        self.use_pool = use_pool and headless
+        self.parallelism = parallelism
+        self.batch_mode = batch_mode
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.image_max_width = image_max_width
+        # 最近一次转换中每张幻灯片的耗时（加载、等待就绪、截图）
+        self.render_timings = []
         
         # 检查环境
         if not HAS_SELENIUM:
@@ -56,8 +123,9 @@ class HTMLToPPTConverter:
         if not HAS_WEBDRIVER_MANAGER:
             logger.warning("缺少webdriver_manager库，推荐安装: pip install webdriver-manager")
             
-        # 初始化浏览器
-        self._init_browser()
+        # 使用浏览器池时按需借出，不在此处启动浏览器
+        if not self.use_pool:
+            self._init_browser()
     
     def _init_browser(self):
         """初始化浏览器"""
@@ -106,54 +174,86 @@ class HTMLToPPTConverter:
             logger.error("没有有效的HTML文件")
             return None
             
-        # 检查浏览器是否可用
-        if not self.browser:
-            logger.error("浏览器不可用，无法进行转换")
-            return None
-            
         try:
-            # 创建演示文稿
-            prs = Presentation()
-            
-            # 调整幻灯片大小为16:9
-            prs.slide_width = Inches(10)
-            prs.slide_height = Inches(5.625)
+            # 截图（使用浏览器池时多个会话并行），结果与文件顺序一致
+            file_urls = [f"file:///{os.path.abspath(html_file)}" for html_file in valid_files]
+            screenshots, self.render_timings = capture_pages(
+                file_urls, self.parallelism, browser=self._own_browser())
             
-            # 逐个处理HTML文件
-            for html_file in valid_files:
-                logger.info(f"处理HTML文件: {html_file}")
-                
-                # 打开HTML文件
-                file_url = f"file:///{os.path.abspath(html_file)}"
-                self.browser.get(file_url)
-                
-                # 等待页面加载
-                time.sleep(0.5)
-                
-                # 截图
-                screenshot = self.browser.get_screenshot_as_png()
-                
-                # 添加到PPT
-                self._add_image_to_presentation(prs, screenshot)
-                
-            # 保存PPT
-            prs.save(output_path)
-            logger.info(f"PPT生成成功: {output_path}")
-            
-            return output_path
+            return self._save_presentation(screenshots, output_path)
+        except BrowserUnavailableError as e:
+            logger.error(f"浏览器不可用，无法进行转换: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"转换HTML文件失败: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             return None
     
-    def convert_html_contents_to_ppt(self, html_contents, output_path):
+    def _own_browser(self):
+        """
+        独立启动的浏览器；使用浏览器池时返回None
+
+        Raises:
+            BrowserUnavailableError: 未使用浏览器池且浏览器未能启动
+        """
+        if self.use_pool:
+            return None
+        if not self.browser:
+            raise BrowserUnavailableError("浏览器未初始化")
+        return self.browser
+    
+    def _save_presentation(self, screenshots, output_path):
+        """
+        按顺序将截图添加为幻灯片并保存
+        
+        Args:
+            screenshots: 截图数据列表
+            output_path: 输出的PPT文件路径
+            
+        Returns:
+            生成的PPT文件路径
+        """
+        # 创建演示文稿
+        prs = Presentation()
+        
+        # 调整幻灯片大小为16:9
+        prs.slide_width = Inches(10)
+        prs.slide_height = Inches(5.625)
+        
+        for screenshot in screenshots:
+            self._add_image_to_presentation(prs, screenshot)
+        
+        self._log_render_timings()
+        
+        # 保存PPT
+        prs.save(output_path)
+        logger.info(f"PPT生成成功: {output_path}")
+        
+        return output_path
+    
+    def _log_render_timings(self):
+        """汇总输出各幻灯片的渲染耗时"""
+        if not self.render_timings:
+            return
+        total_load = sum(t["load"] for t in self.render_timings)
+        total_wait = sum(t["wait"] for t in self.render_timings)
+        total_capture = sum(t["capture"] for t in self.render_timings)
+        slowest = max(self.render_timings, key=lambda t: t["wait"])
+        logger.info(f"{len(self.render_timings)}张幻灯片渲染耗时: 加载 {total_load:.2f}秒, "
+                    f"等待就绪 {total_wait:.2f}秒, 截图 {total_capture:.2f}秒; "
+                    f"等待最久的是第{slowest['slide']}张 ({slowest['wait']:.2f}秒, {slowest['state']})")
+    
+    def convert_html_contents_to_ppt(self, html_contents, output_path, base_dir=None):
         """
         将HTML内容列表转换为PPT
         
+        HTML默认通过本地HTTP服务从内存交给浏览器，不写临时文件（见RENDER_DELIVERY）。
+        
         Args:
             html_contents: HTML内容字符串列表
             output_path: 输出的PPT文件路径
+            base_dir: HTML中相对路径资源（样式表、图片）所在的目录，通常为HTML模板目录
             
         Returns:
             生成的PPT文件路径
@@ -164,91 +264,22 @@ class HTMLToPPTConverter:
         if not html_contents:
             logger.error("没有HTML内容")
             return None
-            
-        # 检查浏览器是否可用
-        if not self.browser:
-            logger.error("浏览器不可用，无法进行转换")
-            return None
         
         try:
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp(prefix="html_to_ppt_")
+            screenshots, self.render_timings = rasterize_html(
+                html_contents, self.parallelism, browser=self._own_browser(),
+                batch_mode=self.batch_mode, base_dir=base_dir)
             
-            # 保存HTML内容到临时文件
-            html_files = []
-            for i, html in enumerate(html_contents):
-                file_path = os.path.join(temp_dir, f"slide_{i+1}.html")
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    # 处理资源路径
-                    html = self._fix_resource_paths(html, temp_dir)
-                    f.write(html)
-                html_files.append(file_path)
-                
-            # 转换HTML文件
-            result = self.convert_html_files_to_ppt(html_files, output_path)
-            
-            # 清理临时目录
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return result
+            return self._save_presentation(screenshots, output_path)
+        except BrowserUnavailableError as e:
+            logger.error(f"浏览器不可用，无法进行转换: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"转换HTML内容失败: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             return None
     
-    def _fix_resource_paths(self, html, base_dir):
-        """
-        修复HTML中的资源路径，确保可以正确加载样式表和图片
-        
-        Args:
-            html: HTML内容
-            base_dir: 基础目录
-            
-        Returns:
-            修复后的HTML内容
-        """
-        # 修复CSS路径
-        def replace_css_link(match):
-            css_file = match.group(1)
-            # 如果是相对路径且不是http开头，检查文件是否存在
-            if not css_file.startswith(('http://', 'https://', '/')):
-                css_path = os.path.join(os.path.dirname(base_dir), css_file)
-                if os.path.exists(css_path):
-                    # 复制到临时目录
-                    dest_path = os.path.join(base_dir, os.path.basename(css_file))
-                    shutil.copy2(css_path, dest_path)
-                    return f'<link rel="stylesheet" href="{os.path.basename(css_file)}">'
-            return match.group(0)
-            
-        html = re.sub(r'<link rel="stylesheet" href="([^"]+)"', replace_css_link, html)
-        
-        # 修复内联样式
-        html = re.sub(r'@import url\([\'"]?([^\'"]+)[\'"]?\);', lambda m: '@import url("' + m.group(1) + '");', html)
-        
-        # 修复图片路径
-        def replace_image_src(match):
-            img_src = match.group(1)
-            # 处理数据URL和绝对URL
-            if img_src.startswith(('data:', 'http://', 'https://', '/')):
-                return match.group(0)
-                
-            # 尝试将相对路径复制到临时目录
-            img_path = os.path.join(os.path.dirname(base_dir), img_src)
-            if os.path.exists(img_path):
-                dest_path = os.path.join(base_dir, os.path.basename(img_src))
-                shutil.copy2(img_path, dest_path)
-                return f'<img src="{os.path.basename(img_src)}"'
-                
-            return match.group(0)
-            
-        html = re.sub(r'<img src="([^"]+)"', replace_image_src, html)
-        
-        return html
-    
     def _add_image_to_presentation(self, presentation, image_data):
         """
         将图像添加到演示文稿
@@ -268,10 +299,12 @@ class HTMLToPPTConverter:
             width = presentation.slide_width
             height = presentation.slide_height
             
-            # 处理不同类型的图像数据
+            # 处理不同类型的图像数据，尽量取得原始字节以便直接嵌入
+            raw_data = None
+            image = None
             if isinstance(image_data, bytes):
                 # 如果是图像数据
-                image = Image.open(BytesIO(image_data))
+                raw_data = image_data
                 logger.info("使用二进制图像数据")
             elif isinstance(image_data, str):
                 if image_data.startswith('file://'):
@@ -295,17 +328,16 @@ class HTMLToPPTConverter:
                             # 创建空白图像
                             image = Image.new('RGB', (800, 600), color=(255, 255, 255))
                             logger.info("创建空白图像替代")
-                    else:
-                        image = Image.open(file_path)
+                    if image is None:
+                        with open(file_path, 'rb') as f:
+                            raw_data = f.read()
                 elif image_data.startswith('data:image/'):
                     # 处理data URL
                     logger.info("从数据URL加载图像")
-                    import base64
                     try:
                         # 提取base64部分
                         base64_data = image_data.split(',')[1]
-                        image_bytes = base64.b64decode(base64_data)
-                        image = Image.open(BytesIO(image_bytes))
+                        raw_data = base64.b64decode(base64_data)
                     except Exception as e:
                         logger.error(f"处理数据URL失败: {str(e)}")
                         # 创建空白图像
@@ -313,7 +345,8 @@ class HTMLToPPTConverter:
                 elif os.path.exists(image_data):
                     # 处理直接的文件路径
                     logger.info(f"从文件路径加载图像: {image_data}")
-                    image = Image.open(image_data)
+                    with open(image_data, 'rb') as f:
+                        raw_data = f.read()
                 else:
                     logger.warning(f"无法识别的图像数据: {image_data[:30]}...")
                     # 创建一个空白图像作为占位符
@@ -323,8 +356,18 @@ class HTMLToPPTConverter:
                 # 创建一个空白图像
                 image = Image.new('RGB', (800, 600), color=(255, 255, 255))
             
+            if raw_data is not None:
+                image_stream, image_width, image_height = encode_slide_image(
+                    raw_data, self.image_format, self.image_quality, self.image_max_width)
+            else:
+                # 占位图像
+                image_stream = BytesIO()
+                image.save(image_stream, format='PNG')
+                image_stream.seek(0)
+                image_width, image_height = image.width, image.height
+            
             # 调整图像比例
-            img_ratio = image.width / image.height
+            img_ratio = image_width / image_height
             slide_ratio = width / height
             
             # 计算合适的图像尺寸和位置
@@ -341,13 +384,8 @@ class HTMLToPPTConverter:
                 top = height * 0.1
                 left = (width - img_width) / 2
             
-            # 保存为临时文件
-            temp_img = BytesIO()
-            image.save(temp_img, format='PNG')
-            temp_img.seek(0)
-            
             # 添加图像到幻灯片，使用计算的位置和尺寸
-            slide.shapes.add_picture(temp_img, left, top, width=img_width, height=img_height)
+            slide.shapes.add_picture(image_stream, left, top, width=img_width, height=img_height)
             
             logger.info("成功添加图片到幻灯片")
             
@@ -365,7 +403,7 @@ class HTMLToPPTConverter:
                 return None
     
     def close(self):
-        """关闭浏览器"""
+        """关闭独立启动的浏览器（浏览器池中的会话不受影响）"""
         if self.browser:
             try:
                 self.browser.quit()
@@ -374,22 +412,38 @@ class HTMLToPPTConverter:
                 pass
             self.browser = None
 
-def convert_html_to_ppt(html_contents, output_path):
+def convert_html_to_ppt(html_contents, output_path, base_dir=None):
     """
     便捷函数：将HTML内容转换为PPT
     
     Args:
         html_contents: HTML内容字符串列表
         output_path: 输出的PPT文件路径
+        base_dir: HTML中相对路径资源所在的目录
         
     Returns:
         生成的PPT文件路径
     """
+    if PPT_OUTPUT_MODE == 'layout':
+        return convert_html_to_layout_ppt(html_contents, output_path, base_dir)
+
+    if PPT_OUTPUT_MODE == 'native':
+        result = convert_html_to_native_ppt(html_contents, output_path, base_dir)
+        if result:
+            return result
+        logger.warning("原生形状转换失败，回退到截图转换")
+
     converter = HTMLToPPTConverter()
     try:
-        return converter.convert_html_contents_to_ppt(html_contents, output_path)
+        result = converter.convert_html_contents_to_ppt(html_contents, output_path, base_dir)
     finally:
         converter.close()
+    if result:
+        return result
+
+    # 没有可用的浏览器时在Python中计算布局
+    logger.warning("截图转换失败，使用无浏览器布局引擎")
+    return convert_html_to_layout_ppt(html_contents, output_path, base_dir)
 
 def convert_html_files_to_ppt(html_files, output_path):
     """
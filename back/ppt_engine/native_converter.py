@@ -0,0 +1,505 @@
+#!/usr/bin/env python
+"""
+原生形状HTML到PPT转换器
+在浏览器中读取填充后幻灯片DOM的布局和计算样式，生成可编辑的PPT文本框、形状、表格和图片；
+只有无法用原生形状表达的元素（渐变/背景图、SVG、Canvas、变形元素等）才截图嵌入。
+"""
+
+import re
+import time
+import base64
+import logging
+import urllib.request
+from io import BytesIO
+from pptx import Presentation
+from pptx.util import Inches, Pt, Emu
+from pptx.dml.color import RGBColor
+from pptx.enum.shapes import MSO_SHAPE
+from pptx.enum.text import PP_ALIGN, MSO_ANCHOR, MSO_AUTO_SIZE
+from .browser_pool import BrowserUnavailableError
+from .rasterizer import visit_slides, RENDER_PARALLELISM
+
+# 优先使用共享的HTTP连接池下载远程图片
+try:
+    import http_client
+except ImportError:
+    import requests as http_client
+
+# 获取模块日志记录器
+logger = logging.getLogger("ppt_engine.native_converter")
+
+# 幻灯片尺寸（16:9）
+SLIDE_WIDTH = Inches(10)
+SLIDE_HEIGHT = Inches(5.625)
+
+# 截图嵌入的元素在截图期间隐藏其内容，只保留自身的背景和边框
+_HIDE_ATTRIBUTE = "data-pptx-hide"
+_RASTER_ATTRIBUTE = "data-pptx-raster"
+
+# 遍历幻灯片DOM，按绘制顺序收集背景、文本、图片、表格和需要截图的元素
+_COLLECT_SCRIPT = """
+var root = arguments[0];
+var rootRect = root.getBoundingClientRect();
+var items = [];
+var rasterCount = 0;
+var RASTER_TAGS = {SVG: 1, CANVAS: 1, VIDEO: 1, IFRAME: 1, OBJECT: 1, EMBED: 1};
+var TRANSPARENT = /rgba\\(.*,\\s*0\\)$|^transparent$/;
+
+if (!document.getElementById('pptx-native-style')) {
+    var style = document.createElement('style');
+    style.id = 'pptx-native-style';
+    style.textContent = '[HIDE] { color: transparent !important; } [HIDE] * { visibility: hidden !important; }';
+    document.head.appendChild(style);
+}
+
+function box(r) {
+    return {x: r.left - rootRect.left, y: r.top - rootRect.top, w: r.width, h: r.height};
+}
+function contentBox(style, r) {
+    var left = parseFloat(style.paddingLeft) + parseFloat(style.borderLeftWidth);
+    var right = parseFloat(style.paddingRight) + parseFloat(style.borderRightWidth);
+    var top = parseFloat(style.paddingTop) + parseFloat(style.borderTopWidth);
+    var bottom = parseFloat(style.paddingBottom) + parseFloat(style.borderBottomWidth);
+    return {x: r.left - rootRect.left + left, y: r.top - rootRect.top + top,
+            w: Math.max(r.width - left - right, 1), h: Math.max(r.height - top - bottom, 1)};
+}
+function isInline(style) {
+    return style.display === 'inline' || style.display === 'contents';
+}
+function visible(style, r) {
+    return style.display !== 'none' && style.visibility !== 'hidden' && parseFloat(style.opacity) > 0
+        && r.width > 0 && r.height > 0;
+}
+function mark(el) {
+    rasterCount += 1;
+    el.setAttribute('[RASTER]', String(rasterCount));
+    return rasterCount;
+}
+function font(style) {
+    return {size: parseFloat(style.fontSize), weight: parseInt(style.fontWeight, 10) || 400,
+            italic: style.fontStyle === 'italic', color: style.color, family: style.fontFamily,
+            align: style.textAlign, lineHeight: style.lineHeight};
+}
+function inlineText(el) {
+    var parts = [];
+    el.childNodes.forEach(function (node) {
+        if (node.nodeType === 3) {
+            parts.push(node.nodeValue.replace(/\\s+/g, ' '));
+        } else if (node.nodeType === 1) {
+            if (node.tagName === 'BR') {
+                parts.push('\\n');
+            } else {
+                var style = getComputedStyle(node);
+                if (isInline(style) && style.visibility !== 'hidden') {
+                    parts.push(inlineText(node));
+                }
+            }
+        }
+    });
+    return parts.join('');
+}
+function listMarker(el, style) {
+    if (style.display !== 'list-item' || style.listStyleType === 'none') { return null; }
+    var parent = el.parentElement;
+    if (parent && parent.tagName === 'OL') {
+        return (Array.prototype.indexOf.call(parent.children, el) + 1) + '. ';
+    }
+    return '\\u2022 ';
+}
+function visit(el) {
+    var style = getComputedStyle(el);
+    var r = el.getBoundingClientRect();
+    var tag = el.tagName.toUpperCase();
+    if (style.display === 'none' || (!isInline(style) && !visible(style, r))) { return; }
+
+    // 根元素是批量文档的.batch-slide容器，它的transform只用于建立包含块，不需要截图
+    if (RASTER_TAGS[tag] || (el !== root && style.transform !== 'none')) {
+        items.push({type: 'raster', id: mark(el), hide: false, box: box(r)});
+        return;
+    }
+    if (tag === 'IMG') {
+        if (visible(style, r)) {
+            items.push({type: 'image', id: mark(el), src: el.currentSrc || el.src, fit: style.objectFit,
+                        natural: [el.naturalWidth, el.naturalHeight], box: contentBox(style, r)});
+        }
+        return;
+    }
+    if (isInline(style)) {
+        // 行内元素的文字由所在的块级元素输出，这里只继续查找其中的图片等元素
+        Array.prototype.forEach.call(el.children, visit);
+        return;
+    }
+
+    if (style.backgroundImage !== 'none') {
+        items.push({type: 'raster', id: mark(el), hide: true, box: box(r)});
+    } else {
+        var border = parseFloat(style.borderTopWidth);
+        var hasBorder = border > 0 && style.borderTopStyle !== 'none';
+        // 根元素的背景色作为幻灯片背景输出
+        var fill = el === root ? 'transparent' : style.backgroundColor;
+        if (!TRANSPARENT.test(fill) || hasBorder) {
+            items.push({type: 'rect', box: box(r), fill: fill,
+                        border: hasBorder ? {width: border, color: style.borderTopColor} : null,
+                        radius: style.borderTopLeftRadius});
+        }
+    }
+
+    if (tag === 'TABLE') {
+        var rows = Array.prototype.map.call(el.rows, function (row) {
+            return Array.prototype.map.call(row.cells, function (cell) {
+                return {text: cell.innerText.trim(), header: cell.tagName === 'TH'};
+            });
+        });
+        var firstCell = el.querySelector('td, th');
+        items.push({type: 'table', rows: rows, box: box(r), font: font(getComputedStyle(firstCell || el))});
+        return;
+    }
+
+    var text = inlineText(el).replace(/ *\\n */g, '\\n').trim();
+    if (text) {
+        items.push({type: 'text', text: text, marker: listMarker(el, style), font: font(style),
+                    box: contentBox(style, r)});
+    }
+    Array.prototype.forEach.call(el.children, visit);
+}
+
+// 幻灯片背景：根元素没有背景色时，和浏览器绘制画布一样依次使用<html>、<body>的背景色
+var background = null;
+[root, document.documentElement, document.body].some(function (el) {
+    var color = getComputedStyle(el).backgroundColor;
+    if (TRANSPARENT.test(color)) { return false; }
+    background = color;
+    return true;
+});
+
+visit(root);
+return {width: rootRect.width, height: rootRect.height, background: background, items: items};
+""".replace("[HIDE]", f"[{_HIDE_ATTRIBUTE}]").replace("[RASTER]", _RASTER_ATTRIBUTE)
+
+_COLOR_PATTERN = re.compile(r'rgba?\(\s*(\d+)[,\s]+(\d+)[,\s]+(\d+)(?:\s*[,/]\s*([\d.]+%?))?\s*\)')
+_HEX_COLOR_PATTERN = re.compile(r'#([0-9a-fA-F]{3,4}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})$')
+
+# 模板中出现的CSS颜色名称
+NAMED_COLORS = {
+    "black": "000000", "white": "FFFFFF", "red": "FF0000", "green": "008000", "blue": "0000FF",
+    "yellow": "FFFF00", "orange": "FFA500", "purple": "800080", "gray": "808080", "grey": "808080",
+    "silver": "C0C0C0", "navy": "000080", "teal": "008080", "maroon": "800000", "olive": "808000",
+    "lightgray": "D3D3D3", "lightgrey": "D3D3D3", "darkgray": "A9A9A9", "darkgrey": "A9A9A9",
+    "whitesmoke": "F5F5F5", "gold": "FFD700", "pink": "FFC0CB", "brown": "A52A2A",
+}
+
+
+def parse_css_color(value):
+    """
+    解析CSS颜色（计算样式中的rgb()/rgba()，或样式表中的十六进制、颜色名称）
+
+    Args:
+        value: CSS颜色字符串
+
+    Returns:
+        RGBColor，透明或无法解析时返回None
+    """
+    value = (value or "").strip()
+    hex_match = _HEX_COLOR_PATTERN.match(value)
+    if hex_match or value.lower() in NAMED_COLORS:
+        digits = hex_match.group(1) if hex_match else NAMED_COLORS[value.lower()]
+        if len(digits) in (3, 4):
+            digits = ''.join(c * 2 for c in digits)
+        if len(digits) == 8 and digits[6:] == "00":
+            return None
+        return RGBColor.from_string(digits[:6].upper())
+
+    match = _COLOR_PATTERN.match(value)
+    if not match:
+        return None
+    alpha = match.group(4)
+    if alpha is not None:
+        alpha = float(alpha[:-1]) / 100 if alpha.endswith('%') else float(alpha)
+        if alpha == 0:
+            return None
+    return RGBColor(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+
+def _font_family(value):
+    """取CSS字体列表中的第一个具体字体"""
+    for family in (value or "").split(','):
+        family = family.strip().strip('"\'')
+        if family and family not in ("serif", "sans-serif", "monospace", "cursive", "fantasy", "system-ui"):
+            return family
+    return None
+
+
+def fetch_image(src):
+    """获取图片原始数据（data URL、本地服务、文件或远程地址），失败时返回None"""
+    try:
+        if src.startswith('data:'):
+            return base64.b64decode(src.split(',', 1)[1])
+        if src.startswith(('http://127.0.0.1', 'file:')):
+            with urllib.request.urlopen(src, timeout=5) as response:
+                return response.read()
+        if src.startswith(('http://', 'https://')):
+            response = http_client.get(src, timeout=10)
+            if response.status_code == 200:
+                return response.content
+    except Exception as e:
+        logger.warning(f"获取图片失败，改为截图: {src[:80]} ({str(e)})")
+    return None
+
+
+def collect_slide_layout(driver, element, index):
+    """
+    读取一张幻灯片的布局，并为需要截图的元素截图
+
+    Args:
+        driver: WebDriver实例
+        element: 幻灯片根元素
+        index: 幻灯片索引
+
+    Returns:
+        布局字典，截图和图片数据保存在对应条目的data字段中
+    """
+    try:
+        layout = driver.execute_script(_COLLECT_SCRIPT, element)
+    except Exception as e:
+        # 无法解析DOM时整张幻灯片截图
+        logger.warning(f"第{index+1}张幻灯片无法读取布局，整页截图: {str(e)}")
+        rect = element.rect
+        return {"width": rect["width"], "height": rect["height"], "items": [
+            {"type": "raster", "box": {"x": 0, "y": 0, "w": rect["width"], "h": rect["height"]},
+             "data": element.screenshot_as_png}
+        ]}
+
+    for item in layout["items"]:
+        if item["type"] == "image":
+            item["data"] = fetch_image(item.get("src") or "")
+            if item["data"] is not None:
+                continue
+            # 获取失败时按截图处理
+            item["type"] = "raster"
+            item["hide"] = False
+        if item["type"] == "raster":
+            target = element.find_element("css selector", f'[{_RASTER_ATTRIBUTE}="{item["id"]}"]')
+            if item.get("hide"):
+                driver.execute_script(f"arguments[0].setAttribute('{_HIDE_ATTRIBUTE}', '1');", target)
+            try:
+                item["data"] = target.screenshot_as_png
+            finally:
+                if item.get("hide"):
+                    driver.execute_script(f"arguments[0].removeAttribute('{_HIDE_ATTRIBUTE}');", target)
+    return layout
+
+
+class NativeSlideBuilder:
+    """将布局数据转换为PPT原生形状"""
+
+    def __init__(self, presentation, layout_width, layout_height):
+        """
+        Args:
+            presentation: 演示文稿对象
+            layout_width: 网页中幻灯片的宽度（像素）
+            layout_height: 网页中幻灯片的高度（像素）
+        """
+        self.presentation = presentation
+        self.scale_x = presentation.slide_width / max(layout_width, 1)
+        self.scale_y = presentation.slide_height / max(layout_height, 1)
+        # 幻灯片宽度对应的磅值与像素之比，用于字号换算
+        self.pt_per_px = presentation.slide_width / 12700 / max(layout_width, 1)
+        self.native_shapes = 0
+        self.raster_shapes = 0
+
+    def _rect(self, box):
+        return (Emu(int(box["x"] * self.scale_x)), Emu(int(box["y"] * self.scale_y)),
+                Emu(max(int(box["w"] * self.scale_x), 1)), Emu(max(int(box["h"] * self.scale_y), 1)))
+
+    def add_slide(self, layout):
+        """按绘制顺序添加一张幻灯片的所有元素"""
+        slide = self.presentation.slides.add_slide(self.presentation.slide_layouts[6])  # 空白布局
+        background = parse_css_color(layout.get("background"))
+        if background is not None:
+            slide.background.fill.solid()
+            slide.background.fill.fore_color.rgb = background
+        for item in layout["items"]:
+            try:
+                getattr(self, f"_add_{item['type']}")(slide, item)
+            except Exception as e:
+                logger.warning(f"添加{item['type']}元素失败: {str(e)}")
+        return slide
+
+    def _add_rect(self, slide, item):
+        radius = item.get("radius") or "0px"
+        box = item["box"]
+        shape_type = MSO_SHAPE.RECTANGLE
+        if radius.endswith('%') and float(radius[:-1]) >= 50:
+            shape_type = MSO_SHAPE.OVAL
+        elif float(re.sub(r'[^\d.]', '', radius) or 0) > 0:
+            shape_type = MSO_SHAPE.ROUNDED_RECTANGLE
+
+        shape = slide.shapes.add_shape(shape_type, *self._rect(box))
+        if shape_type == MSO_SHAPE.ROUNDED_RECTANGLE and not radius.endswith('%'):
+            shape.adjustments[0] = min(float(re.sub(r'[^\d.]', '', radius)) / max(min(box["w"], box["h"]), 1), 0.5)
+
+        fill_color = parse_css_color(item.get("fill"))
+        gradient = item.get("gradient")
+        if gradient:
+            # PPT形状只保留首尾两个渐变色标
+            shape.fill.gradient()
+            shape.fill.gradient_angle = (90 - gradient["angle"]) % 360
+            stops = shape.fill.gradient_stops
+            for stop, (color, position) in zip((stops[0], stops[-1]), (gradient["stops"][0], gradient["stops"][-1])):
+                stop.color.rgb = parse_css_color(color) or RGBColor(0xFF, 0xFF, 0xFF)
+                stop.position = position
+        elif fill_color is not None:
+            shape.fill.solid()
+            shape.fill.fore_color.rgb = fill_color
+        else:
+            shape.fill.background()
+
+        border = item.get("border")
+        border_color = parse_css_color(border["color"]) if border else None
+        if border_color is not None:
+            shape.line.color.rgb = border_color
+            shape.line.width = Pt(border["width"] * self.pt_per_px)
+        else:
+            shape.line.fill.background()
+        self.native_shapes += 1
+
+    def _apply_font(self, font, style):
+        font.size = Pt(max(style["size"] * self.pt_per_px, 1))
+        font.bold = style["weight"] >= 600
+        font.italic = style["italic"]
+        color = parse_css_color(style["color"])
+        if color is not None:
+            font.color.rgb = color
+        family = _font_family(style["family"])
+        if family:
+            font.name = family
+
+    def _add_text(self, slide, item):
+        style = item["font"]
+        textbox = slide.shapes.add_textbox(*self._rect(item["box"]))
+        frame = textbox.text_frame
+        frame.word_wrap = True
+        frame.auto_size = MSO_AUTO_SIZE.NONE
+        frame.vertical_anchor = MSO_ANCHOR.TOP
+        frame.margin_left = frame.margin_right = frame.margin_top = frame.margin_bottom = 0
+
+        alignment = {"center": PP_ALIGN.CENTER, "right": PP_ALIGN.RIGHT, "end": PP_ALIGN.RIGHT,
+                     "justify": PP_ALIGN.JUSTIFY}.get(style["align"], PP_ALIGN.LEFT)
+        line_height = style.get("lineHeight") or ""
+
+        # runs: 每行一组[{"text", "font"}]，用于行内样式不同的文字；否则整段使用同一字体
+        lines = item.get("runs") or [[{"text": line, "font": style}] for line in item["text"].split('\n')]
+        for i, line in enumerate(lines):
+            paragraph = frame.paragraphs[0] if i == 0 else frame.add_paragraph()
+            paragraph.alignment = alignment
+            if line_height.endswith('px'):
+                paragraph.line_spacing = Pt(float(line_height[:-2]) * self.pt_per_px)
+            for j, part in enumerate(line):
+                run = paragraph.add_run()
+                run.text = (item.get("marker") or "") + part["text"] if i == 0 and j == 0 else part["text"]
+                self._apply_font(run.font, part["font"])
+        self.native_shapes += 1
+
+    def _add_table(self, slide, item):
+        rows = [row for row in item["rows"] if row]
+        if not rows:
+            return
+        cols = max(len(row) for row in rows)
+        table = slide.shapes.add_table(len(rows), cols, *self._rect(item["box"])).table
+        for r, row in enumerate(rows):
+            for c, cell in enumerate(row):
+                table_cell = table.cell(r, c)
+                table_cell.text = cell["text"]
+                for paragraph in table_cell.text_frame.paragraphs:
+                    for run in paragraph.runs:
+                        self._apply_font(run.font, cell.get("font") or item["font"])
+                        run.font.bold = cell["header"] or run.font.bold
+                fill_color = parse_css_color(cell.get("fill"))
+                if fill_color is not None:
+                    table_cell.fill.solid()
+                    table_cell.fill.fore_color.rgb = fill_color
+        self.native_shapes += 1
+
+    def _add_image(self, slide, item):
+        box = dict(item["box"])
+        natural_width, natural_height = item.get("natural") or (0, 0)
+        fit = item.get("fit") or "fill"
+        crop = None
+        if natural_width and natural_height and fit in ("contain", "scale-down", "none", "cover"):
+            image_ratio = natural_width / natural_height
+            box_ratio = box["w"] / max(box["h"], 1)
+            if fit == "cover":
+                # 超出部分裁剪
+                if image_ratio > box_ratio:
+                    excess = (1 - box_ratio / image_ratio) / 2
+                    crop = ("left", "right", excess)
+                else:
+                    excess = (1 - image_ratio / box_ratio) / 2
+                    crop = ("top", "bottom", excess)
+            else:
+                # 等比缩放后居中
+                if image_ratio > box_ratio:
+                    height = box["w"] / image_ratio
+                    box["y"] += (box["h"] - height) / 2
+                    box["h"] = height
+                else:
+                    width = box["h"] * image_ratio
+                    box["x"] += (box["w"] - width) / 2
+                    box["w"] = width
+
+        picture = slide.shapes.add_picture(BytesIO(item["data"]), *self._rect(box))
+        if crop:
+            setattr(picture, f"crop_{crop[0]}", crop[2])
+            setattr(picture, f"crop_{crop[1]}", crop[2])
+        self.native_shapes += 1
+
+    def _add_raster(self, slide, item):
+        if not item.get("data"):
+            return
+        slide.shapes.add_picture(BytesIO(item["data"]), *self._rect(item["box"]))
+        self.raster_shapes += 1
+
+
+def convert_html_to_native_ppt(html_contents, output_path, base_dir=None, parallelism=RENDER_PARALLELISM):
+    """
+    将HTML幻灯片转换为由原生形状组成的PPT
+
+    Args:
+        html_contents: HTML内容字符串列表
+        output_path: 输出的PPT文件路径
+        base_dir: HTML中相对路径资源所在的目录
+        parallelism: 最大并行会话数
+
+    Returns:
+        生成的PPT文件路径，失败时返回None
+    """
+    if not html_contents:
+        logger.error("没有HTML内容")
+        return None
+
+    start_time = time.time()
+    try:
+        layouts = visit_slides(html_contents, collect_slide_layout, parallelism, base_dir=base_dir)
+    except BrowserUnavailableError as e:
+        logger.error(f"浏览器不可用，无法进行转换: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"读取幻灯片布局失败: {str(e)}")
+        return None
+    layout_time = time.time() - start_time
+
+    prs = Presentation()
+    prs.slide_width = SLIDE_WIDTH
+    prs.slide_height = SLIDE_HEIGHT
+
+    builder = None
+    for layout in layouts:
+        if builder is None:
+            builder = NativeSlideBuilder(prs, layout["width"], layout["height"])
+        builder.add_slide(layout)
+
+    prs.save(output_path)
+    logger.info(f"原生形状PPT生成成功: {output_path}, {len(layouts)}张幻灯片, "
+                f"原生形状 {builder.native_shapes if builder else 0} 个, 截图元素 {builder.raster_shapes if builder else 0} 个, "
+                f"读取布局 {layout_time:.2f}秒, 总耗时 {time.time() - start_time:.2f}秒")
+    return output_path
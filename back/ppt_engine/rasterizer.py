@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+"""
+幻灯片栅格化
+用浏览器池中的多个会话并行打开页面并截图，结果按原顺序返回。
+批量模式下先把多张幻灯片合成为一个文档，一次加载后逐个截取元素。
+"""
+
+import os
+import re
+import time
+import queue
+import shutil
+import logging
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from .browser_pool import (get_browser_pool, wait_for_page_ready, BrowserUnavailableError,
+                           BROWSER_POOL_SIZE, BROWSER_WINDOW_SIZE)
+from .slide_server import get_slide_server
+
+# 获取模块日志记录器
+logger = logging.getLogger("ppt_engine.rasterizer")
+
+# 配置
+RENDER_PARALLELISM = int(os.environ.get('RENDER_PARALLELISM', str(BROWSER_POOL_SIZE)))  # 单个演示文稿的最大并行会话数
+RENDER_BATCH_MODE = os.environ.get('RENDER_BATCH_MODE', '1') == '1'  # 是否合并幻灯片为单个文档渲染
+RENDER_DELIVERY = os.environ.get('RENDER_DELIVERY', 'http')  # HTML交付方式：http（内存+本地服务）或file（临时文件）
+
+BATCH_SLIDE_CLASS = "batch-slide"
+BATCH_BODY_CLASS = "batch-body"
+_SLIDE_WIDTH, _SLIDE_HEIGHT = (int(v) for v in BROWSER_WINDOW_SIZE.split(','))
+
+# 每张幻灯片包在固定尺寸的容器中，容器相当于单页渲染时的视口和<html>，其中的.batch-body相当于<body>；
+# transform使容器成为fixed/absolute定位元素的包含块，这样页码等定位在body上的元素仍留在各自的幻灯片内
+_BATCH_STYLE = f"""
+html, body {{ margin: 0 !important; padding: 0 !important; height: auto !important; overflow: visible !important; }}
+.{BATCH_SLIDE_CLASS} {{ position: relative; width: {_SLIDE_WIDTH}px; height: {_SLIDE_HEIGHT}px; overflow: hidden; transform: translateZ(0); box-sizing: border-box; }}
+"""
+
+# 放在幻灯片样式之前，相当于浏览器默认的body样式，可被幻灯片自己的body规则覆盖
+_BATCH_DEFAULT_STYLE = f"""
+.{BATCH_BODY_CLASS} {{ display: block; margin: 8px; }}
+"""
+
+# 把各样式表（包括<link>引入的）中的html/body选择器改写为.batch-slide/.batch-body，
+# 再像浏览器把body背景传播到画布那样，把.batch-body的背景移到幻灯片容器上
+_BATCH_SCRIPT = """
+(function () {
+    var SCOPES = {html: '.[SLIDE]', body: '.[BODY]'};
+    var PATTERN = /(^|[\\s,>+~(])(html|body)(?=$|[\\s,.#:\\[>+~)])/gi;
+    function transparent(style) {
+        return style.backgroundImage === 'none' && /rgba\\(.*,\\s*0\\)$|^transparent$/.test(style.backgroundColor);
+    }
+    function rescope(rules) {
+        Array.prototype.forEach.call(rules, function (rule) {
+            if (rule.selectorText) {
+                rule.selectorText = rule.selectorText.replace(PATTERN, function (match, prefix, tag) {
+                    return prefix + SCOPES[tag.toLowerCase()];
+                });
+            }
+            if (rule.styleSheet) { rescopeSheet(rule.styleSheet); }
+            if (rule.cssRules) { rescope(rule.cssRules); }
+        });
+    }
+    function rescopeSheet(sheet) {
+        try {
+            rescope(sheet.cssRules);
+        } catch (e) {
+            // 跨域样式表无法读取规则，保持原样
+        }
+    }
+
+    Array.prototype.forEach.call(document.styleSheets, function (sheet) {
+        if (!sheet.ownerNode || sheet.ownerNode.id !== '[SLIDE]-style') { rescopeSheet(sheet); }
+    });
+    Array.prototype.forEach.call(document.querySelectorAll('.[SLIDE]'), function (slide) {
+        var body = slide.querySelector(':scope > .[BODY]');
+        if (!body || !transparent(getComputedStyle(slide))) { return; }
+        var style = getComputedStyle(body);
+        if (transparent(style)) { return; }
+        ['backgroundColor', 'backgroundImage', 'backgroundSize', 'backgroundPosition', 'backgroundRepeat',
+         'backgroundOrigin', 'backgroundClip'].forEach(function (name) {
+            slide.style[name] = style[name];
+        });
+        body.style.background = 'none';
+    });
+})();
+""".replace("[SLIDE]", BATCH_SLIDE_CLASS).replace("[BODY]", BATCH_BODY_CLASS)
+
+_HEAD_PATTERN = re.compile(r'<head[^>]*>(.*?)</head>', re.IGNORECASE | re.DOTALL)
+_BODY_PATTERN = re.compile(r'<body([^>]*)>(.*?)</body>', re.IGNORECASE | re.DOTALL)
+_CLASS_ATTRIBUTE_PATTERN = re.compile(r'\bclass\s*=\s*(["\'])(.*?)\1', re.IGNORECASE | re.DOTALL)
+_TITLE_PATTERN = re.compile(r'<title[^>]*>.*?</title>', re.IGNORECASE | re.DOTALL)
+_DOCTYPE_PATTERN = re.compile(r'<!DOCTYPE[^>]*>|</?html[^>]*>', re.IGNORECASE)
+_HEAD_OPEN_PATTERN = re.compile(r'<head[^>]*>', re.IGNORECASE)
+
+
+def capture_page(browser, url):
+    """
+    打开页面，等待就绪后截图
+
+    Args:
+        browser: WebDriver实例
+        url: 页面地址
+
+    Returns:
+        (PNG截图数据, 耗时信息字典)
+    """
+    load_start = time.time()
+    browser.get(url)
+    load_time = time.time() - load_start
+
+    # 等待字体和图片就绪
+    ready_state, wait_time = wait_for_page_ready(browser)
+
+    capture_start = time.time()
+    screenshot = browser.get_screenshot_as_png()
+    capture_time = time.time() - capture_start
+
+    return screenshot, {
+        "load": round(load_time, 3),
+        "wait": round(wait_time, 3),
+        "capture": round(capture_time, 3),
+        "state": ready_state
+    }
+
+
+def compose_slide_documents(html_contents, max_per_document=None):
+    """
+    将多张幻灯片合成为批量渲染文档
+
+    <head>相同（引用同一样式表和内联样式）的幻灯片合并到同一个文档中，
+    避免不同版式的样式互相覆盖；每张幻灯片的<body>改为.batch-body元素（保留其属性），
+    放入一个.batch-slide容器，页面加载后样式表中的html/body规则改写到这两个元素上，
+    使批量渲染与单页渲染的结果一致。
+
+    Args:
+        html_contents: 完整的HTML文档列表
+        max_per_document: 单个文档最多包含的幻灯片数，用于把大文档拆给多个会话并行处理
+
+    Returns:
+        [(合成后的HTML, 包含的幻灯片索引列表)]，按首张幻灯片的顺序排列
+    """
+    groups = OrderedDict()
+    for i, html in enumerate(html_contents):
+        head_match = _HEAD_PATTERN.search(html)
+        head = _TITLE_PATTERN.sub('', head_match.group(1)).strip() if head_match else ''
+
+        body_match = _BODY_PATTERN.search(html)
+        if body_match:
+            body = _body_element(body_match.group(1), body_match.group(2))
+        else:
+            body = _body_element('', _DOCTYPE_PATTERN.sub('', _HEAD_PATTERN.sub('', html)))
+
+        groups.setdefault(head, []).append((i, body))
+
+    documents = []
+    for head, group in groups.items():
+        size = max_per_document or len(group)
+        for start in range(0, len(group), size):
+            slides = group[start:start + size]
+            documents.append((_compose_document(head, slides), [i for i, _ in slides]))
+    return documents
+
+
+def _body_element(attributes, content):
+    """把<body>的属性和内容转换为.batch-body元素"""
+    classes = BATCH_BODY_CLASS
+    class_match = _CLASS_ATTRIBUTE_PATTERN.search(attributes)
+    if class_match:
+        classes = f"{classes} {class_match.group(2)}"
+        attributes = attributes[:class_match.start()] + attributes[class_match.end():]
+    attributes = " ".join(attributes.split())
+    return f'<div class="{classes}"{" " + attributes if attributes else ""}>{content}</div>'
+
+
+def _compose_document(head, slides):
+    """合成单个批量文档"""
+    sections = "".join(
+            f'<section class="{BATCH_SLIDE_CLASS}" data-slide-index="{i}">\n{body}\n</section>\n'
+            for i, body in slides
+        )
+    return (f"<!DOCTYPE html>\n<html>\n<head>\n<style>{_BATCH_DEFAULT_STYLE}</style>\n{head}\n"
+            f'<style id="{BATCH_SLIDE_CLASS}-style">{_BATCH_STYLE}</style>\n</head>\n'
+            f"<body>\n{sections}<script>{_BATCH_SCRIPT}</script>\n</body>\n</html>")
+
+
+def batch_document_size(total, parallelism=RENDER_PARALLELISM):
+    """按并行会话数平均拆分时单个文档的幻灯片数"""
+    workers = max(1, min(parallelism, get_browser_pool().size))
+    return max(1, -(-total // workers))
+
+
+def _run_items(items, handler, parallelism, browser):
+    """
+    用一个或多个浏览器会话处理工作项
+
+    Args:
+        items: 工作项列表
+        handler: handler(driver, item, worker_id)
+        parallelism: 最大并行会话数
+        browser: 指定的WebDriver实例，传入时在该实例中顺序处理
+
+    Returns:
+        使用的会话数
+    """
+    pending = queue.Queue()
+    for item in items:
+        pending.put(item)
+
+    def drain(driver, worker_id):
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            handler(driver, item, worker_id)
+
+    if browser is not None:
+        drain(browser, 0)
+        return 1
+
+    pool = get_browser_pool()
+    workers = max(1, min(parallelism, pool.size, len(items)))
+
+    def run(worker_id):
+        with pool.session() as driver:
+            drain(driver, worker_id)
+
+    if workers == 1:
+        run(0)
+        return 1
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rasterizer") as executor:
+        futures = [executor.submit(run, worker_id) for worker_id in range(workers)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                # 个别会话失败时，其余会话会继续处理队列中的工作项
+                logger.warning(f"栅格化会话失败: {str(e)}")
+                errors.append(e)
+
+    if errors and not pending.empty():
+        raise errors[0]
+    if errors:
+        # 失败会话已领取的工作项没有结果，由调用方检查
+        logger.warning(f"{len(errors)}个栅格化会话失败")
+    return workers
+
+
+def _check_missing(screenshots):
+    missing = [i + 1 for i, screenshot in enumerate(screenshots) if screenshot is None]
+    if missing:
+        raise RuntimeError(f"第{missing}张幻灯片截图失败")
+
+
+def capture_pages(urls, parallelism=RENDER_PARALLELISM, browser=None):
+    """
+    批量截图
+
+    未指定browser时从浏览器池借出最多parallelism个会话并行处理，
+    各会话从共享队列中领取页面，先完成的会话继续领取下一页。
+
+    Args:
+        urls: 页面地址列表
+        parallelism: 最大并行会话数
+        browser: 指定的WebDriver实例，传入时在该实例中顺序处理
+
+    Returns:
+        (截图列表, 耗时信息列表)，均与urls顺序一致
+
+    Raises:
+        BrowserUnavailableError: 没有可用的浏览器会话
+    """
+    screenshots = [None] * len(urls)
+    timings = [None] * len(urls)
+    if not urls:
+        return screenshots, timings
+
+    def handle(driver, i, worker_id):
+        screenshots[i], timing = capture_page(driver, urls[i])
+        timing["slide"] = i + 1
+        timing["worker"] = worker_id
+        timings[i] = timing
+
+    start_time = time.time()
+    workers = _run_items(list(range(len(urls))), handle, parallelism, browser)
+    _check_missing(screenshots)
+
+    logger.info(f"栅格化{len(urls)}张幻灯片完成, 会话数: {workers}, 耗时: {time.time() - start_time:.2f}秒")
+    return screenshots, timings
+
+
+def capture_documents(documents, total, parallelism=RENDER_PARALLELISM, browser=None):
+    """
+    批量模式截图：每个文档只加载一次，逐个截取其中的.batch-slide元素
+
+    Args:
+        documents: [(文档地址, 包含的幻灯片索引列表)]，通常来自compose_slide_documents
+        total: 幻灯片总数
+        parallelism: 最大并行会话数
+        browser: 指定的WebDriver实例，传入时在该实例中顺序处理
+
+    Returns:
+        (截图列表, 耗时信息列表)，均按幻灯片索引排列
+
+    Raises:
+        BrowserUnavailableError: 没有可用的浏览器会话
+    """
+    screenshots = [None] * total
+    timings = [None] * total
+    if not documents:
+        return screenshots, timings
+
+    def handle(driver, document, worker_id):
+        url, indices = document
+        load_start = time.time()
+        driver.get(url)
+        load_time = time.time() - load_start
+
+        # 整个文档的字体和图片只需等待一次
+        ready_state, wait_time = wait_for_page_ready(driver)
+
+        elements = driver.find_elements("css selector", f".{BATCH_SLIDE_CLASS}")
+        if len(elements) != len(indices):
+            raise RuntimeError(f"批量文档中找到{len(elements)}张幻灯片，预期{len(indices)}张")
+
+        for k, (i, element) in enumerate(zip(indices, elements)):
+            capture_start = time.time()
+            screenshots[i] = element.screenshot_as_png
+            # 加载和等待时间只计入文档中的第一张幻灯片
+            timings[i] = {
+                "slide": i + 1,
+                "load": round(load_time, 3) if k == 0 else 0.0,
+                "wait": round(wait_time, 3) if k == 0 else 0.0,
+                "capture": round(time.time() - capture_start, 3),
+                "state": ready_state,
+                "worker": worker_id
+            }
+
+    start_time = time.time()
+    workers = _run_items(documents, handle, parallelism, browser)
+    _check_missing(screenshots)
+
+    logger.info(f"批量栅格化{total}张幻灯片完成, 文档数: {len(documents)}, 会话数: {workers}, "
+                f"耗时: {time.time() - start_time:.2f}秒")
+    return screenshots, timings
+
+
+@contextmanager
+def _deliver(pages, base_dir, delivery):
+    """
+    把HTML交给浏览器，返回各页面的地址
+
+    http方式从内存提供页面，不写磁盘；file方式写入临时目录，
+    并插入<base>使相对路径资源指向base_dir。
+    """
+    if delivery == "http":
+        with get_slide_server().publish(dict(pages), base_dir) as base_url:
+            yield [base_url + name for name, _ in pages]
+        return
+
+    temp_dir = tempfile.mkdtemp(prefix="ppt_render_")
+    try:
+        urls = []
+        for name, html in pages:
+            if base_dir:
+                base_tag = f'<base href="file:///{os.path.abspath(base_dir)}/">'
+                html, count = _HEAD_OPEN_PATTERN.subn(lambda m: m.group(0) + base_tag, html, count=1)
+                if not count:
+                    html = base_tag + html
+            file_path = os.path.join(temp_dir, name)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+            urls.append(f"file:///{os.path.abspath(file_path)}")
+        yield urls
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def rasterize_html(html_contents, parallelism=RENDER_PARALLELISM, browser=None, batch_mode=RENDER_BATCH_MODE,
+                   base_dir=None, delivery=RENDER_DELIVERY):
+    """
+    将HTML幻灯片栅格化为截图
+
+    Args:
+        html_contents: 完整的HTML文档列表
+        parallelism: 最大并行会话数
+        browser: 指定的WebDriver实例，传入时在该实例中顺序处理
+        batch_mode: 是否合并为批量文档渲染
+        base_dir: 相对路径资源（样式表、图片）所在的目录
+        delivery: HTML交付方式，http或file
+
+    Returns:
+        (截图列表, 耗时信息列表)，与html_contents顺序一致
+
+    Raises:
+        BrowserUnavailableError: 没有可用的浏览器会话
+    """
+    total = len(html_contents)
+    if batch_mode:
+        # 使用浏览器池时按并行会话数拆分文档，让多个会话同时工作
+        max_per_document = batch_document_size(total, parallelism) if browser is None else None
+        composed = compose_slide_documents(html_contents, max_per_document)
+        pages = [(f"batch_{i+1}.html", html) for i, (html, _) in enumerate(composed)]
+        logger.info(f"批量模式: {total}张幻灯片合并为{len(pages)}个文档")
+    else:
+        pages = [(f"slide_{i+1}.html", html) for i, html in enumerate(html_contents)]
+
+    with _deliver(pages, base_dir, delivery) as urls:
+        if batch_mode:
+            documents = [(url, indices) for url, (_, indices) in zip(urls, composed)]
+            return capture_documents(documents, total, parallelism, browser)
+        return capture_pages(urls, parallelism, browser)
+
+
+def visit_slides(html_contents, handler, parallelism=RENDER_PARALLELISM, browser=None, base_dir=None,
+                 delivery=RENDER_DELIVERY):
+    """
+    以批量模式加载幻灯片，对每张幻灯片的根元素调用handler
+
+    与rasterize_html共用合成、交付和并行逻辑，供需要读取DOM而不只是截图的转换器使用。
+    handler在页面仍可访问时调用，因此可以在其中继续截取元素或加载页面资源。
+
+    Args:
+        html_contents: 完整的HTML文档列表
+        handler: handler(driver, element, index)，返回值作为该幻灯片的结果
+        parallelism: 最大并行会话数
+        browser: 指定的WebDriver实例，传入时在该实例中顺序处理
+        base_dir: 相对路径资源所在的目录
+        delivery: HTML交付方式，http或file
+
+    Returns:
+        各幻灯片的handler返回值列表，与html_contents顺序一致
+
+    Raises:
+        BrowserUnavailableError: 没有可用的浏览器会话
+    """
+    total = len(html_contents)
+    results = [None] * total
+    done = [False] * total
+    if not html_contents:
+        return results
+
+    max_per_document = batch_document_size(total, parallelism) if browser is None else None
+    composed = compose_slide_documents(html_contents, max_per_document)
+    pages = [(f"batch_{i+1}.html", html) for i, (html, _) in enumerate(composed)]
+
+    def handle(driver, document, worker_id):
+        url, indices = document
+        driver.get(url)
+        wait_for_page_ready(driver)
+
+        elements = driver.find_elements("css selector", f".{BATCH_SLIDE_CLASS}")
+        if len(elements) != len(indices):
+            raise RuntimeError(f"批量文档中找到{len(elements)}张幻灯片，预期{len(indices)}张")
+        for i, element in zip(indices, elements):
+            results[i] = handler(driver, element, i)
+            done[i] = True
+
+    with _deliver(pages, base_dir, delivery) as urls:
+        documents = [(url, indices) for url, (_, indices) in zip(urls, composed)]
+        _run_items(documents, handle, parallelism, browser)
+
+    missing = [i + 1 for i, finished in enumerate(done) if not finished]
+    if missing:
+        raise RuntimeError(f"第{missing}张幻灯片处理失败")
+    return results
@@ -1,11 +1,14 @@
 import os
 import sys
 import logging
-import tempfile
-import shutil
 import datetime
 from pathlib import Path
 import time
+from .browser_pool import BrowserUnavailableError, HAS_SELENIUM
+from .rasterizer import rasterize_html
+from .html_to_ppt import encode_slide_image, PPT_OUTPUT_MODE
+from .native_converter import convert_html_to_native_ppt
+from .html_layout import convert_html_to_layout_ppt
 
 # 配置日志
 logger = logging.getLogger("ppt_engine.renderer")
@@ -26,38 +29,9 @@ class Renderer:
         # 确保输出目录存在
         os.makedirs(self.output_dir, exist_ok=True)
         
-        # 初始化子系统
-        self._init_browser()
+        # 浏览器从共享的浏览器池中按需借出
+        self.has_browser = HAS_SELENIUM
         
-    def _init_browser(self):
-        """初始化浏览器"""
-        try:
-            from selenium import webdriver
-            from selenium.webdriver.chrome.options import Options
-            
-            options = Options()
-            options.add_argument('--headless')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--window-size=1280,720')
-            
-            try:
-                from selenium.webdriver.chrome.service import Service
-                from webdriver_manager.chrome import ChromeDriverManager
-                
-                service = Service(ChromeDriverManager().install())
-                self.browser = webdriver.Chrome(service=service, options=options)
-            except:
-                # 直接尝试使用Chrome驱动
-                self.browser = webdriver.Chrome(options=options)
-                
-            logger.info("浏览器初始化成功")
-            self.has_browser = True
-        except Exception as e:
-            logger.error(f"初始化浏览器失败: {str(e)}")
-            self.has_browser = False
-            
     def render(self, slides):
         """
         渲染幻灯片到PPT文件
@@ -73,25 +47,23 @@ class Renderer:
         output_filename = f"enhanced_ppt_{timestamp}.pptx"
         output_path = os.path.join(self.output_dir, output_filename)
         
-        # 2. 创建临时HTML文件
-        html_files = []
-        temp_dir = tempfile.mkdtemp(prefix="ppt_html_")
-        
         try:
-            for i, slide in enumerate(slides):
-                html_content = self._create_full_html(slide['html'], slide['css'])
-                
-                # 保存到临时文件
-                file_path = os.path.join(temp_dir, f"slide_{i+1}.html")
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(html_content)
-                    
-                html_files.append(file_path)
-                
-            # 3. 将HTML转换为PPTX
-            result = self._convert_html_to_pptx(html_files, output_path)
+            html_contents = [self._create_full_html(slide['html'], slide['css']) for slide in slides]
             
-            if not result:
+            # 2. 转换为PPTX（HTML从内存交给浏览器池，多个会话并行），配置为native时优先生成原生形状
+            if self.has_browser and PPT_OUTPUT_MODE != 'layout':
+                if PPT_OUTPUT_MODE == 'native' and convert_html_to_native_ppt(html_contents, output_path):
+                    return output_path
+                try:
+                    screenshots, timings = rasterize_html(html_contents)
+                    logger.info(f"{len(timings)}张幻灯片截图完成，等待就绪共 {sum(t['wait'] for t in timings):.2f}秒")
+                    self._save_screenshots(screenshots, output_path)
+                    return output_path
+                except BrowserUnavailableError as e:
+                    logger.error(f"浏览器不可用: {str(e)}")
+            
+            # 3. 没有浏览器时在Python中计算布局
+            if not self._convert_fallback(html_contents, output_path):
                 logger.error("转换HTML到PPTX失败")
                 return None
                 
@@ -102,12 +74,6 @@ class Renderer:
             import traceback
             logger.error(traceback.format_exc())
             return None
-        finally:
-            # 清理临时文件
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
                 
     def _create_full_html(self, html_content, css_content):
         """
@@ -141,151 +107,56 @@ class Renderer:
 </body>
 </html>"""
         
-    def _convert_html_to_pptx(self, html_files, output_path):
+    def _save_screenshots(self, screenshots, output_path):
         """
-        将HTML文件转换为PPTX
+        按顺序将截图铺满幻灯片并保存
         
         Args:
-            html_files: HTML文件路径列表
+            screenshots: 截图数据列表
             output_path: 输出文件路径
             
         Returns:
             success: 是否成功
         """
-        try:
-            # 如果有浏览器，使用截图方法
-            if self.has_browser:
-                return self._convert_with_browser(html_files, output_path)
-            else:
-                # 尝试使用现有的转换功能
-                try:
-                    from ..html_to_ppt import convert_html_files_to_ppt
-                    return convert_html_files_to_ppt(html_files, output_path)
-                except:
-                    logger.error("无法使用现有的HTML转PPT功能")
-                    return self._convert_fallback(html_files, output_path)
-        except Exception as e:
-            logger.error(f"转换HTML到PPTX失败: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
-            return False
-            
-    def _convert_with_browser(self, html_files, output_path):
-        """
-        使用浏览器截图方法转换HTML到PPTX
+        from pptx import Presentation
+        from pptx.util import Inches
         
-        Args:
-            html_files: HTML文件路径列表
-            output_path: 输出文件路径
-            
-        Returns:
-            success: 是否成功
-        """
-        try:
-            from pptx import Presentation
-            from pptx.util import Inches
-            
-            # 创建演示文稿
-            prs = Presentation()
-            
-            # 设置幻灯片尺寸为16:9
-            prs.slide_width = Inches(10)
-            prs.slide_height = Inches(5.625)
-            
-            # 处理每个HTML文件
-            for html_file in html_files:
-                # 打开HTML文件
-                file_url = f"file:///{os.path.abspath(html_file)}"
-                self.browser.get(file_url)
-                
-                # 等待页面加载
-                time.sleep(0.5)
-                
-                # 截图
-                screenshot = self.browser.get_screenshot_as_png()
-                
-                # 添加幻灯片
-                slide_layout = prs.slide_layouts[6]  # 空白布局
-                slide = prs.slides.add_slide(slide_layout)
-                
-                # 保存截图到临时文件
-                img_path = tempfile.mktemp(suffix='.png')
-                with open(img_path, 'wb') as f:
-                    f.write(screenshot)
-                    
-                try:
-                    # 添加图片到幻灯片
-                    slide.shapes.add_picture(img_path, 0, 0, prs.slide_width, prs.slide_height)
-                finally:
-                    # 删除临时图片
-                    if os.path.exists(img_path):
-                        os.remove(img_path)
-                        
-            # 保存演示文稿
-            prs.save(output_path)
-            logger.info(f"演示文稿已保存到: {output_path}")
-            
-            return True
-        except Exception as e:
-            logger.error(f"使用浏览器转换失败: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
-            return False
+        # 创建演示文稿
+        prs = Presentation()
+        
+        # 设置幻灯片尺寸为16:9
+        prs.slide_width = Inches(10)
+        prs.slide_height = Inches(5.625)
+        
+        for screenshot in screenshots:
+            # 添加幻灯片
+            slide_layout = prs.slide_layouts[6]  # 空白布局
+            slide = prs.slides.add_slide(slide_layout)
+            
+            # 直接从内存添加图片到幻灯片（默认原样嵌入PNG，不重新编码）
+            image_stream, _, _ = encode_slide_image(screenshot)
+            slide.shapes.add_picture(image_stream, 0, 0, prs.slide_width, prs.slide_height)
+            
+        # 保存演示文稿
+        prs.save(output_path)
+        logger.info(f"演示文稿已保存到: {output_path}")
+        
+        return True
             
-    def _convert_fallback(self, html_files, output_path):
+    def _convert_fallback(self, html_contents, output_path):
         """
-        备用方法，当其他方法都失败时使用
+        备用方法，没有浏览器时使用无浏览器布局引擎生成原生形状
         
         Args:
-            html_files: HTML文件路径列表
+            html_contents: 完整的HTML文档列表
             output_path: 输出文件路径
             
         Returns:
             success: 是否成功
         """
-        logger.warning("使用备用方法生成PPT")
-        
-        try:
-            from pptx import Presentation
-            
-            # 创建简单的演示文稿
-            prs = Presentation()
-            
-            for html_file in html_files:
-                # 读取HTML内容
-                with open(html_file, 'r', encoding='utf-8') as f:
-                    html_content = f.read()
-                    
-                # 提取标题和内容
-                import re
-                title_match = re.search(r'<h1[^>]*>(.*?)</h1>', html_content, re.DOTALL)
-                title = title_match.group(1) if title_match else "Slide"
-                
-                # 添加幻灯片
-                slide_layout = prs.slide_layouts[1]  # 标题和内容布局
-                slide = prs.slides.add_slide(slide_layout)
-                
-                # 设置标题
-                slide.shapes.title.text = title
-                
-                # 添加提示文本
-                content = slide.placeholders[1]
-                content.text = "HTML内容无法正确渲染，请检查浏览器设置"
-                
-            # 保存演示文稿
-            prs.save(output_path)
-            logger.info(f"备用演示文稿已保存到: {output_path}")
-            
-            return True
-        except Exception as e:
-            logger.error(f"备用方法失败: {str(e)}")
-            return False
+        logger.warning("浏览器不可用，使用无浏览器布局引擎生成PPT")
+        return convert_html_to_layout_ppt(html_contents, output_path) is not None
             
     def close(self):
-        """关闭浏览器"""
-        if self.has_browser:
-            try:
-                self.browser.close()
-                self.browser.quit()
-            except:
-                pass 
\ No newline at end of file
+        """浏览器会话由浏览器池管理，用完即归还，这里无需关闭"""
+        pass 
\ No newline at end of file
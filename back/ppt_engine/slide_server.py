@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+本地幻灯片HTTP服务
+在进程内的回环地址上提供内存中的幻灯片HTML，浏览器直接通过HTTP加载，
+无需把每张幻灯片写入临时文件；样式表、图片等相对路径资源从模板目录读取。
+HTTP页面不能加载file://资源，文档中引用的本地文件改为由本服务提供。
+"""
+
+import os
+import re
+import uuid
+import logging
+import mimetypes
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import unquote, urlsplit
+
+# 获取模块日志记录器
+logger = logging.getLogger("ppt_engine.slide_server")
+
+# 文档中的本地文件地址（图片服务和内容填充器生成的file://图片）
+# 内容填充器生成的地址没有转义，路径中可能有空格，所以只以引号、括号和换行为界
+_FILE_URL_PATTERN = re.compile(r'file://[^"\'<>()\r\n]+')
+# 本地文件在站点中的路径前缀
+LOCAL_FILE_PREFIX = "_local/"
+
+
+class _SlideRequestHandler(BaseHTTPRequestHandler):
+    """处理/<站点令牌>/<路径>形式的请求"""
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path).lstrip('/')
+        token, _, name = path.partition('/')
+        site = self.server.slide_server.get_site(token)
+        if site is None:
+            self.send_error(404)
+            return
+
+        documents, base_dir, local_files = site
+        if name in documents:
+            self._send(200, "text/html; charset=utf-8", documents[name])
+            return
+
+        # 本地文件只提供文档中引用过的
+        file_path = local_files.get(name) or _resolve_asset(base_dir, name)
+        if file_path is None:
+            self.send_error(404)
+            return
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        self._send(200, content_type, data)
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "max-age=300")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def _resolve_asset(base_dir, name):
+    """将请求路径映射到模板目录中的文件，拒绝目录之外的路径"""
+    if not base_dir or not name:
+        return None
+    root = os.path.realpath(base_dir)
+    file_path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, file_path]) != root or not os.path.isfile(file_path):
+        return None
+    return file_path
+
+
+def _file_url_path(url):
+    """file://地址对应的本地路径，兼容file:///path、file://path和Windows盘符"""
+    path = unquote(url[len("file:"):]).lstrip('/')
+    if not re.match(r'[A-Za-z]:', path):
+        path = '/' + path
+    return os.path.normpath(path)
+
+
+def localize_file_urls(documents, site_root):
+    """
+    将文档中的file://地址替换为站点内的地址
+
+    Args:
+        documents: 字典，文件名 -> HTML字符串
+        site_root: 站点根路径（以/结尾）
+
+    Returns:
+        (替换后的文档字典, 站点路径 -> 本地文件路径的字典)
+    """
+    local_files = {}
+    aliases = {}
+
+    def replace(match):
+        path = _file_url_path(match.group(0))
+        if not os.path.isfile(path):
+            return match.group(0)
+        name = aliases.get(path)
+        if name is None:
+            name = f"{LOCAL_FILE_PREFIX}{len(aliases) + 1}{os.path.splitext(path)[1]}"
+            aliases[path] = name
+            local_files[name] = path
+        return site_root + name
+
+    localized = {name: _FILE_URL_PATTERN.sub(replace, html) for name, html in documents.items()}
+    return localized, local_files
+
+
+class SlideServer:
+    """
+    回环地址上的幻灯片HTTP服务
+
+    每次渲染发布一个站点（随机令牌作为路径前缀），渲染结束后撤下，
+    多个并发渲染互不干扰。服务在首次发布时启动，运行于守护线程。
+    """
+
+    def __init__(self, host="127.0.0.1"):
+        self.host = host
+        self._sites = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._server is None:
+                server = ThreadingHTTPServer((self.host, 0), _SlideRequestHandler)
+                server.daemon_threads = True
+                server.slide_server = self
+                threading.Thread(target=server.serve_forever, name="slide_server", daemon=True).start()
+                self._server = server
+                logger.info(f"本地幻灯片服务已启动: http://{self.host}:{server.server_port}/")
+        return self._server
+
+    def get_site(self, token):
+        with self._lock:
+            return self._sites.get(token)
+
+    @contextmanager
+    def publish(self, documents, base_dir=None):
+        """
+        发布一组内存中的HTML文档
+
+        文档中的file://地址替换为站点内的地址，只有这些被引用的本地文件可以通过站点访问。
+
+        用法:
+            with get_slide_server().publish({"slide_1.html": html}, template_dir) as base_url:
+                browser.get(base_url + "slide_1.html")
+
+        Args:
+            documents: 字典，文件名 -> HTML字符串
+            base_dir: 相对路径资源所在的目录
+
+        Returns:
+            站点根地址（以/结尾）
+        """
+        server = self._ensure_started()
+        token = uuid.uuid4().hex
+        documents, local_files = localize_file_urls(documents, f"/{token}/")
+        encoded = {name: html.encode('utf-8') for name, html in documents.items()}
+        with self._lock:
+            self._sites[token] = (encoded, base_dir, local_files)
+        try:
+            yield f"http://{self.host}:{server.server_port}/{token}/"
+        finally:
+            with self._lock:
+                self._sites.pop(token, None)
+
+
+# 单例实例
+_slide_server_instance = None
+_slide_server_lock = threading.Lock()
+
+def get_slide_server():
+    """获取本地幻灯片服务的单例实例"""
+    global _slide_server_instance
+    if _slide_server_instance is None:
+        with _slide_server_lock:
+            if _slide_server_instance is None:
+                _slide_server_instance = SlideServer()
+    return _slide_server_instance
@@ -16,24 +16,36 @@ from .template_converter import PPTTemplateConverter
 from .content_filler import fill_outline_content
 from .html_to_ppt import convert_html_to_ppt
 
+# 尝试导入任务进度上报（在后台任务中运行时记录各阶段耗时）
+try:
+    from job_queue import set_job_stage
+except ImportError:
+    def set_job_stage(name):
+        pass
+
 # 获取模块日志记录器
 logger = logging.getLogger("ppt_engine.unified_generator")
 
+# 是否在输出目录旁保存调试用的HTML文件
+SAVE_DEBUG_HTML = os.environ.get('PPT_DEBUG_HTML', '0') == '1'
+
 class UnifiedPPTGenerator:
     """统一PPT生成器，整合所有功能"""
     
-    def __init__(self, templates_dir=None):
+    def __init__(self, templates_dir=None, save_debug_html=SAVE_DEBUG_HTML):
         """
         初始化生成器
         
         Args:
             templates_dir: PPT模板目录
+            save_debug_html: 是否保存调试用的HTML文件
         """
         # 确定模板目录
         if templates_dir is None:
             templates_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ppt_templates")
             
         self.templates_dir = templates_dir
+        self.save_debug_html = save_debug_html
         
         # HTML模板缓存目录
         self.html_templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "html_templates")
@@ -92,6 +104,7 @@ class UnifiedPPTGenerator:
         
         try:
             # 准备HTML模板
+            set_job_stage("prepare_template")
             html_template_dir = self.prepare_template(template_path)
             if not html_template_dir:
                 logger.error("准备HTML模板失败")
@@ -100,6 +113,7 @@ class UnifiedPPTGenerator:
             logger.info(f"HTML模板准备完成: {html_template_dir}")
             
             # 填充内容
+            set_job_stage("fill_content")
             html_slides = fill_outline_content(outline, html_template_dir)
             if not html_slides:
                 logger.error("填充内容失败")
@@ -107,18 +121,13 @@ class UnifiedPPTGenerator:
                 
             logger.info(f"内容填充完成，生成了 {len(html_slides)} 张幻灯片")
             
-            # 保存调试用的HTML文件
-            debug_dir = os.path.join(os.path.dirname(output_path), "debug_html")
-            os.makedirs(debug_dir, exist_ok=True)
-            for i, html in enumerate(html_slides):
-                debug_path = os.path.join(debug_dir, f"slide_{i+1}.html")
-                with open(debug_path, 'w', encoding='utf-8') as f:
-                    f.write(html)
-                    
-            logger.info(f"HTML文件已保存到: {debug_dir}")
+            # 保存调试用的HTML文件（默认关闭，设置PPT_DEBUG_HTML=1开启）
+            if self.save_debug_html:
+                self._save_debug_html(html_slides, output_path)
             
-            # 转换为PPT
-            ppt_path = convert_html_to_ppt(html_slides, output_path)
+            # 转换为PPT，相对路径资源从HTML模板目录加载
+            set_job_stage("convert")
+            ppt_path = convert_html_to_ppt(html_slides, output_path, base_dir=html_template_dir)
             
             # 计算耗时
             elapsed_time = time.time() - start_time
@@ -131,6 +140,23 @@ class UnifiedPPTGenerator:
             logger.error(traceback.format_exc())
             return None
 
+    def _save_debug_html(self, html_slides, output_path):
+        """
+        保存调试用的HTML文件
+        
+        Args:
+            html_slides: HTML内容列表
+            output_path: 输出的PPT文件路径，HTML保存在同级的debug_html目录
+        """
+        debug_dir = os.path.join(os.path.dirname(output_path), "debug_html")
+        os.makedirs(debug_dir, exist_ok=True)
+        for i, html in enumerate(html_slides):
+            debug_path = os.path.join(debug_dir, f"slide_{i+1}.html")
+            with open(debug_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+                
+        logger.info(f"HTML文件已保存到: {debug_dir}")
+
 def generate_ppt_from_outline(outline, template_path, output_path):
     """
     从大纲生成PPT的便捷函数
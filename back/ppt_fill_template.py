@@ -5,17 +5,23 @@ PPT模板填充工具
 """
 
 import os
+import re
 import sys
 import json
 import logging
 import traceback
-from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_PARAGRAPH_ALIGNMENT  # 修正了PP_ALIGN的导入问题
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml.ns import qn
+from copy import deepcopy
 from io import BytesIO
-import requests
+import http_client
 from image_service import get_image_for_slide
+from text_tokenizer import text_similarity
+from ppt_template_store import get_template_store, SlideShapeIndex, PLACEHOLDER_PICTURE, PLACEHOLDER_TABLE  # 进程内共享的模板缓存
+from text_fit import shrink_text_to_fit  # 按字形宽度缩小放不下的文字
 
 # 配置日志
 logging.basicConfig(
@@ -28,6 +34,204 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ppt_template_fill")
 
+# 复制幻灯片时直接共享的部件（图片、音视频等只读资源，以及指向其他幻灯片的链接）
+_SHARED_RELTYPES = {RT.IMAGE, RT.MEDIA, RT.VIDEO, RT.AUDIO, RT.SLIDE}
+# 复制幻灯片时不复制的关系（版式由add_slide建立，备注页属于原幻灯片）
+_SKIPPED_RELTYPES = {RT.SLIDE_LAYOUT, RT.NOTES_SLIDE}
+_REL_NS_PREFIX = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+def _remap_rids(element, rid_map):
+    """将XML中引用关系的属性（r:id、r:embed等）改写为新部件中的rId"""
+    for el in element.iter():
+        for attr, value in el.attrib.items():
+            if attr.startswith(_REL_NS_PREFIX) and value in rid_map:
+                el.set(attr, rid_map[value])
+
+def _copy_rels(source_part, target_part):
+    """
+    把source_part的关系复制到target_part
+
+    只读资源共享同一部件，图表、嵌入对象等可编辑部件各自复制一份，
+    避免两张幻灯片修改同一个部件。
+
+    Returns:
+        原rId到新rId的映射
+    """
+    rid_map = {}
+    for rId in list(source_part.rels):
+        rel = source_part.rels[rId]
+        if rel.reltype in _SKIPPED_RELTYPES:
+            continue
+        if rel.is_external:
+            rid_map[rId] = target_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+        elif rel.reltype in _SHARED_RELTYPES:
+            rid_map[rId] = target_part.relate_to(rel.target_part, rel.reltype)
+        else:
+            rid_map[rId] = target_part.relate_to(_copy_part(rel.target_part), rel.reltype)
+    return rid_map
+
+def _copy_part(part):
+    """复制一个部件（含其关系），新部件名按原部件名的编号规则分配"""
+    package = part.package
+    partname_template = re.sub(r'\d*(\.\w+)$', r'%d\1', str(part.partname))
+    new_part = type(part).load(package.next_partname(partname_template), part.content_type, package, part.blob)
+    rid_map = _copy_rels(part, new_part)
+    if rid_map and hasattr(new_part, '_element'):
+        _remap_rids(new_part._element, rid_map)
+    return new_part
+
+def clone_slide(prs, source_slide, position=None):
+    """
+    复制幻灯片，深拷贝形状树、背景和关系，保留模板页的全部设计元素
+    
+    Args:
+        prs: 演示文稿对象
+        source_slide: 要复制的幻灯片
+        position: 新幻灯片在演示文稿中的位置，None表示追加到末尾
+        
+    Returns:
+        新幻灯片
+    """
+    new_slide = prs.slides.add_slide(source_slide.slide_layout)
+    rid_map = _copy_rels(source_slide.part, new_slide.part)
+    
+    # 用原幻灯片的形状替换版式带来的占位符
+    keep_tags = (qn('p:nvGrpSpPr'), qn('p:grpSpPr'))
+    new_tree = new_slide.shapes._spTree
+    for el in list(new_tree):
+        if el.tag not in keep_tags:
+            new_tree.remove(el)
+    for el in source_slide.shapes._spTree:
+        if el.tag not in keep_tags:
+            new_tree.append(deepcopy(el))
+    
+    # 背景必须位于形状树之前
+    source_bg = source_slide._element.cSld.bg
+    if source_bg is not None:
+        new_slide._element.cSld.insert(0, deepcopy(source_bg))
+    
+    _remap_rids(new_slide._element.cSld, rid_map)
+    
+    if position is not None:
+        sld_id_lst = prs.slides._sldIdLst
+        sld_id = sld_id_lst[-1]
+        sld_id_lst.remove(sld_id)
+        sld_id_lst.insert(position, sld_id)
+    return new_slide
+
+def plan_slide_assignment(content_types, slide_index, template_slides_count):
+    """
+    为每个大纲条目分配模板页
+    
+    按大纲顺序给每个条目分配最小的空闲候选页，保持模板设计的页面顺序；
+    分配不到的条目再用增广路调整（二分图最大匹配），让尽量多的条目各自使用一张不同的模板页，
+    调整后同一类型条目的页面重新按升序排列。
+    剩下的条目复用候选页中使用次数最少的一张（需要复制），复制次数因此最少。
+    没有合适模板页的类型依次退回到content页、中间页（封面退回首页，总结退回尾页）。
+    
+    Args:
+        content_types: 每个大纲条目的内容类型
+        slide_index: 内容类型 -> 模板页索引列表（见ppt_template_store.build_slide_index）
+        template_slides_count: 模板页数
+        
+    Returns:
+        模板页索引列表，与content_types一一对应
+    """
+    last = template_slides_count - 1
+    middle = list(range(1, last)) or list(range(template_slides_count))
+    
+    def candidates(content_type):
+        pages = slide_index.get(content_type)
+        if not pages and content_type not in ('cover', 'summary'):
+            pages = slide_index.get('content')
+        pages = sorted(j for j in pages or [] if j < template_slides_count)
+        if pages:
+            return pages
+        if content_type == 'cover':
+            return [0]
+        if content_type == 'summary':
+            return [last]
+        return middle
+    
+    candidate_lists = [candidates(content_type) for content_type in content_types]
+    
+    # 先按顺序取最小的空闲页，owner: 模板页 -> 条目
+    owner = {}
+    unmatched = []
+    for item, pages in enumerate(candidate_lists):
+        page = next((j for j in pages if j not in owner), None)
+        if page is None:
+            unmatched.append(item)
+        else:
+            owner[page] = item
+    
+    # 增广路匹配，只处理没有分到空闲页的条目
+    def assign(item, visited):
+        for j in candidate_lists[item]:
+            if j not in visited:
+                visited.add(j)
+                if j not in owner or assign(owner[j], visited):
+                    owner[j] = item
+                    return True
+        return False
+    
+    for item in unmatched:
+        assign(item, set())
+    
+    plan = [None] * len(content_types)
+    for j, item in owner.items():
+        plan[item] = j
+    
+    # 增广路可能打乱顺序；同一类型的条目候选页相同，可以互换，按大纲顺序重新升序排列
+    matched_by_type = {}
+    for item, j in enumerate(plan):
+        if j is not None:
+            matched_by_type.setdefault(content_types[item], []).append(item)
+    for items in matched_by_type.values():
+        for item, j in zip(items, sorted(plan[item] for item in items)):
+            plan[item] = j
+    
+    usage = {j: 1 for j in owner}
+    for item, j in enumerate(plan):
+        if j is None:
+            j = min(candidate_lists[item], key=lambda page: usage.get(page, 0))
+            plan[item] = j
+            usage[j] = usage.get(j, 0) + 1
+    return plan
+
+def assemble_slides(prs, plan):
+    """
+    按分配方案重排演示文稿：首次使用的模板页直接使用，重复使用的复制，未使用的删除
+    
+    Args:
+        prs: 演示文稿对象（模板副本）
+        plan: plan_slide_assignment返回的模板页索引列表
+    """
+    original_slides = list(prs.slides)
+    sld_id_lst = prs.slides._sldIdLst
+    original_ids = list(sld_id_lst)
+    
+    ordered_ids = []
+    used = set()
+    for j in plan:
+        if j in used:
+            clone_slide(prs, original_slides[j])
+            ordered_ids.append(sld_id_lst[-1])
+        else:
+            used.add(j)
+            ordered_ids.append(original_ids[j])
+    
+    # 删除未使用的模板页
+    for j, sld_id in enumerate(original_ids):
+        if j not in used:
+            sld_id_lst.remove(sld_id)
+            prs.part.drop_rel(sld_id.rId)
+    
+    # 按大纲顺序排列
+    for sld_id in ordered_ids:
+        sld_id_lst.remove(sld_id)
+        sld_id_lst.append(sld_id)
+
 class PPTTemplateFiller:
     """PPT模板填充器"""
     
@@ -40,9 +244,12 @@ class PPTTemplateFiller:
             metadata_path: 元数据文件路径，如果为None则自动查找
         """
         self.template_path = template_path
+        self.template = None
         self.prs = None
         self.metadata = None
         self.metadata_path = metadata_path
+        # 按内容类型索引的模板页，随元数据从模板存储中获取
+        self.slide_index = {}
         
         # 加载模板
         self.load_template()
@@ -58,7 +265,9 @@ class PPTTemplateFiller:
                 raise FileNotFoundError(f"模板文件不存在: {self.template_path}")
                 
             logger.info(f"加载PPT模板: {self.template_path}")
-            self.prs = Presentation(self.template_path)
+            # 模板在进程内只解析一次，self.prs仅用于只读查询
+            self.template = get_template_store().get_template(self.template_path)
+            self.prs = self.template.presentation
             logger.info(f"模板加载成功，包含 {len(self.prs.slides)} 张幻灯片")
         except Exception as e:
             logger.error(f"加载模板失败: {str(e)}")
@@ -89,8 +298,7 @@ class PPTTemplateFiller:
                     logger.info(f"自动生成元数据成功: {self.metadata_path}")
                     
                     # 加载新生成的元数据
-                    with open(self.metadata_path, 'r', encoding='utf-8') as f:
-                        self.metadata = json.load(f)
+                    self._use_metadata(get_template_store().get_metadata_entry(self.metadata_path))
                     
                     logger.info(f"元数据加载成功，包含 {len(self.metadata['slides'])} 张幻灯片信息")
                     return
@@ -102,8 +310,7 @@ class PPTTemplateFiller:
             
             # 加载元数据
             logger.info(f"加载元数据: {self.metadata_path}")
-            with open(self.metadata_path, 'r', encoding='utf-8') as f:
-                self.metadata = json.load(f)
+            self._use_metadata(get_template_store().get_metadata_entry(self.metadata_path))
             
             logger.info(f"元数据加载成功，包含 {len(self.metadata['slides'])} 张幻灯片信息")
         except Exception as e:
@@ -111,72 +318,19 @@ class PPTTemplateFiller:
             logger.error(traceback.format_exc())
             logger.warning("将使用基本填充方法")
     
-    def find_best_slide_for_content(self, content_type, slide_index=None):
-        """
-        根据内容类型找到最合适的幻灯片
-        
-        Args:
-            content_type: 内容类型（cover, content, keypoints, image, table, chart, summary）
-            slide_index: 指定的幻灯片索引，如果为None则自动查找
-            
-        Returns:
-            最合适的幻灯片索引
-        """
-        if not self.metadata:
-            # 如果没有元数据，使用基本规则
-            logger.info(f"没有元数据，使用基本规则选择幻灯片")
-            
-            # 检查self.prs是否为None
-            if self.prs is None or not hasattr(self.prs, 'slides') or len(self.prs.slides) == 0:
-                logger.warning("模板对象为空或无幻灯片，返回默认索引0")
-                return 0
-                
-            if content_type == 'cover':
-                return 0
-            elif content_type == 'summary':
-                return len(self.prs.slides) - 1
-            elif slide_index is not None and 0 <= slide_index < len(self.prs.slides):
-                return slide_index
-            else:
-                return min(1, len(self.prs.slides) - 1)
-        
-        # 检查self.prs是否为None
-        if self.prs is None or not hasattr(self.prs, 'slides') or len(self.prs.slides) == 0:
-            logger.warning("模板对象为空或无幻灯片，返回默认索引0")
-            return 0
-            
-        # 如果指定了幻灯片索引且在有效范围内，直接返回
-        if slide_index is not None and 0 <= slide_index < len(self.prs.slides):
-            logger.info(f"使用指定的幻灯片索引: {slide_index}")
-            return slide_index
-        
-        # 根据内容类型查找合适的幻灯片
-        suitable_slides = []
-        for i, slide_info in enumerate(self.metadata['slides']):
-            if 'suitable_for' in slide_info and content_type in slide_info['suitable_for']:
-                suitable_slides.append(i)
-        
-        # 如果找到合适的幻灯片，返回第一个
-        if suitable_slides:
-            logger.info(f"找到{len(suitable_slides)}个适合{content_type}的幻灯片: {suitable_slides}")
-            return suitable_slides[0]
-        
-        # 如果没有找到，使用基本规则
-        logger.info(f"未找到适合{content_type}的幻灯片，使用基本规则")
-        if content_type == 'cover':
-            return 0
-        elif content_type == 'summary':
-            return len(self.prs.slides) - 1
-        else:
-            return min(1, len(self.prs.slides) - 1)
+    def _use_metadata(self, entry):
+        """使用模板存储中缓存的元数据和模板页索引"""
+        self.metadata = entry.data
+        self.slide_index = entry.slide_index
     
-    def fill_slide(self, slide, content):
+    def fill_slide(self, slide, content, shape_index=None):
         """
         填充幻灯片内容，保留原始设计和背景，智能调整模板
         
         Args:
             slide: 幻灯片对象
             content: 内容数据
+            shape_index: 该幻灯片对应模板页的形状索引，为None时现场建立
             
         Returns:
             slide: 填充后的幻灯片对象
@@ -186,85 +340,23 @@ class PPTTemplateFiller:
             slide_width = getattr(slide, 'slide_width', 9144000)  # 默认宽度值
             slide_height = getattr(slide, 'slide_height', 5143500)  # 默认高度值
             
-            # 记录所有形状，以便后续引用
+            # 形状的位置、大小和用途从索引中读取，按形状树序号取回形状对象
+            if shape_index is None:
+                shape_index = SlideShapeIndex(slide)
             all_shapes = list(slide.shapes)
-            text_shapes = [shape for shape in all_shapes if shape.has_text_frame]
-            placeholder_shapes = [shape for shape in all_shapes if hasattr(shape, 'is_placeholder') and shape.is_placeholder]
-            picture_shapes = [shape for shape in all_shapes if hasattr(shape, 'image') or (hasattr(shape, 'shape_type') and shape.shape_type == 13)]  # 13 = PICTURE
+            text_shapes = [all_shapes[info.position] for info in shape_index.text_shapes]
+            picture_infos = shape_index.pictures
             
-            logger.info(f"幻灯片包含 {len(all_shapes)} 个形状，其中 {len(text_shapes)} 个文本框，{len(placeholder_shapes)} 个占位符，{len(picture_shapes)} 个图片")
+            logger.info(f"幻灯片包含 {len(all_shapes)} 个形状，其中 {len(text_shapes)} 个文本框，{len(shape_index.placeholders)} 类占位符，{len(picture_infos)} 个图片")
             
             # 获取主题关键词，用于替换图片和相关性判断
             topic_keywords = self._extract_topic_keywords(content)
             logger.info(f"提取的主题关键词: {topic_keywords}")
             
-            # 分析文本框的位置和大小，推断其用途
-            title_shapes = []
-            subtitle_shapes = []
-            content_shapes = []
-            other_shapes = []
-            
-            # 分析文本框的位置和大小
-            for shape in text_shapes:
-                # 获取形状的位置和大小
-                top = getattr(shape, 'top', 0)
-                left = getattr(shape, 'left', 0)
-                width = getattr(shape, 'width', 0)
-                height = getattr(shape, 'height', 0)
-                
-                # 计算相对位置（百分比）
-                rel_top = top / slide_height
-                rel_left = left / slide_width
-                rel_width = width / slide_width
-                rel_height = height / slide_height
-                
-                # 判断文本框的用途
-                is_title = False
-                is_subtitle = False
-                is_content = False
-                
-                # 检查是否是标准占位符
-                if hasattr(shape, 'is_placeholder') and shape.is_placeholder:
-                    if hasattr(shape, 'placeholder_format') and hasattr(shape.placeholder_format, 'type'):
-                        if shape.placeholder_format.type == 1:  # 1 = TITLE
-                            is_title = True
-                        elif shape.placeholder_format.type == 2:  # 2 = SUBTITLE/BODY
-                            if rel_top < 0.3:  # 在上部，可能是副标题
-                                is_subtitle = True
-                            else:  # 在下部，可能是正文
-                                is_content = True
-                        elif shape.placeholder_format.type in [3, 4, 5, 6, 7]:  # 其他类型的文本占位符
-                            is_content = True
-                
-                # 如果不是标准占位符，根据位置和大小推断
-                if not (is_title or is_subtitle or is_content):
-                    # 标题通常在顶部，宽度大，高度小
-                    if rel_top < 0.2 and rel_width > 0.5:
-                        is_title = True
-                    # 副标题通常在标题下方，宽度大，高度小
-                    elif rel_top < 0.3 and rel_width > 0.4:
-                        is_subtitle = True
-                    # 内容通常占据幻灯片的主要部分
-                    elif rel_width > 0.4 and rel_height > 0.3:
-                        is_content = True
-                    # 其他情况，可能是注释、页脚等
-                    else:
-                        pass
-                
-                # 根据判断结果分类
-                if is_title:
-                    title_shapes.append(shape)
-                elif is_subtitle:
-                    subtitle_shapes.append(shape)
-                elif is_content:
-                    content_shapes.append(shape)
-                else:
-                    other_shapes.append(shape)
-            
-            # 按面积排序（从大到小）
-            title_shapes.sort(key=lambda s: getattr(s, 'width', 0) * getattr(s, 'height', 0), reverse=True)
-            subtitle_shapes.sort(key=lambda s: getattr(s, 'width', 0) * getattr(s, 'height', 0), reverse=True)
-            content_shapes.sort(key=lambda s: getattr(s, 'width', 0) * getattr(s, 'height', 0), reverse=True)
+            # 按用途分类的文本框（已按面积从大到小排序）
+            title_shapes = [all_shapes[info.position] for info in shape_index.by_role['title']]
+            subtitle_shapes = [all_shapes[info.position] for info in shape_index.by_role['subtitle']]
+            content_shapes = [all_shapes[info.position] for info in shape_index.by_role['content']]
             
             # 填充标题
             if 'title' in content and content['title']:
@@ -375,8 +467,8 @@ class PPTTemplateFiller:
             if not user_image_data and topic_keywords:
                 # 尝试获取主题相关图片
                 try:
-                    from image_service import ImageService
-                    image_service = ImageService()
+                    from image_service import get_image_service
+                    image_service = get_image_service()
                     
                     # 构建查询
                     query = " ".join(topic_keywords[:3])  # 使用前3个关键词
@@ -386,8 +478,7 @@ class PPTTemplateFiller:
                         # 尝试下载多个图片，如果第一个失败可以使用备选
                         for url in image_urls:
                             try:
-                                import requests
-                                response = requests.get(url, timeout=10)
+                                response = http_client.get(url, timeout=(http_client.CONNECT_TIMEOUT, 10))
                                 if response.status_code == 200:
                                     topic_image_data = response.content
                                     logger.info(f"获取到主题相关图片: {url}")
@@ -434,11 +525,7 @@ class PPTTemplateFiller:
             image_data = user_image_data or topic_image_data
             if image_data:
                 # 查找图片占位符
-                image_placeholder = None
-                for shape in placeholder_shapes:
-                    if hasattr(shape, 'placeholder_format') and shape.placeholder_format.type == 18:  # 18 = PICTURE
-                        image_placeholder = shape
-                        break
+                image_placeholder = shape_index.placeholder(PLACEHOLDER_PICTURE)
                 
                 # 如果找到图片占位符，填充图片
                 if image_placeholder:
@@ -454,13 +541,9 @@ class PPTTemplateFiller:
                 
                 # 如果有装饰性图片，替换它们
                 decorative_images = []
-                for shape in picture_shapes:
+                for info in picture_infos:
                     # 获取形状的位置和大小
-                    left = getattr(shape, 'left', 0)
-                    top = getattr(shape, 'top', 0)
-                    width = getattr(shape, 'width', 0)
-                    height = getattr(shape, 'height', 0)
-                    area = width * height
+                    left, top, width, height, area = info.left, info.top, info.width, info.height, info.area
                     
                     # 计算相对位置（百分比）
                     rel_top = top / slide_height
@@ -473,7 +556,7 @@ class PPTTemplateFiller:
                     is_decorative = is_decorative or (rel_left < 0.1 or rel_left > 0.9 or rel_top < 0.1 or rel_top > 0.9)  # 边缘图片
                     
                     if is_decorative:
-                        decorative_images.append((shape, left, top, width, height, area))
+                        decorative_images.append((info, left, top, width, height, area))
                 
                 # 如果找到装饰性图片，替换第一个
                 if decorative_images:
@@ -481,7 +564,7 @@ class PPTTemplateFiller:
                     decorative_images.sort(key=lambda x: x[5])
                     
                     # 替换最小的装饰性图片
-                    shape, left, top, width, height, _ = decorative_images[0]
+                    _, left, top, width, height, _ = decorative_images[0]
                     try:
                         # 添加新图片到相同位置
                         slide.shapes.add_picture(BytesIO(image_data), left, top, width, height)
@@ -509,11 +592,7 @@ class PPTTemplateFiller:
                 table_data = content['table']
                 
                 # 查找表格占位符
-                table_shape = None
-                for shape in placeholder_shapes:
-                    if hasattr(shape, 'placeholder_format') and shape.placeholder_format.type == 12:  # 12 = TABLE
-                        table_shape = shape
-                        break
+                table_shape = shape_index.placeholder(PLACEHOLDER_TABLE)
                 
                 # 如果找到表格占位符，填充表格
                 if table_shape:
@@ -588,7 +667,7 @@ class PPTTemplateFiller:
                 unused_text_shapes.remove(footer_shape)
             
             # 最后一步：优化文本布局，处理重复内容和排版问题
-            self._optimize_text_layout(slide, content)
+            self._optimize_text_layout(slide, content, shape_index)
             
             return slide
         except Exception as e:
@@ -632,7 +711,7 @@ class PPTTemplateFiller:
         
         return keywords
             
-    def _replace_placeholder_texts(self, slide, content, topic_keywords):
+    def _replace_placeholder_texts(self, slide, content, topic_keywords, shape_index=None):
         """
         替换幻灯片中的占位符文本，删除无关文本和重复内容
         
@@ -640,6 +719,7 @@ class PPTTemplateFiller:
             slide: 幻灯片对象
             content: 内容数据
             topic_keywords: 主题关键词
+            shape_index: 该幻灯片对应模板页的形状索引，为None时现场建立
         """
         try:
             if slide is None:
@@ -671,85 +751,19 @@ class PPTTemplateFiller:
             filled_title = False
             filled_subtitle = False
             
-            # 收集所有文本形状，以便后续处理
-            text_shapes = []
-            title_shapes = []
-            subtitle_shapes = []
-            content_shapes = []
-            other_shapes = []
+            # 收集有文字的文本形状，用途从形状索引中读取（组内已按面积从大到小排序）
+            if shape_index is None:
+                shape_index = SlideShapeIndex(slide)
+            all_shapes = list(slide.shapes)
             
-            for shape in slide.shapes:
-                if not shape.has_text_frame:
-                    continue
-                    
-                text_frame = shape.text_frame
-                if not text_frame.text:
-                    continue
-                
-                original_text = text_frame.text.strip()
-                shape_top = getattr(shape, 'top', 0)
-                shape_left = getattr(shape, 'left', 0)
-                width = getattr(shape, 'width', 0)
-                height = getattr(shape, 'height', 0)
-                
-                # 计算相对位置（百分比）
-                slide_width = getattr(slide, 'slide_width', 9144000)  # 默认宽度值
-                slide_height = getattr(slide, 'slide_height', 5143500)  # 默认高度值
-                rel_top = shape_top / slide_height
-                rel_left = shape_left / slide_width
-                rel_width = width / slide_width
-                rel_height = height / slide_height
-                
-                # 判断文本框的用途
-                is_title = False
-                is_subtitle = False
-                is_content = False
-                
-                # 检查是否是标准占位符
-                if hasattr(shape, 'is_placeholder') and shape.is_placeholder:
-                    if hasattr(shape, 'placeholder_format') and hasattr(shape.placeholder_format, 'type'):
-                        if shape.placeholder_format.type == 1:  # 1 = TITLE
-                            is_title = True
-                        elif shape.placeholder_format.type == 2:  # 2 = SUBTITLE/BODY
-                            if rel_top < 0.3:  # 在上部，可能是副标题
-                                is_subtitle = True
-                            else:  # 在下部，可能是正文
-                                is_content = True
-                        elif shape.placeholder_format.type in [3, 4, 5, 6, 7]:  # 其他类型的文本占位符
-                            is_content = True
-                
-                # 如果不是标准占位符，根据位置和大小推断
-                if not (is_title or is_subtitle or is_content):
-                    # 标题通常在顶部，宽度大，高度小
-                    if rel_top < 0.2 and rel_width > 0.5:
-                        is_title = True
-                    # 副标题通常在标题下方，宽度大，高度小
-                    elif rel_top < 0.3 and rel_width > 0.4:
-                        is_subtitle = True
-                    # 内容通常占据幻灯片的主要部分
-                    elif rel_width > 0.4 and rel_height > 0.3:
-                        is_content = True
-                    # 其他情况，可能是注释、页脚等
-                    else:
-                        pass
-                
-                # 根据判断结果分类
-                if is_title:
-                    title_shapes.append(shape)
-                elif is_subtitle:
-                    subtitle_shapes.append(shape)
-                elif is_content:
-                    content_shapes.append(shape)
-                else:
-                    other_shapes.append(shape)
-                
-                # 添加到所有文本形状列表
-                text_shapes.append(shape)
-                
-            # 按面积排序（从大到小）
-            title_shapes.sort(key=lambda s: getattr(s, 'width', 0) * getattr(s, 'height', 0), reverse=True)
-            subtitle_shapes.sort(key=lambda s: getattr(s, 'width', 0) * getattr(s, 'height', 0), reverse=True)
-            content_shapes.sort(key=lambda s: getattr(s, 'width', 0) * getattr(s, 'height', 0), reverse=True)
+            def shapes_with_text(infos):
+                shapes = [all_shapes[info.position] for info in infos]
+                return [shape for shape in shapes if shape.text_frame.text]
+            
+            text_shapes = shapes_with_text(shape_index.text_shapes)
+            title_shapes = shapes_with_text(shape_index.by_role['title'])
+            subtitle_shapes = shapes_with_text(shape_index.by_role['subtitle'])
+            content_shapes = shapes_with_text(shape_index.by_role['content'])
             
             # 不再需要按垂直位置排序，因为我们已经按类型分类了文本框
             
@@ -816,23 +830,10 @@ class PPTTemplateFiller:
         Returns:
             相似度分数，范围0-1
         """
-        # 简单实现，基于共同单词的比例
-        if not text1 or not text2:
-            return 0
-            
-        # 转换为小写并分词
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        
-        # 计算交集大小
-        common_words = words1.intersection(words2)
-        
-        # 计算相似度分数
-        similarity = len(common_words) / max(len(words1), len(words2))
-        
-        return similarity
+        # 基于共同词的比例，使用共享的中文分词
+        return text_similarity(text1, text2)
     
-    def _process_images(self, slide, content, topic_keywords):
+    def _process_images(self, slide, content, topic_keywords, shape_index=None):
         """
         处理幻灯片中的图片，替换不相关的装饰性图片为主题相关图片
         
@@ -840,6 +841,7 @@ class PPTTemplateFiller:
             slide: 幻灯片对象
             content: 内容数据
             topic_keywords: 主题关键词
+            shape_index: 该幻灯片对应模板页的形状索引，为None时现场建立
         """
         try:
             if slide is None:
@@ -849,39 +851,24 @@ class PPTTemplateFiller:
             # 获取幻灯片尺寸信息，避免属性不存在
             slide_width = getattr(slide, 'slide_width', 9144000)  # 默认宽度值
             slide_height = getattr(slide, 'slide_height', 5143500)  # 默认高度值
+            
+            if shape_index is None:
+                shape_index = SlideShapeIndex(slide)
                 
             # 如果用户指定了图片，优先使用用户提供的图片
             if 'image' in content and content['image']:
                 user_image_data = get_image_for_slide(content)
                 if user_image_data:
                     # 查找图片占位符或位置适合的现有图片
-                    image_shapes = []
-                    for shape in slide.shapes:
-                        # 检查是否是图片
-                        is_picture = (hasattr(shape, 'image') or 
-                                    (hasattr(shape, 'shape_type') and shape.shape_type == 13))  # 13 = PICTURE
-                        if is_picture:
-                            image_shapes.append((shape, shape.left, shape.top, shape.width, shape.height))
+                    image_shapes = list(shape_index.pictures)
                     
                     if image_shapes:
-                        # 优先使用中央或较大的图片位置
-                        slide_center_x = slide_width / 2
-                        slide_center_y = slide_height / 2
-                        
-                        # 计算每个图片到中心的距离以及图片大小
-                        for i, (shape, left, top, width, height) in enumerate(image_shapes):
-                            center_x = left + width/2
-                            center_y = top + height/2
-                            distance = ((center_x - slide_center_x) ** 2 + (center_y - slide_center_y) ** 2) ** 0.5
-                            area = width * height
-                            image_shapes[i] = (shape, left, top, width, height, distance, area)
-                        
-                        # 根据距离和大小排序，优先选择距离近且较大的图片
-                        image_shapes.sort(key=lambda x: (x[5], -x[6]))
+                        # 根据到中心的距离和大小排序，优先选择距离近且较大的图片
+                        image_shapes.sort(key=lambda info: (info.center_distance, -info.area))
                         
                         # 使用最合适的位置
                         best_shape = image_shapes[0]
-                        shape, left, top, width, height = best_shape[:5]
+                        left, top, width, height = best_shape.left, best_shape.top, best_shape.width, best_shape.height
                         
                         # 添加新图片
                         slide.shapes.add_picture(BytesIO(user_image_data), left, top, width, height)
@@ -934,16 +921,15 @@ class PPTTemplateFiller:
                 
                 # 尝试获取主题相关图片
                 try:
-                    from image_service import ImageService
-                    image_service = ImageService()
+                    from image_service import get_image_service
+                    image_service = get_image_service()
                     image_urls = image_service.search_image(query, max_results=3)
                     
                     if image_urls and len(image_urls) > 0:
                         # 尝试下载多个图片，如果第一个失败可以使用备选
                         for url in image_urls:
                             try:
-                                import requests
-                                response = requests.get(url, timeout=10)
+                                response = http_client.get(url, timeout=(http_client.CONNECT_TIMEOUT, 10))
                                 if response.status_code == 200:
                                     topic_image_data = response.content
                                     logger.info(f"获取到主题相关图片: {url}")
@@ -995,20 +981,9 @@ class PPTTemplateFiller:
             decorative_images = []  # 装饰性图片
             content_images = []     # 内容相关图片
             
-            for shape in slide.shapes:
-                # 检查是否是图片
-                is_picture = (hasattr(shape, 'image') or 
-                             (hasattr(shape, 'shape_type') and shape.shape_type == 13))  # 13 = PICTURE
-                
-                if not is_picture:
-                    continue
-                    
+            for info in shape_index.pictures:
                 # 记录图片位置和大小
-                left = getattr(shape, 'left', 0)
-                top = getattr(shape, 'top', 0)
-                width = getattr(shape, 'width', 0) 
-                height = getattr(shape, 'height', 0)
-                area = width * height
+                left, top, width, height, area = info.left, info.top, info.width, info.height, info.area
                 
                 # 尝试判断图片是否为装饰性的
                 # 1. 位于边缘的小图片更可能是装饰性的
@@ -1027,10 +1002,10 @@ class PPTTemplateFiller:
                 # 根据特征判断图片类型
                 if (is_at_edge and is_small) or (is_small and has_unusual_ratio):
                     # 可能是装饰性图片
-                    decorative_images.append((shape, left, top, width, height, area))
+                    decorative_images.append((info, left, top, width, height, area))
                 else:
                     # 可能是内容相关图片
-                    content_images.append((shape, left, top, width, height, area))
+                    content_images.append((info, left, top, width, height, area))
             
             # 决定替换哪些图片
             images_to_replace = []
@@ -1049,7 +1024,7 @@ class PPTTemplateFiller:
             
             # 如果找到了需要替换的图片，替换第一个
             if images_to_replace:
-                shape, left, top, width, height, _ = images_to_replace[0]
+                _, left, top, width, height, _ = images_to_replace[0]
                 
                 try:
                     # 添加新图片到相同位置
@@ -1064,13 +1039,14 @@ class PPTTemplateFiller:
             logger.error(f"处理图片失败: {str(e)}")
             logger.error(traceback.format_exc())
     
-    def _optimize_text_layout(self, slide, content):
+    def _optimize_text_layout(self, slide, content, shape_index=None):
         """
         优化幻灯片中文本框的排版，处理重叠文本和排版问题
         
         Args:
             slide: 幻灯片对象
             content: 内容数据
+            shape_index: 该幻灯片对应模板页的形状索引，为None时现场建立
         """
         try:
             if slide is None:
@@ -1081,27 +1057,32 @@ class PPTTemplateFiller:
             slide_width = getattr(slide, 'slide_width', 9144000)  # 默认宽度值
             slide_height = getattr(slide, 'slide_height', 5143500)  # 默认高度值
             
-            # 收集所有文本形状
+            # 收集所有有文字的文本形状，位置信息从形状索引中读取
+            if shape_index is None:
+                shape_index = SlideShapeIndex(slide)
+            all_shapes = list(slide.shapes)
             text_shapes = []
-            for shape in slide.shapes:
-                if not shape.has_text_frame or not shape.text_frame.text:
+            for info in shape_index.text_shapes:
+                shape = all_shapes[info.position]
+                if not shape.text_frame.text:
                     continue
                 
                 # 记录文本形状及其位置信息
                 text_shapes.append({
                     'shape': shape,
                     'text': shape.text_frame.text.strip(),
-                    'top': getattr(shape, 'top', 0),
-                    'left': getattr(shape, 'left', 0),
-                    'width': getattr(shape, 'width', 0),
-                    'height': getattr(shape, 'height', 0),
-                    'area': getattr(shape, 'width', 0) * getattr(shape, 'height', 0),
-                    'is_title': getattr(shape, 'top', 0) < slide_height / 4,  # 顶部1/4区域视为标题区
-                    'is_right_side': getattr(shape, 'left', 0) > slide_width / 2  # 右半部分
+                    'top': info.top,
+                    'left': info.left,
+                    'width': info.width,
+                    'height': info.height,
+                    'area': info.area,
+                    'is_title': info.top < slide_height / 4,  # 顶部1/4区域视为标题区
+                    'is_right_side': info.left > slide_width / 2  # 右半部分
                 })
             
-            # 如果文本框太少，不需要优化
+            # 如果文本框太少，不需要处理重复文本，只检查文字是否放得下
             if len(text_shapes) <= 1:
+                self._fit_text_sizes(text_shapes)
                 return
             
             # 特殊处理：检查右侧区域是否有重复的标题文本
@@ -1227,35 +1208,46 @@ class PPTTemplateFiller:
                         if len(shape_info['text']) <= len(content['title']) * 1.2:
                             shape_info['shape'].text_frame.text = ""
                             logger.info(f"删除内容区域的重复标题: {shape_info['text'][:30]}...")
+            
+            # 最后缩小放不下的文字
+            self._fit_text_sizes(text_shapes)
         
         except Exception as e:
             logger.error(f"优化文本布局失败: {str(e)}")
             logger.error(traceback.format_exc())
     
-    def _clear_template_content(self, slide):
+    def _fit_text_sizes(self, text_shapes):
+        """
+        按文本框尺寸批量求出能放下文字的最大字号，缩小溢出的文字
+        
+        Args:
+            text_shapes: _optimize_text_layout收集的文本形状信息列表
+        """
+        remaining = [s for s in text_shapes if s['shape'].text_frame.text]
+        shrunk = shrink_text_to_fit([s['shape'] for s in remaining],
+                                    [(s['width'], s['height']) for s in remaining])
+        if shrunk:
+            logger.info(f"缩小了 {shrunk} 个文本框的字号以放下文字")
+    
+    def _clear_template_content(self, slide, shape_index=None):
         """
         清空模板中的所有文本内容，保留结构和设计元素
         
         Args:
             slide: 幻灯片对象
+            shape_index: 该幻灯片对应模板页的形状索引，为None时现场建立
         """
         try:
             if slide is None:
                 logger.warning("slide对象为None，无法清空内容")
                 return
                 
-            # 收集需要保留的形状类型
-            shapes_to_keep = []
-            shapes_to_clear = []
-            
-            for shape in slide.shapes:
-                # 检查是否是文本框
-                if shape.has_text_frame:
-                    # 保存原始形状，但清空文本
-                    shapes_to_clear.append(shape)
-                else:
-                    # 非文本形状（如图片、形状等）保留
-                    shapes_to_keep.append(shape)
+            # 文本框清空文字，非文本形状（如图片、形状等）保留
+            if shape_index is None:
+                shape_index = SlideShapeIndex(slide)
+            all_shapes = list(slide.shapes)
+            shapes_to_clear = [all_shapes[info.position] for info in shape_index.text_shapes]
+            shapes_to_keep_count = len(all_shapes) - len(shapes_to_clear)
             
             # 清空所有文本框的内容
             for shape in shapes_to_clear:
@@ -1276,12 +1268,39 @@ class PPTTemplateFiller:
                 except Exception as e:
                     logger.error(f"清空文本框失败: {str(e)}")
             
-            logger.info(f"已清空模板内容: {len(shapes_to_clear)}个文本框已清空，保留{len(shapes_to_keep)}个非文本元素")
+            logger.info(f"已清空模板内容: {len(shapes_to_clear)}个文本框已清空，保留{shapes_to_keep_count}个非文本元素")
             
         except Exception as e:
             logger.error(f"清空模板内容失败: {str(e)}")
             logger.error(traceback.format_exc())
 
+    def _determine_content_type(self, index, slide_data, total):
+        """
+        确定大纲条目的内容类型
+        
+        Args:
+            index: 条目序号
+            slide_data: 幻灯片数据
+            total: 条目总数
+            
+        Returns:
+            内容类型（cover, content, keypoints, image, table, summary）
+        """
+        slide_type = slide_data.get('type', '').lower()
+        slide_layout = slide_data.get('layout', '').lower()
+        
+        if index == 0 or slide_type == 'cover' or slide_layout == 'cover':
+            return 'cover'
+        elif index == total - 1 or slide_type == 'summary' or slide_type == 'conclusion' or slide_layout == 'summary':
+            return 'summary'
+        elif 'keypoints' in slide_data and slide_data['keypoints']:
+            return 'keypoints'
+        elif 'table' in slide_data and slide_data['table']:
+            return 'table'
+        elif 'image' in slide_data and slide_data['image'] or slide_layout == 'image':
+            return 'image'
+        return 'content'
+
     def create_ppt(self, slides_data, output_path):
         """
         创建PPT
@@ -1309,9 +1328,9 @@ class PPTTemplateFiller:
                 logger.error("模板未成功加载，无法创建PPT")
                 return False
                 
-            # 直接使用模板文件作为基础，而不是创建新的演示文稿
+            # 直接使用模板作为基础，从内存中的模板字节生成独立副本
             try:
-                output_prs = Presentation(self.template_path)
+                output_prs = self.template.open()
             except Exception as e:
                 logger.error(f"加载模板失败: {str(e)}")
                 return False
@@ -1337,38 +1356,20 @@ class PPTTemplateFiller:
                 logger.error(f"获取幻灯片数量失败: {str(e)}")
                 return False
             
-            # 如果内容页数超过模板页数，需要复制模板页来扩展
-            if len(slides_data) > template_slides_count:
-                logger.info(f"内容页数({len(slides_data)})超过模板页数({template_slides_count})，需要复制模板页")
-                try:
-                    # 保留原始幻灯片，以便后续复制
-                    original_slides = list(output_prs.slides)
-                    
-                    # 需要添加的幻灯片数量
-                    slides_to_add = len(slides_data) - template_slides_count
-                    
-                    # 复制模板中的幻灯片来扩展
-                    for i in range(slides_to_add):
-                        # 选择一个合适的模板页进行复制（这里简单地循环使用模板页）
-                        template_index = (i % (template_slides_count - 2)) + 1  # 跳过首尾页
-                        if template_index < 0 or template_index >= len(original_slides):
-                            template_index = 0  # 默认使用第一页
-                            
-                        template_slide = original_slides[template_index]
-                        
-                        # 复制幻灯片
-                        slide_layout = template_slide.slide_layout
-                        output_prs.slides.add_slide(slide_layout)
-                        
-                        logger.info(f"复制了模板幻灯片 {template_index} 作为新的幻灯片")
-                except Exception as e:
-                    logger.error(f"复制幻灯片失败: {str(e)}")
-                    # 继续处理，使用已有的幻灯片
-            
-            # 首先清空所有幻灯片的内容
-            logger.info("开始清空模板中的所有文本内容")
-            for i, slide in enumerate(output_prs.slides):
-                self._clear_template_content(slide)
+            # 为每个大纲条目分配模板页：重复使用的页复制，未使用的页删除
+            content_types = [self._determine_content_type(i, slide_data, len(slides_data))
+                             for i, slide_data in enumerate(slides_data)]
+            shape_indexes = None
+            try:
+                plan = plan_slide_assignment(content_types, self.slide_index, template_slides_count)
+                logger.info(f"模板页分配: {plan}")
+                assemble_slides(output_prs, plan)
+                # 每张幻灯片都是某个模板页的副本，直接使用模板缓存的形状索引
+                shape_indexes = [self.template.shape_indexes[j] for j in plan]
+            except Exception as e:
+                logger.error(f"分配模板页失败: {str(e)}")
+                logger.error(traceback.format_exc())
+                # 继续处理，按顺序使用已有的幻灯片
             
             # 填充内容到幻灯片
             try:
@@ -1378,32 +1379,15 @@ class PPTTemplateFiller:
                         logger.warning(f"内容页数超出，跳过第 {i+1} 页")
                         continue
                         
-                    logger.info(f"处理第 {i+1} 张幻灯片")
-                    
-                    # 获取幻灯片类型和布局
-                    slide_type = slide_data.get('type', '').lower()
-                    slide_layout = slide_data.get('layout', '').lower()
-                    
-                    # 确定内容类型
-                    content_type = 'content'  # 默认类型
-                    if i == 0 or slide_type == 'cover' or slide_layout == 'cover':
-                        content_type = 'cover'
-                    elif i == len(slides_data) - 1 or slide_type == 'summary' or slide_type == 'conclusion' or slide_layout == 'summary':
-                        content_type = 'summary'
-                    elif 'keypoints' in slide_data and slide_data['keypoints']:
-                        content_type = 'keypoints'
-                    elif 'table' in slide_data and slide_data['table']:
-                        content_type = 'table'
-                    elif 'image' in slide_data and slide_data['image'] or slide_layout == 'image':
-                        content_type = 'image'
-                    
-                    logger.info(f"  内容类型: {content_type}")
+                    logger.info(f"处理第 {i+1} 张幻灯片，内容类型: {content_types[i]}")
                     
-                    # 获取当前幻灯片
+                    # 获取当前幻灯片并清空模板文字
                     slide = output_prs.slides[i]
+                    shape_index = shape_indexes[i] if shape_indexes else SlideShapeIndex(slide)
+                    self._clear_template_content(slide, shape_index)
                     
                     # 填充内容到幻灯片，保留原有背景和设计元素
-                    self.fill_slide(slide, slide_data)
+                    self.fill_slide(slide, slide_data, shape_index)
             except Exception as e:
                 logger.error(f"填充幻灯片内容失败: {str(e)}")
                 logger.error(traceback.format_exc())
@@ -229,8 +229,8 @@ class BackgroundStyleComponent(SlideComponentBase):
                     image_data = f.read()
             elif image_path.startswith('http'):
                 # 从URL下载
-                import requests
-                response = requests.get(image_path)
+                import http_client
+                response = http_client.get(image_path, timeout=(http_client.CONNECT_TIMEOUT, 10))
                 response.raise_for_status()
                 image_data = response.content
                 
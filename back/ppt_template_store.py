@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+"""
+PPT模板存储
+进程内共享的模板缓存：模板文件字节和元数据（及其派生的索引）只在文件变化时读取解析一次，
+每次请求从内存中的字节生成新的Presentation，不再重复读盘。
+"""
+
+import os
+import json
+import logging
+import threading
+from io import BytesIO
+from pptx import Presentation
+
+# 设置日志
+logger = logging.getLogger("ppt_template_store")
+
+# python-pptx的Slide对象没有尺寸属性，填充器一直按以下默认尺寸计算相对位置
+DEFAULT_SLIDE_WIDTH = 9144000
+DEFAULT_SLIDE_HEIGHT = 5143500
+
+# 占位符类型
+PLACEHOLDER_TITLE = 1
+PLACEHOLDER_BODY = 2
+PLACEHOLDER_TABLE = 12
+PLACEHOLDER_PICTURE = 18
+
+
+def _file_signature(path):
+    """文件的修改时间和大小，文件被替换或修改时变化"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class ShapeInfo:
+    """模板页中一个形状的静态信息：角色、位置大小、面积、到中心的距离和模板文字长度"""
+
+    __slots__ = ('position', 'shape_id', 'role', 'placeholder_type', 'has_text_frame', 'is_picture',
+                 'left', 'top', 'width', 'height', 'area', 'center_distance', 'text_length')
+
+    def __init__(self, position, shape, slide_width, slide_height):
+        """
+        Args:
+            position: 形状在形状树中的序号
+            shape: 形状对象
+            slide_width: 幻灯片宽度
+            slide_height: 幻灯片高度
+        """
+        self.position = position
+        self.shape_id = shape.shape_id
+        self.has_text_frame = shape.has_text_frame
+        self.is_picture = hasattr(shape, 'image') or getattr(shape, 'shape_type', None) == 13  # 13 = PICTURE
+        self.placeholder_type = None
+        if getattr(shape, 'is_placeholder', False):
+            try:
+                self.placeholder_type = shape.placeholder_format.type
+            except Exception:
+                pass
+
+        self.left = getattr(shape, 'left', 0) or 0
+        self.top = getattr(shape, 'top', 0) or 0
+        self.width = getattr(shape, 'width', 0) or 0
+        self.height = getattr(shape, 'height', 0) or 0
+        self.area = self.width * self.height
+        center_x = self.left + self.width / 2
+        center_y = self.top + self.height / 2
+        self.center_distance = ((center_x - slide_width / 2) ** 2 + (center_y - slide_height / 2) ** 2) ** 0.5
+        self.text_length = len(shape.text_frame.text.strip()) if self.has_text_frame else 0
+        self.role = self._classify(slide_width, slide_height) if self.has_text_frame else None
+
+    def _classify(self, slide_width, slide_height):
+        """推断文本框的用途：title、subtitle、content或other"""
+        rel_top = self.top / slide_height
+        rel_width = self.width / slide_width
+        rel_height = self.height / slide_height
+
+        # 标准占位符
+        if self.placeholder_type == PLACEHOLDER_TITLE:
+            return 'title'
+        if self.placeholder_type == PLACEHOLDER_BODY:
+            return 'subtitle' if rel_top < 0.3 else 'content'
+        if self.placeholder_type in (3, 4, 5, 6, 7):  # 其他类型的文本占位符
+            return 'content'
+
+        # 根据位置和大小推断
+        if rel_top < 0.2 and rel_width > 0.5:
+            return 'title'
+        if rel_top < 0.3 and rel_width > 0.4:
+            return 'subtitle'
+        if rel_width > 0.4 and rel_height > 0.3:
+            return 'content'
+        return 'other'
+
+
+class SlideShapeIndex:
+    """
+    一张模板页的形状索引
+
+    按形状树顺序记录每个形状的ShapeInfo，并按角色分组（组内按面积从大到小），
+    填充时用position从list(slide.shapes)中取回对应形状，不再重复计算几何和分类。
+    模板页的副本（包括复制出的幻灯片）形状顺序相同，可以共用同一个索引。
+    """
+
+    def __init__(self, slide, slide_width=DEFAULT_SLIDE_WIDTH, slide_height=DEFAULT_SLIDE_HEIGHT):
+        """
+        Args:
+            slide: 幻灯片对象
+            slide_width: 计算相对位置使用的幻灯片宽度
+            slide_height: 计算相对位置使用的幻灯片高度
+        """
+        self.slide_width = slide_width
+        self.slide_height = slide_height
+        self.shapes = [ShapeInfo(i, shape, slide_width, slide_height) for i, shape in enumerate(slide.shapes)]
+        self.text_shapes = [info for info in self.shapes if info.has_text_frame]
+        self.pictures = [info for info in self.shapes if info.is_picture]
+
+        self.by_role = {'title': [], 'subtitle': [], 'content': [], 'other': []}
+        for info in self.text_shapes:
+            self.by_role[info.role].append(info)
+        for infos in self.by_role.values():
+            infos.sort(key=lambda info: info.area, reverse=True)
+
+        self.placeholders = {}
+        for info in self.shapes:
+            if info.placeholder_type is not None:
+                self.placeholders.setdefault(info.placeholder_type, info)
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def title_box(self):
+        """最大的标题文本框，没有则返回None"""
+        titles = self.by_role['title']
+        return titles[0] if titles else None
+
+    def placeholder(self, placeholder_type):
+        """指定类型的第一个占位符，没有则返回None"""
+        return self.placeholders.get(placeholder_type)
+
+    def largest_image_slot(self):
+        """面积最大的图片，没有则返回None"""
+        return max(self.pictures, key=lambda info: info.area, default=None)
+
+
+class TemplateEntry:
+    """一个PPT模板的内存副本"""
+
+    def __init__(self, path, signature, data):
+        """
+        Args:
+            path: 模板文件路径
+            signature: 读取时的文件签名
+            data: 模板文件字节
+        """
+        self.path = path
+        self.signature = signature
+        self.data = data
+        # 解析一次供只读查询（幻灯片数量等），填充时请使用open()获取独立副本
+        self.presentation = Presentation(BytesIO(data))
+        self.slide_count = len(self.presentation.slides)
+        # 每张模板页的形状索引，与模板一起缓存
+        self.shape_indexes = [SlideShapeIndex(slide) for slide in self.presentation.slides]
+
+    def open(self):
+        """从内存字节生成一个新的Presentation，调用方可以任意修改"""
+        return Presentation(BytesIO(self.data))
+
+
+def build_slide_index(metadata):
+    """
+    按元数据中的suitable_for建立索引
+    
+    Args:
+        metadata: 模板元数据
+        
+    Returns:
+        字典，内容类型 -> 模板页索引列表
+    """
+    slide_index = {}
+    if metadata:
+        for i, slide_info in enumerate(metadata.get('slides', [])):
+            for content_type in slide_info.get('suitable_for') or []:
+                slide_index.setdefault(content_type, []).append(i)
+    return slide_index
+
+
+class MetadataEntry:
+    """一个模板元数据文件的解析结果"""
+
+    def __init__(self, path, signature, data):
+        """
+        Args:
+            path: 元数据文件路径
+            signature: 读取时的文件签名
+            data: 解析后的元数据字典
+        """
+        self.path = path
+        self.signature = signature
+        self.data = data
+        # 按内容类型索引模板页，与元数据一起缓存
+        self.slide_index = build_slide_index(data)
+
+
+class TemplateStore:
+    """
+    按路径和修改时间缓存PPT模板和元数据
+
+    模板文件保存原始字节，元数据保存解析后的字典；文件修改后下次访问自动重新加载。
+    返回的元数据字典在请求之间共享，调用方不应修改。
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._metadata = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_template(self, template_path):
+        """
+        获取模板的内存副本
+
+        Args:
+            template_path: 模板文件路径
+
+        Returns:
+            TemplateEntry对象
+        """
+        key = os.path.abspath(template_path)
+        signature = _file_signature(key)
+        entry = self._templates.get(key)
+        if entry is not None and entry.signature == signature:
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            entry = self._templates.get(key)
+            if entry is None or entry.signature != signature:
+                with open(key, 'rb') as f:
+                    data = f.read()
+                entry = TemplateEntry(key, signature, data)
+                self._templates[key] = entry
+                self.misses += 1
+                logger.info(f"模板已载入内存: {key}，{entry.slide_count}张幻灯片，{len(data)}字节")
+            else:
+                self.hits += 1
+        return entry
+
+    def get_metadata(self, metadata_path):
+        """
+        获取解析后的模板元数据
+
+        Args:
+            metadata_path: 元数据JSON文件路径
+
+        Returns:
+            元数据字典（共享，只读）
+        """
+        return self.get_metadata_entry(metadata_path).data
+
+    def get_metadata_entry(self, metadata_path):
+        """
+        获取模板元数据及其按内容类型的模板页索引
+
+        Args:
+            metadata_path: 元数据JSON文件路径
+
+        Returns:
+            MetadataEntry对象（共享，只读）
+        """
+        key = os.path.abspath(metadata_path)
+        signature = _file_signature(key)
+        entry = self._metadata.get(key)
+        if entry is not None and entry.signature == signature:
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            entry = self._metadata.get(key)
+            if entry is None or entry.signature != signature:
+                with open(key, 'r', encoding='utf-8') as f:
+                    entry = MetadataEntry(key, signature, json.load(f))
+                self._metadata[key] = entry
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def stats(self):
+        """返回缓存统计信息"""
+        return {
+            "templates": len(self._templates),
+            "metadata": len(self._metadata),
+            "bytes": sum(len(entry.data) for entry in list(self._templates.values())),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# 单例实例
+_template_store_instance = None
+_template_store_lock = threading.Lock()
+
+def get_template_store():
+    """获取PPT模板存储的单例实例"""
+    global _template_store_instance
+    if _template_store_instance is None:
+        with _template_store_lock:
+            if _template_store_instance is None:
+                _template_store_instance = TemplateStore()
+    return _template_store_instance
@@ -12,10 +12,11 @@ import traceback
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
-from pptx.enum.text import PP_ALIGN
+from pptx.enum.text import PP_ALIGN, MSO_AUTO_SIZE
 from io import BytesIO
-import requests
+import http_client
 from image_service import get_image_for_slide
+from text_fit import shrink_text_to_fit  # 按字形宽度缩小放不下的文字
 import tempfile
 import re
 import base64
@@ -196,6 +197,9 @@ def create_image_slide(prs, slide_data):
     
     txBox = slide.shapes.add_textbox(left, top, width, height)
     tf = txBox.text_frame
+    # 固定文本框大小并自动换行，放不下时由文本适配缩小字号
+    tf.word_wrap = True
+    tf.auto_size = MSO_AUTO_SIZE.NONE
     tf.text = slide_data.get('content', '')
     
     # 设置内容格式
@@ -261,7 +265,7 @@ def create_image_slide(prs, slide_data):
                         
                 elif image_source.startswith(('http://', 'https://')):
                     # 网络URL，下载图片
-                    response = requests.get(image_source, timeout=10)
+                    response = http_client.get(image_source, timeout=(http_client.CONNECT_TIMEOUT, 10))
                     response.raise_for_status()
                     slide.shapes.add_picture(BytesIO(response.content), left, top, width, height)
                     
@@ -341,6 +345,9 @@ def create_table_slide(prs, slide_data):
     
     txBox = slide.shapes.add_textbox(left, top, width, height)
     tf = txBox.text_frame
+    # 固定文本框大小并自动换行，放不下时由文本适配缩小字号
+    tf.word_wrap = True
+    tf.auto_size = MSO_AUTO_SIZE.NONE
     tf.text = slide_data.get('content', '')
     
     # 设置内容格式
@@ -432,6 +439,9 @@ def create_summary_slide(prs, slide_data):
     
     txBox = slide.shapes.add_textbox(left, top, width, height)
     tf = txBox.text_frame
+    # 固定文本框大小并自动换行，放不下时由文本适配缩小字号
+    tf.word_wrap = True
+    tf.auto_size = MSO_AUTO_SIZE.NONE
     tf.text = slide_data.get('content', '')
     
     # 设置内容格式
@@ -451,6 +461,8 @@ def create_summary_slide(prs, slide_data):
         
         txBox = slide.shapes.add_textbox(left, top, width, height)
         tf = txBox.text_frame
+        tf.word_wrap = True
+        tf.auto_size = MSO_AUTO_SIZE.NONE
         
         for i, point in enumerate(keypoints):
             if i == 0:
@@ -538,6 +550,10 @@ def generate_ppt_without_template(slides_data, output_path):
                 logger.info(f"创建内容页(默认): {slide_data.get('title', '未命名')}")
                 create_content_slide(prs, slide_data)
         
+        # 按文本框尺寸缩小放不下的文字（每页的文本框一起求解）
+        for slide in prs.slides:
+            shrink_text_to_fit([shape for shape in slide.shapes if shape.has_text_frame])
+        
         # 保存演示文稿
         logger.info(f"保存PPT到: {output_path}")
         prs.save(output_path)
@@ -5,6 +5,7 @@ import traceback
 from datetime import datetime
 import json
 import requests
+import http_client
 import base64
 
 # 配置日志
@@ -106,7 +107,7 @@ class SpeechRecognitionService:
             
             # 发送请求获取token
             try:
-                response = requests.post(token_url, params=params, timeout=15)
+                response = http_client.post(token_url, params=params, timeout=(http_client.CONNECT_TIMEOUT, 15), idempotent=True)
                 logger.info(f"百度API响应状态码: {response.status_code}")
                 logger.info(f"百度API响应内容: {response.text}")
             except requests.exceptions.Timeout:
@@ -264,7 +265,7 @@ class SpeechRecognitionService:
             logger.info(f"请求头: {headers}")
             logger.info(f"请求参数: {{部分敏感信息已隐藏}}")
             
-            response = requests.post(api_url, headers=headers, data=payload, timeout=15)
+            response = http_client.post(api_url, headers=headers, data=payload, timeout=(http_client.CONNECT_TIMEOUT, 15))
             
             logger.info(f"语音识别API响应状态码: {response.status_code}")
             
@@ -213,6 +213,135 @@ def test_app_ppt_generation():
         logger.error(traceback.format_exc())
         return False
 
+def test_slide_assignment_order():
+    """测试模板页分配：同一类型的条目按模板页的原有顺序使用页面"""
+    logger.info("=== 测试模板页分配顺序 ===")
+    
+    try:
+        from ppt_fill_template import plan_slide_assignment
+        
+        content_types = ['cover'] + ['content'] * 4 + ['summary']
+        plan = plan_slide_assignment(content_types, {'cover': [0], 'summary': [9]}, 10)
+        logger.info(f"分配结果: {plan}")
+        
+        # 第一次使用的页面应按升序排列，复制出的页面也按升序循环
+        middle = plan[1:-1]
+        if plan[0] == 0 and plan[-1] == 9 and middle == sorted(middle) and len(set(middle)) == len(middle):
+            logger.info("模板页按顺序分配")
+        else:
+            logger.error(f"模板页分配顺序错误: {plan}")
+            return False
+        
+        content_types = ['cover'] + ['content'] * 12 + ['summary']
+        plan = plan_slide_assignment(content_types, {'cover': [0], 'content': [1, 2, 3, 4, 5], 'summary': [9]}, 10)
+        logger.info(f"复用页面的分配结果: {plan}")
+        if plan[1:-1] != [1, 2, 3, 4, 5, 1, 2, 3, 4, 5, 1, 2]:
+            logger.error(f"复用页面的分配顺序错误: {plan}")
+            return False
+        return True
+    except Exception as e:
+        logger.error(f"测试模板页分配顺序时发生异常: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+def test_batch_document_body():
+    """测试批量渲染文档：每张幻灯片的<body>保留为带原有属性的.batch-body元素"""
+    logger.info("=== 测试批量渲染文档 ===")
+    
+    try:
+        from ppt_engine.rasterizer import compose_slide_documents, BATCH_SLIDE_CLASS, BATCH_BODY_CLASS
+        
+        head = "<head><style>body { background-color: #f0f0f0; padding: 20px; }</style></head>"
+        html_contents = [
+            f'<html>{head}<body class="dark" data-page="1"><p>第一页</p></body></html>',
+            f'<html>{head}<body><p>第二页</p></body></html>',
+        ]
+        documents = compose_slide_documents(html_contents)
+        if len(documents) != 1 or documents[0][1] != [0, 1]:
+            logger.error(f"相同<head>的幻灯片没有合并到同一个文档: {[indices for _, indices in documents]}")
+            return False
+        
+        document = documents[0][0]
+        expected = [f'<div class="{BATCH_BODY_CLASS} dark" data-page="1"><p>第一页</p></div>',
+                    f'<div class="{BATCH_BODY_CLASS}"><p>第二页</p></div>']
+        missing = [part for part in expected if part not in document]
+        if missing or document.count(f'class="{BATCH_SLIDE_CLASS}"') != 2 or "body { background-color" not in document:
+            logger.error(f"批量文档结构错误: {missing}")
+            return False
+        logger.info("批量文档保留了各幻灯片的body属性和样式")
+        return True
+    except Exception as e:
+        logger.error(f"测试批量渲染文档时发生异常: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+def test_native_slide_builder():
+    """测试原生形状生成：布局中的背景色成为幻灯片背景填充，文字生成文本框（不需要浏览器）"""
+    logger.info("=== 测试原生形状生成 ===")
+    
+    try:
+        from ppt_engine.native_converter import NativeSlideBuilder, SLIDE_WIDTH, SLIDE_HEIGHT
+        
+        prs = Presentation()
+        prs.slide_width = SLIDE_WIDTH
+        prs.slide_height = SLIDE_HEIGHT
+        font = {"size": 32, "weight": 700, "italic": False, "color": "rgb(51, 51, 51)",
+                "family": "'Microsoft YaHei', Arial, sans-serif", "align": "left", "lineHeight": "normal"}
+        layout = {"width": 1280, "height": 720, "background": "rgb(240, 240, 240)", "items": [
+            {"type": "text", "text": "原生标题", "marker": None, "font": font,
+             "box": {"x": 20, "y": 20, "w": 600, "h": 50}},
+        ]}
+        slide = NativeSlideBuilder(prs, layout["width"], layout["height"]).add_slide(layout)
+        
+        texts = [shape.text_frame.text for shape in slide.shapes if shape.has_text_frame]
+        background = slide.background.fill.fore_color.rgb
+        logger.info(f"文本框: {texts}, 背景色: {background}")
+        if texts != ["原生标题"] or str(background) != "F0F0F0":
+            logger.error("原生形状生成结果错误")
+            return False
+        return True
+    except Exception as e:
+        logger.error(f"测试原生形状生成时发生异常: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+def test_native_text_slide():
+    """测试原生形状转换：简单的文字幻灯片应生成文本框而不是整页截图"""
+    logger.info("=== 测试原生形状转换 ===")
+    
+    try:
+        from ppt_engine.browser_pool import HAS_SELENIUM
+        from ppt_engine.native_converter import convert_html_to_native_ppt
+        
+        if not HAS_SELENIUM:
+            logger.warning("未安装Selenium，跳过原生形状转换测试")
+            return True
+        
+        html = """<!DOCTYPE html>
+<html><head><meta charset="UTF-8"></head>
+<body><h1>原生标题</h1><p>原生正文内容</p></body></html>"""
+        
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        output_path = f"test_native_{timestamp}.pptx"
+        if not convert_html_to_native_ppt([html], output_path):
+            logger.warning("浏览器不可用，跳过原生形状转换测试")
+            return True
+        
+        prs = Presentation(output_path)
+        texts = [shape.text_frame.text for shape in prs.slides[0].shapes if shape.has_text_frame]
+        pictures = [shape for shape in prs.slides[0].shapes if shape.shape_type == 13]  # 13 = PICTURE
+        logger.info(f"文本框: {texts}, 图片: {len(pictures)}")
+        
+        if "原生标题" in texts and "原生正文内容" in texts and not pictures:
+            logger.info("文字幻灯片已转换为文本框")
+            return True
+        logger.error("文字幻灯片没有转换为文本框")
+        return False
+    except Exception as e:
+        logger.error(f"测试原生形状转换时发生异常: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
 def main():
     """主函数"""
     logger.info("开始PPT生成测试")
@@ -229,8 +358,24 @@ def main():
     app_result = test_app_ppt_generation()
     logger.info(f"通过app.py生成PPT测试结果: {'成功' if app_result else '失败'}")
     
+    # 测试模板页分配顺序
+    assignment_result = test_slide_assignment_order()
+    logger.info(f"模板页分配顺序测试结果: {'成功' if assignment_result else '失败'}")
+    
+    # 测试批量渲染文档
+    batch_result = test_batch_document_body()
+    logger.info(f"批量渲染文档测试结果: {'成功' if batch_result else '失败'}")
+    
+    # 测试原生形状生成
+    builder_result = test_native_slide_builder()
+    logger.info(f"原生形状生成测试结果: {'成功' if builder_result else '失败'}")
+    
+    # 测试原生形状转换
+    native_result = test_native_text_slide()
+    logger.info(f"原生形状转换测试结果: {'成功' if native_result else '失败'}")
+    
     # 总结测试结果
-    if no_template_result and template_result and app_result:
+    if no_template_result and template_result and app_result and assignment_result and batch_result and builder_result and native_result:
         logger.info("所有测试通过，PPT生成系统工作正常")
         return 0
     else:
@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+"""
+文本适配引擎
+用字体的真实字形宽度估算文字在文本框中的折行，
+批量二分查找每个文本框能放下的最大字号。
+"""
+
+import os
+import re
+import math
+import bisect
+import logging
+import threading
+import functools
+from itertools import accumulate
+from pptx.util import Pt
+from pptx.enum.text import MSO_AUTO_SIZE
+from pptx.enum.shapes import PP_PLACEHOLDER
+from pptx.oxml.ns import qn
+
+# 尝试导入numpy
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# 尝试导入PIL（读取字体的字形宽度）
+try:
+    from PIL import ImageFont
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+# 设置日志
+logger = logging.getLogger("text_fit")
+
+# 配置
+TEXT_FIT_FONT_PATH = os.environ.get('TEXT_FIT_FONT_PATH', '')  # 指定测量用的字体文件
+MIN_FONT_SIZE = 10  # 收缩的下限（磅）
+MAX_FONT_SIZE = 72
+DEFAULT_FONT_SIZE = 18  # 文字没有显式字号时按此估计
+LINE_SPACING = 1.2
+EMU_PER_PT = 12700
+METRIC_SIZE = 100  # 在此字号下测量字形宽度，其他字号按比例缩放
+
+# 未指定字体时按顺序查找，优先中文字体
+_FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+    "/Library/Fonts/Arial.ttf",
+]
+
+# 折行单位：连续的字母数字（连同其后的空格）作为一个整体，其余字符单独成为一个单位
+_WRAP_TOKEN = re.compile(r'[A-Za-z0-9]+[ \t]*|.', re.DOTALL)
+_PARAGRAPH_BREAK = re.compile(r'[\n\v]')
+
+# 检查字体是否包含中文字形时使用的字符
+_CJK_PROBE = '中'
+
+
+def _estimate_width(ch):
+    """没有字体时的字符宽度估计值（以字号为单位）"""
+    code = ord(ch)
+    if code >= 0x2E80:
+        return 1.0
+    if ch == ' ':
+        return 0.28
+    if ch in "iljI.,:;'|!`()[]{}":
+        return 0.3
+    if ch in "mwMW@%":
+        return 0.85
+    if ch.isupper() or ch.isdigit():
+        return 0.62
+    return 0.52
+
+
+class FontMetrics:
+    """
+    一种字体的字形宽度表
+
+    字形宽度与字号成正比，所以按METRIC_SIZE测量一次、以字号为单位缓存，
+    任意字号下的宽度都由缓存值乘以字号得到。字体中缺少的字形使用估计值。
+    """
+
+    def __init__(self, font_path=None):
+        """
+        Args:
+            font_path: 字体文件路径，为None或无法加载时使用估计值
+        """
+        self.font_path = font_path
+        self._font = None
+        self._missing_mask = None
+        self._widths = {}
+        self._token_widths = {}
+        self.has_cjk = False
+
+        if font_path and HAS_PIL:
+            try:
+                self._font = ImageFont.truetype(font_path, METRIC_SIZE)
+                # 缺字时绘制的是.notdef字形，用来判断字体是否包含某个字符
+                self._missing_mask = bytes(self._font.getmask('\U0010FFFD'))
+                self.has_cjk = self._has_glyph(_CJK_PROBE)
+            except Exception as e:
+                logger.warning(f"加载字体失败，使用估计的字符宽度: {font_path}, {str(e)}")
+                self._font = None
+
+    def _has_glyph(self, ch):
+        return bytes(self._font.getmask(ch)) != self._missing_mask
+
+    def char_width(self, ch):
+        """字符宽度（以字号为单位）"""
+        width = self._widths.get(ch)
+        if width is None:
+            width = _estimate_width(ch)
+            if self._font is not None:
+                try:
+                    if ch.isspace() or self._has_glyph(ch):
+                        width = self._font.getlength(ch) / METRIC_SIZE
+                except Exception:
+                    pass
+            self._widths[ch] = width
+        return width
+
+    def token_width(self, token):
+        """折行单位的宽度（以字号为单位）"""
+        width = self._token_widths.get(token)
+        if width is None:
+            width = sum(self.char_width(ch) for ch in token)
+            self._token_widths[token] = width
+        return width
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=1)
+def _default_font_path():
+    if TEXT_FIT_FONT_PATH:
+        return TEXT_FIT_FONT_PATH
+    for path in _FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    return None
+
+def get_font_metrics(font_path=None):
+    """
+    获取字体宽度表（按字体路径共享）
+
+    Args:
+        font_path: 字体文件路径，为None时使用TEXT_FIT_FONT_PATH或系统中找到的第一个候选字体
+
+    Returns:
+        FontMetrics对象
+    """
+    key = font_path or _default_font_path()
+    metrics = _metrics.get(key)
+    if metrics is None:
+        with _metrics_lock:
+            metrics = _metrics.get(key)
+            if metrics is None:
+                metrics = FontMetrics(key)
+                _metrics[key] = metrics
+                if metrics.has_cjk:
+                    logger.info(f"文本适配使用字体: {key}")
+                else:
+                    # 中文字符宽度只能估计，折行判断可能偏差较大
+                    logger.warning(f"未找到包含中文字形的字体（当前: {key or '无'}），中文字符宽度使用估计值，"
+                                   f"可通过TEXT_FIT_FONT_PATH指定中文字体")
+    return metrics
+
+
+def _cumulative(widths):
+    """宽度前缀和，numpy可用时为数组"""
+    if HAS_NUMPY:
+        return np.cumsum(np.asarray(widths, dtype=np.float64))
+    return list(accumulate(widths))
+
+def _search_right(cumulative, value):
+    """前缀和中第一个大于value的位置"""
+    if HAS_NUMPY:
+        return int(np.searchsorted(cumulative, value, side='right'))
+    return bisect.bisect_right(cumulative, value)
+
+
+class TextFitBox:
+    """一个待适配的文本框：各段落的宽度表和可用区域（磅）"""
+
+    def __init__(self, text, width, height=None, wrap=True, max_size=MAX_FONT_SIZE, metrics=None):
+        """
+        Args:
+            text: 文字，段落以换行分隔
+            width: 可用宽度（磅）
+            height: 可用高度（磅），None表示不限（文本框随文字增高）
+            wrap: 是否自动换行
+            max_size: 字号上限
+            metrics: FontMetrics对象，为None时使用默认字体
+        """
+        metrics = metrics or get_font_metrics()
+        self.width = width
+        self.height = height
+        self.wrap = wrap
+        self.max_size = max_size
+        self.paragraphs = []
+        for paragraph in _PARAGRAPH_BREAK.split(text):
+            widths = [metrics.token_width(token) for token in _WRAP_TOKEN.findall(paragraph)]
+            self.paragraphs.append((widths, _cumulative(widths) if widths else None))
+
+    def _count_lines(self, widths, cumulative, limit):
+        """贪心折行，每行用前缀和二分查找能放下的最后一个单位"""
+        if not widths:
+            return 1
+        lines, i, base, count = 0, 0, 0.0, len(widths)
+        while i < count:
+            end = _search_right(cumulative, base + limit + 1e-9)
+            if end <= i:
+                # 单个单位比一行还宽，按字符拆成多行
+                lines += math.ceil(widths[i] / limit)
+                end = i + 1
+            else:
+                lines += 1
+            base = float(cumulative[end - 1])
+            i = end
+        return lines
+
+    def fits(self, size):
+        """
+        字号为size（磅）时文字能否放进文本框
+
+        Args:
+            size: 字号
+
+        Returns:
+            bool
+        """
+        limit = self.width / size
+        if self.wrap:
+            lines = sum(self._count_lines(widths, cumulative, limit) for widths, cumulative in self.paragraphs)
+        else:
+            if any(cumulative is not None and cumulative[-1] > limit for _, cumulative in self.paragraphs):
+                return False
+            lines = len(self.paragraphs)
+        return self.height is None or lines * size * LINE_SPACING <= self.height
+
+
+def fit_font_sizes(boxes, min_size=MIN_FONT_SIZE):
+    """
+    批量求每个文本框能放下的最大整数字号
+
+    所有文本框同步二分查找，每轮每个文本框只做一次折行计算。
+
+    Args:
+        boxes: TextFitBox列表
+        min_size: 字号下限，下限也放不下时返回下限
+
+    Returns:
+        字号列表（磅），与boxes一一对应
+    """
+    lows = [min(min_size, box.max_size) for box in boxes]
+    highs = [box.max_size if box.width > 0 else low for box, low in zip(boxes, lows)]
+    active = [k for k in range(len(boxes)) if lows[k] < highs[k]]
+    while active:
+        for k in active:
+            mid = (lows[k] + highs[k] + 1) // 2
+            if boxes[k].fits(mid):
+                lows[k] = mid
+            else:
+                highs[k] = mid - 1
+        active = [k for k in active if lows[k] < highs[k]]
+    return lows
+
+
+def _level_font_size(list_style, level):
+    """列表样式（lstStyle、titleStyle等）中指定段落级别的默认字号（磅），没有时返回None"""
+    if list_style is None:
+        return None
+    level_props = list_style.find(qn(f'a:lvl{level + 1}pPr'))
+    if level_props is None:
+        return None
+    run_props = level_props.find(qn('a:defRPr'))
+    if run_props is None or not run_props.get('sz'):
+        return None
+    return int(run_props.get('sz')) / 100
+
+
+def _inherited_list_styles(shape):
+    """
+    形状中文字继承字号时依次查找的列表样式，从近到远：
+    形状自身的lstStyle，占位符对应的版式和母版占位符的lstStyle，
+    母版的titleStyle/bodyStyle（占位符）或演示文稿的defaultTextStyle（普通文本框）
+    """
+    styles = [shape.text_frame._txBody.find(qn('a:lstStyle'))]
+    is_title = None
+    if getattr(shape, 'is_placeholder', False):
+        try:
+            is_title = shape.placeholder_format.type in (PP_PLACEHOLDER.TITLE, PP_PLACEHOLDER.CENTER_TITLE)
+        except Exception:
+            is_title = False
+        base = shape
+        while True:
+            try:
+                base = base._base_placeholder
+            except Exception:
+                base = None
+            if base is None:
+                break
+            styles.append(base._element.find(qn('p:txBody') + '/' + qn('a:lstStyle')))
+
+    try:
+        slide_part = shape.part
+        if is_title is None:
+            styles.append(slide_part.package.presentation_part.presentation._element.find(qn('p:defaultTextStyle')))
+        else:
+            master = slide_part.slide_layout.slide_master
+            tx_styles = master._element.find(qn('p:txStyles'))
+            if tx_styles is not None:
+                styles.append(tx_styles.find(qn('p:titleStyle' if is_title else 'p:bodyStyle')))
+    except Exception:
+        pass
+    return [style for style in styles if style is not None]
+
+
+def _paragraph_font_size(paragraph, list_styles):
+    """段落中没有显式字号的文字的实际字号（磅），都没有设置时返回None"""
+    if paragraph.font.size is not None:
+        return paragraph.font.size.pt
+    end_props = paragraph._p.find(qn('a:endParaRPr'))
+    if end_props is not None and end_props.get('sz'):
+        return int(end_props.get('sz')) / 100
+    for style in list_styles:
+        size = _level_font_size(style, paragraph.level)
+        if size is not None:
+            return size
+    return None
+
+
+def _run_font_sizes(shape):
+    """
+    文本框中每个文字块的实际字号（磅）
+
+    文字块没有显式字号时按段落、形状、版式、母版的顺序查找继承的字号，都没有时使用DEFAULT_FONT_SIZE。
+
+    Returns:
+        [(段落, [(文字块, 字号)])]
+    """
+    list_styles = None
+    result = []
+    for paragraph in shape.text_frame.paragraphs:
+        inherited = None
+        runs = []
+        for run in paragraph.runs:
+            if run.font.size is not None:
+                size = run.font.size.pt
+            else:
+                if inherited is None:
+                    if list_styles is None:
+                        list_styles = _inherited_list_styles(shape)
+                    inherited = _paragraph_font_size(paragraph, list_styles) or DEFAULT_FONT_SIZE
+                size = inherited
+            runs.append((run, size))
+        result.append((paragraph, runs))
+    return result
+
+
+def shrink_text_to_fit(shapes, geometry=None, min_size=MIN_FONT_SIZE):
+    """
+    缩小放不下的文字，使其在文本框内完整显示
+
+    文本框原有的字号比例保持不变（按最大字号等比缩小）；没有显式字号的文字
+    按从占位符、版式和母版继承的字号计算，缩小后写入显式字号。
+    随文字自动增高的文本框只检查宽度。
+
+    Args:
+        shapes: 带文本框的形状列表
+        geometry: 可选，与shapes对应的(宽, 高)列表（EMU），为None时读取形状自身的尺寸
+        min_size: 字号下限
+
+    Returns:
+        缩小了字号的文本框数量
+    """
+    boxes, box_runs = [], []
+    for k, shape in enumerate(shapes):
+        text_frame = shape.text_frame
+        text = text_frame.text
+        if not text.strip():
+            continue
+        width, height = geometry[k] if geometry is not None else (shape.width, shape.height)
+        if not width or not height:
+            continue
+
+        run_sizes = _run_font_sizes(shape)
+        max_size = max((size for _, runs in run_sizes for _, size in runs), default=DEFAULT_FONT_SIZE)
+        grows = text_frame.auto_size == MSO_AUTO_SIZE.SHAPE_TO_FIT_TEXT
+        boxes.append(TextFitBox(
+            text,
+            (width - text_frame.margin_left - text_frame.margin_right) / EMU_PER_PT,
+            None if grows else (height - text_frame.margin_top - text_frame.margin_bottom) / EMU_PER_PT,
+            text_frame.word_wrap is not False,
+            int(max_size)
+        ))
+        box_runs.append(run_sizes)
+
+    shrunk = 0
+    for run_sizes, box, size in zip(box_runs, boxes, fit_font_sizes(boxes, min_size)):
+        if size >= box.max_size:
+            continue
+        scale = size / box.max_size
+        for _, runs in run_sizes:
+            for run, run_size in runs:
+                run.font.size = Pt(max(min_size, round(run_size * scale)))
+        shrunk += 1
+    return shrunk
@@ -0,0 +1,150 @@
+import os
+import re
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import List, Tuple
+
+# 设置日志
+logger = logging.getLogger("text_tokenizer")
+
+# 配置
+USER_DICT_PATH = os.environ.get('TOKENIZER_USER_DICT',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user_dict.txt'))
+TOKENIZE_CACHE_SIZE = int(os.environ.get('TOKENIZE_CACHE_SIZE', '4096'))
+# 只缓存较短的文本（标题、查询等重复出现的字符串），长文本直接分词
+CACHEABLE_TEXT_LENGTH = 256
+
+# 尝试导入jieba，如果不可用则使用简单的分词方法
+try:
+    import jieba
+    import jieba.analyse
+    jieba.initialize()
+    if os.path.exists(USER_DICT_PATH):
+        jieba.load_userdict(USER_DICT_PATH)
+        logger.info(f"已加载用户词典: {USER_DICT_PATH}")
+    HAS_JIEBA = True
+except ImportError:
+    HAS_JIEBA = False
+    logger.warning("未找到jieba分词库，将使用简单的分词方法")
+
+# 常用的中英文停用词
+STOPWORDS = frozenset([
+    "的", "了", "和", "是", "在", "有", "与", "这", "那", "个", "们", "中", "to", "the", "and", "in", "of", "a", "for",
+    "我", "你", "他", "她", "它", "我们", "你们", "他们", "她们", "它们", "自己", "什么", "哪些", "怎么", "怎样", "如何",
+    "因为", "所以", "但是", "可是", "然而", "而且", "并且", "或者", "如果", "虽然", "就是", "只是", "还是", "也是",
+    "不是", "没有", "可以", "应该", "需要", "一个", "一种", "一些", "这个", "这些", "那个", "那些", "以及"
+])
+
+_CJK_RUN = re.compile(r'[\u4e00-\u9fff]+')
+_TOKEN = re.compile(r'[\u4e00-\u9fff]+|[a-z0-9]+(?:[._-][a-z0-9]+)*')
+_WORD_CHAR = re.compile(r'\w')
+
+
+def _simple_segment(text: str) -> List[str]:
+    """
+    不依赖jieba的分词：英文和数字按单词，中文按相邻字符二元组切分
+
+    二元组比单字有更好的检索精度，单字的中文片段保留为单字
+    """
+    tokens = []
+    for token in _TOKEN.findall(text):
+        if _CJK_RUN.fullmatch(token):
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def _segment(text: str, for_search: bool) -> Tuple[str, ...]:
+    """分词并过滤标点和停用词"""
+    text = text.lower()
+    if HAS_JIEBA:
+        words = jieba.cut_for_search(text) if for_search else jieba.cut(text)
+    else:
+        words = _simple_segment(text)
+
+    tokens = []
+    for word in words:
+        word = word.strip()
+        if word and word not in STOPWORDS and _WORD_CHAR.search(word):
+            tokens.append(word)
+    return tuple(tokens)
+
+
+_segment_cached = lru_cache(maxsize=TOKENIZE_CACHE_SIZE)(_segment)
+
+
+def tokenize(text: str, for_search: bool = False) -> Tuple[str, ...]:
+    """
+    中文分词（词级别），去除标点和停用词
+
+    Args:
+        text: 文本
+        for_search: 是否使用搜索引擎模式（长词再切分出短词，提高召回）
+
+    Returns:
+        分词结果元组
+    """
+    if not text:
+        return ()
+    if len(text) <= CACHEABLE_TEXT_LENGTH:
+        return _segment_cached(text, for_search)
+    return _segment(text, for_search)
+
+
+def tokenize_cache_info():
+    """分词缓存的命中统计"""
+    info = _segment_cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+def extract_keywords(text: str, top_k: int = 5) -> List[str]:
+    """
+    从文本中提取关键词
+
+    Args:
+        text: 输入文本
+        top_k: 返回的关键词数量
+
+    Returns:
+        关键词列表
+    """
+    if not text:
+        return []
+
+    # 使用jieba提取关键词
+    if HAS_JIEBA:
+        try:
+            return jieba.analyse.extract_tags(text, topK=top_k)
+        except Exception as e:
+            logger.warning(f"使用jieba提取关键词失败: {str(e)}")
+
+    # 如果jieba失败或不可用，使用简单的词频统计
+    word_freq = Counter(word for word in tokenize(text) if len(word) > 1)
+    return [word for word, _ in word_freq.most_common(top_k)]
+
+
+def text_similarity(text1: str, text2: str) -> float:
+    """
+    基于词集合重合度计算两段文本的相似度
+
+    Args:
+        text1: 第一段文本
+        text2: 第二段文本
+
+    Returns:
+        相似度分数，范围0-1
+    """
+    if not text1 or not text2:
+        return 0.0
+
+    words1 = set(tokenize(text1))
+    words2 = set(tokenize(text2))
+    if not words1 or not words2:
+        return 0.0
+
+    return len(words1 & words2) / max(len(words1), len(words2))